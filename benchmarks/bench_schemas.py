@@ -0,0 +1,74 @@
+"""
+    Micro-benchmark: validation of body items for create (POST) by marshmallow-schemas
+
+    run from root of project: python -m benchmarks.bench_schemas
+"""
+
+import timeit
+
+from marshmallow import Schema, fields
+
+from core.utils import validate_by_schema
+from entity.models.ScheduleModel import ScheduleModel
+
+# sizes of body (count items)
+SIZES = (1, 10, 100, 1000, 10000)
+# total count of validated items for every size
+TOTAL = 20000
+
+
+# previous implementation of ScheduleModel._get_create_schema: new class on every call
+def get_create_schema_by_call() -> Schema:
+    class ScheduleCreateSchema(Schema):
+        name = fields.String(required=True, length=100)
+        description = fields.String(length=200)
+        email = fields.Email()
+        phone = fields.String(length=50)
+        country_id = fields.Integer()
+        city_id = fields.Integer()
+        creater_id = fields.Integer()
+        address = fields.String(length=200)
+        data = fields.Dict()
+        flags = fields.Integer(default=1)
+        activate = fields.Boolean(default=True)
+    return ScheduleCreateSchema()
+
+
+# body of POST /schedules
+def get_items(size: int) -> list:
+    return [
+        dict(name='schedule {}'.format(i), description='description', email='user{}@mail.com'.format(i),
+             phone='+70000000000', country_id=1, city_id=1, creater_id=1, address='address', activate=True)
+        for i in range(size)
+    ]
+
+
+# previous validation: schema built for every item
+def validate_by_call(items: list):
+    return [validate_by_schema(get_create_schema_by_call(), data) for data in items]
+
+
+# cached schema, validation by item
+def validate_cached(items: list):
+    return [validate_by_schema(ScheduleModel.get_create_schema(), data) for data in items]
+
+
+# cached schema, validation of all items by one load (many=True)
+def validate_many(items: list):
+    return ScheduleModel(allowed_schedule_ids=set()).validate_many_for_create(items)
+
+
+def main():
+    print('{:>6} {:>24} {:>14} {:>14}'.format('items', 'method', 'items/s', 'us/item'))
+    for size in SIZES:
+        items = get_items(size)
+        number = max(1, TOTAL // size)
+        for name, func in (('class by call', validate_by_call), ('cached schema', validate_cached),
+                           ('cached, many=True', validate_many)):
+            seconds = timeit.timeit(lambda: func(items), number=number)
+            count = size * number
+            print('{:>6} {:>24} {:>14.0f} {:>14.2f}'.format(size, name, count / seconds, seconds / count * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+    Micro-benchmark: json body of GET-response by records (asyncpg.Record) for sizes of payload
+
+    run from root of project: python -m benchmarks.bench_serializer
+    records are created by asyncpg.protocol.protocol._create_record (records as returned by queries)
+"""
+
+import json
+import timeit
+from collections import OrderedDict
+
+from asyncpg.protocol.protocol import _create_record
+
+from core.serializer import BACKENDS, set_serializer, dumps, get_projection
+
+# sizes of payload (count records)
+SIZES = (1, 10, 100, 1000, 10000)
+# total count of serialized records for every size
+TOTAL = 100000
+# selected fields & columns of records
+FIELDS = {'id', 'time', 'description', 'members', 'price', 'schedule_id'}
+COLUMNS = ('id', 'time', 'description', 'members', 'price', 'schedule_id', 'created_at', 'updated_at')
+
+
+# previous result item: value of every field by name
+def get_result_item(data, fields) -> dict:
+    result = {}
+    for field in fields:
+        try:
+            result[field] = data[field]
+        except KeyError:
+            result[field] = None
+    return result
+
+
+def get_records(size: int) -> list:
+    mapping = OrderedDict((column, i) for i, column in enumerate(COLUMNS))
+    return [_create_record(mapping, (i, 1540000000 + i * 3600, 'slot {}'.format(i), 5, 10.5, i % 100, 0, 0))
+            for i in range(size)]
+
+
+# previous implementation: web.json_response (json.dumps) by items of get_result_item
+def body_by_json(records: list) -> bytes:
+    return json.dumps(dict(result=[get_result_item(record, FIELDS) for record in records], errors=[])).encode()
+
+
+# serializer by items of get_result_item
+def body_by_serializer(records: list) -> bytes:
+    return dumps(dict(result=[get_result_item(record, FIELDS) for record in records], errors=[])).encode()
+
+
+# serializer by projection of records
+def body_by_projection(records: list) -> bytes:
+    return dumps(dict(result=get_projection(FIELDS).items(records), errors=[])).encode()
+
+
+def main():
+    cases = [('json.dumps + get_result_item', None, body_by_json)]
+    for backend in sorted(BACKENDS):
+        cases.append(('{} + get_result_item'.format(backend), backend, body_by_serializer))
+        cases.append(('{} + projection'.format(backend), backend, body_by_projection))
+
+    print('{:>6}  {:<32} {:>12} {:>10}'.format('size', 'case', 'us/record', 'speedup'))
+    for size in SIZES:
+        records = get_records(size)
+        number = max(1, TOTAL // size)
+        assert json.loads(body_by_json(records)) == json.loads(body_by_projection(records))
+
+        base = None
+        for name, backend, func in cases:
+            set_serializer(backend)
+            seconds = min(timeit.repeat(lambda: func(records), number=number, repeat=3))
+            per_record = seconds / (number * size) * 1e6
+            base = base or per_record
+            print('{:>6}  {:<32} {:>12.3f} {:>9.1f}x'.format(size, name, per_record, base / per_record))
+    set_serializer()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+    Micro-benchmark: generation of sid & login-path of SessionManager (without db)
+
+    run from root of project: python -m benchmarks.bench_sid
+"""
+
+import asyncio
+import random
+import string
+import timeit
+
+from common.managers.sessionManager import SessionManager
+from core.utils import keygen
+
+# count of runs
+NUMBER = 100000
+
+
+# previous implementation of SessionManager.generate_sid
+def generate_sid_random() -> str:
+    return ''.join([random.choice(string.ascii_letters + string.digits) for n in range(32)])
+
+
+# previous implementation of core.utils.keygen
+def keygen_random(size=12, chars=string.ascii_uppercase + string.digits):
+    return ''.join(random.choice(chars) for x in range(size))
+
+
+# print result of timeit
+def report(name: str, seconds: float, number: int=NUMBER):
+    print('{:<40} {:>10.0f} ops/s {:>8.2f} us/op'.format(name, number / seconds, seconds / number * 1e6))
+
+
+# login-path: new session & logout, ACL of user in cache (without db)
+async def login_path(manager: SessionManager, number: int) -> float:
+    # user -1 is logged in, ACL in cache
+    await manager.add_session(manager.generate_empty_session())
+    await manager.set_acl(-1, {1, 2, 3})
+
+    loop = asyncio.get_event_loop()
+    start = loop.time()
+    for i in range(number):
+        session = await manager.generate_session(dict(id=-1, login='bench'))
+        await manager.del_session(session.sid)
+    return loop.time() - start
+
+
+def main():
+    report('generate_sid: random.choice', timeit.timeit(generate_sid_random, number=NUMBER))
+    report('generate_sid: secrets', timeit.timeit(SessionManager().generate_sid, number=NUMBER))
+    report('keygen: random.choice', timeit.timeit(keygen_random, number=NUMBER))
+    report('keygen: os.urandom + base32', timeit.timeit(keygen, number=NUMBER))
+
+    manager = SessionManager()
+    report('login-path: secrets', asyncio.run(login_path(manager, NUMBER)))
+    # the same login-path with previous generate_sid
+    SessionManager.generate_sid = lambda self: generate_sid_random()
+    report('login-path: random.choice', asyncio.run(login_path(manager, NUMBER)))
+
+
+if __name__ == '__main__':
+    main()
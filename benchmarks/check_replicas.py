@@ -0,0 +1,78 @@
+"""
+    Check of routing of queries to read replicas (db & replicas from default.cfg/config.cfg)
+
+    run from root of project: python -m benchmarks.check_replicas
+    replicas may be any local postgresql instances (other ports) with the same database, e.g.:
+        replicas: localhost:5433, localhost:5434
+    selects of GET-route are counted by server (inet_server_port), selects after write of request
+    and selects without route must be executed on primary
+"""
+
+import asyncio
+import sys
+from collections import Counter
+
+from sqlalchemy.sql import select, func
+
+from settings import config, init_settings
+from common.managers.dbManager import DBManager
+
+# count concurrent GET-requests
+REQUESTS = 1000
+
+
+# server (host:port) of select
+async def get_server(query) -> str:
+    record = await DBManager().query_fetchrow(query)
+    return '{}:{}'.format(record['host'], record['port'])
+
+
+# selects of one GET-request: before & after write, return (server before, server after)
+async def get_request(query, write: bool) -> tuple:
+    token = DBManager().start_route(True)
+    try:
+        before = await get_server(query)
+        if write:
+            await DBManager().query_transaction(lambda conn: conn.fetchval('SELECT 1'))
+        return before, await get_server(query)
+    finally:
+        DBManager().stop_route(token)
+
+
+async def main() -> bool:
+    init_settings()
+    DBManager().set_settings(dict(
+        user=config.get('DB', 'user'),
+        password=config.get('DB', 'password'),
+        database=config.get('DB', 'database'),
+        host=config.get('DB', 'host'),
+        port=config.get('DB', 'port'),
+        replicas=config.get('DB', 'replicas', fallback=''),
+        replica_selection=config.get('DB', 'replica_selection', fallback='round_robin'),
+    ))
+    query = select([func.coalesce(func.host(func.inet_server_addr()), 'socket').label('host'),
+                    func.inet_server_port().label('port')])
+    try:
+        primary = await get_server(query)
+        results = await asyncio.gather(*(get_request(query, i % 10 == 0) for i in range(REQUESTS)))
+        stats = DBManager().get_stats()
+    finally:
+        await DBManager().shutdown()
+
+    print('primary: {}'.format(primary))
+    print('selects of GET-requests by server:')
+    for server, count in sorted(Counter(before for before, _ in results).items()):
+        print('    {:<24} {:>6}'.format(server, count))
+    for name, gauges in sorted(stats['replicas'].items()):
+        print('replica {}: {}'.format(name, gauges))
+
+    after_write = {after for i, (_, after) in enumerate(results) if i % 10 == 0}
+    ok = after_write == {primary}
+    if stats['replicas']:
+        ok = ok and primary not in {before for before, _ in results}
+    print('ok' if ok else 'FAIL: selects after write: {}'.format(sorted(after_write)))
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if asyncio.get_event_loop().run_until_complete(main()) else 1)
@@ -0,0 +1,83 @@
+"""
+    Check by EXPLAIN that queries of models use indexes of migration 3b9c1e7d5a20 (db from default.cfg/config.cfg)
+
+    run from root of project: python -m benchmarks.explain_indexes
+    seq scan is disabled in session of check: on small tables planner prefers seq scan, check is "index can be used"
+"""
+
+import asyncio
+import sys
+
+import ujson
+
+from settings import config, init_settings
+from common.managers.dbManager import DBManager
+from entity.order import Order
+from entity.models.ScheduleModel import ScheduleModel, ScheduleOnlineModel
+from entity.models.OrderModel import OrderModel
+from entity.models.ScheduleDetailModel import ScheduleDetailModel
+
+
+# names of indexes in plan (json)
+def get_plan_indexes(plan: dict) -> set:
+    result = set()
+    if 'Index Name' in plan:
+        result.add(plan['Index Name'])
+    for sub_plan in plan.get('Plans', ()):
+        result |= get_plan_indexes(sub_plan)
+    return result
+
+
+# checks: (name, entity, fields, conditions, expected indexes - any of)
+async def get_checks() -> list:
+    schedule_ids = frozenset({1, 2, 3})
+    schedule = ScheduleModel(allowed_schedule_ids=schedule_ids, creater_id=1)
+    schedule_online = ScheduleOnlineModel()
+    order = OrderModel(allowed_schedule_ids=schedule_ids)
+    detail = ScheduleDetailModel(allowed_schedule_ids=schedule_ids)
+
+    return [
+        ('ScheduleModel.get_entities', schedule.entity_cls, schedule.select_fields,
+         await schedule._get_select_conditions([]), {'ix_Schedules_creater_id'}),
+        ('ScheduleOnlineModel.get_entities(name)', schedule_online.entity_cls, schedule_online.select_fields,
+         await schedule_online._get_select_conditions([], filter_name='yoga'), {'ix_Schedules_name_trgm'}),
+        ('OrderModel.get_entities', order.entity_cls, order._get_query_fields([]),
+         await order._get_select_conditions([]), {'ix_Orders_schedule_id_time', 'ix_Orders_schedule_id_status'}),
+        ('OrderModel.get_entities(customers)', order.entity_cls, order._get_query_fields([]),
+         await order._get_select_conditions([], customer_ids=[1]),
+         {'ix_Orders_customer_id', 'ix_Orders_schedule_id_time', 'ix_Orders_schedule_id_status'}),
+        ('Orders by schedules & status', Order, {'id', 'status'},
+         [Order.schedule_id == 1, Order.status == 1], {'ix_Orders_schedule_id_status'}),
+        ('ScheduleDetailModel.get_entities', detail.entity_cls, detail._get_query_fields([]),
+         await detail._get_select_conditions([]), {'ix_SCHDetails_schedule_id_time'}),
+        ('Session.load_schedule_ids', schedule.entity_cls, {'id'},
+         [schedule.entity_cls.creater_id == 1], {'ix_Schedules_creater_id'}),
+    ]
+
+
+async def main() -> bool:
+    init_settings()
+    DBManager().set_settings(dict(
+        user=config.get('DB', 'user'),
+        password=config.get('DB', 'password'),
+        database=config.get('DB', 'database'),
+        host=config.get('DB', 'host'),
+        port=config.get('DB', 'port'),
+    ))
+
+    success = True
+    async with (await DBManager().get_pool()).acquire() as conn:
+        await conn.execute('SET enable_seqscan = off')
+        for name, entity_cls, fields, conditions, expected in await get_checks():
+            query_string, params = entity_cls._compile_select(str_fields=fields, conditions=conditions)
+            plan = await conn.fetchval('EXPLAIN (FORMAT JSON) ' + query_string, *params)
+            used = get_plan_indexes(ujson.loads(plan)[0]['Plan'])
+            ok = bool(used & expected)
+            success = success and ok
+            print('{:<4} {:<42} {}'.format('ok' if ok else 'FAIL', name, ', '.join(sorted(used)) or 'seq scan'))
+    await DBManager().shutdown()
+    return success
+
+
+if __name__ == '__main__':
+    sys.exit(0 if asyncio.get_event_loop().run_until_complete(main()) else 1)
@@ -0,0 +1,91 @@
+"""
+    Load test: concurrent bookings of slots by SCHDetail.book_orders (db from default.cfg/config.cfg)
+
+    run from root of project: python -m benchmarks.load_booking
+    creates user, schedule & slots with limited places, books places by BOOKINGS concurrent calls,
+    checks that count of orders by slot is min(places, requests) and removes created data
+"""
+
+import asyncio
+import random
+import sys
+import time
+import uuid
+
+from sqlalchemy.sql import select, func, delete
+
+from settings import config, init_settings
+from common.managers.dbManager import DBManager
+from entity.user import User
+from entity.schedule import Schedule
+from entity.schDetail import SCHDetail
+from entity.order import Order
+
+# count concurrent bookings (one order by booking)
+BOOKINGS = 5000
+# count slots & places of slot
+SLOTS = 20
+PLACES = 100
+
+
+# create user, schedule & slots, return (user id, schedule id, slot times)
+async def create_data() -> tuple:
+    key = uuid.uuid4().hex[:12]
+    user, _ = await User.create(values=dict(
+        login='load_' + key, password=key, email=key + '@load.test', phone=key
+    ))
+    schedule, _ = await Schedule.create(values=dict(name='load_' + key, creater_id=user['id']))
+    times = [1000000 + 3600 * i for i in range(SLOTS)]
+    await SCHDetail.create_many(values_list=[
+        dict(schedule_id=schedule['id'], time=slot_time, members=PLACES) for slot_time in times
+    ])
+    return user['id'], schedule['id'], times
+
+
+async def main() -> bool:
+    init_settings()
+    DBManager().set_settings(dict(
+        user=config.get('DB', 'user'),
+        password=config.get('DB', 'password'),
+        database=config.get('DB', 'database'),
+        host=config.get('DB', 'host'),
+        port=config.get('DB', 'port'),
+    ))
+
+    user_id, schedule_id, times = await create_data()
+    try:
+        # requests by slot
+        requests = [random.choice(times) for _ in range(BOOKINGS)]
+        started = time.perf_counter()
+        results = await asyncio.gather(*(
+            SCHDetail.book_orders([dict(schedule_id=schedule_id, time=slot_time)]) for slot_time in requests
+        ))
+        elapsed = time.perf_counter() - started
+
+        booked = sum(1 for rc, _ in results if rc and rc[0][0])
+        failed = sum(1 for rc, _ in results if rc is False)
+        counts = dict(await DBManager().query_fetch(
+            select([Order.time, func.count(Order.id)]).where(Order.schedule_id == schedule_id).group_by(Order.time)
+        ))
+
+        success = failed == 0 and booked == sum(counts.values())
+        for slot_time in times:
+            expected = min(PLACES, requests.count(slot_time))
+            success = success and counts.get(slot_time, 0) == expected
+            if counts.get(slot_time, 0) > PLACES:
+                print('overbooked slot {}: {} orders, {} places'.format(slot_time, counts[slot_time], PLACES))
+
+        print('bookings: {}, booked: {}, errors: {}, orders in db: {}'.format(
+            BOOKINGS, booked, failed, sum(counts.values())))
+        print('time: {:.2f} s, {:.0f} bookings/s'.format(elapsed, BOOKINGS / elapsed))
+        print('ok' if success else 'FAIL')
+    finally:
+        await DBManager().query_execute(delete(Schedule).where(Schedule.id == schedule_id))
+        await DBManager().query_execute(delete(User).where(User.id == user_id))
+        await DBManager().shutdown()
+
+    return success
+
+
+if __name__ == '__main__':
+    sys.exit(0 if asyncio.get_event_loop().run_until_complete(main()) else 1)
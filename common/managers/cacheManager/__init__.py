@@ -0,0 +1,6 @@
+"""
+    CacheManager (cache of responses)
+"""
+
+from .manager import CacheManager
+from .singleflight import SingleFlight
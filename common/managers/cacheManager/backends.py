@@ -0,0 +1,77 @@
+import time
+from collections import OrderedDict
+
+import aiocache
+from aiocache.serializers import PickleSerializer
+
+
+# in-memory cache of process: LRU by namespace, values expire by ttl
+class MemoryBackend:
+    __slots__ = ('_namespaces', '_max_size')
+
+    def __init__(self, max_size: int=1000):
+        # namespace: OrderedDict key: (expire time, value), order - LRU
+        self._namespaces = dict()
+        # max count values in namespace
+        self._max_size = max_size
+
+    # value by key, None if not found or expired
+    async def get(self, namespace: str, key):
+        items = self._namespaces.get(namespace)
+        item = items.get(key) if items else None
+        if item is None:
+            return None
+        # expired
+        if item[0] < time.monotonic():
+            del items[key]
+            return None
+        items.move_to_end(key)
+        return item[1]
+
+    # set value by key for ttl seconds, remove least recently used values
+    async def set(self, namespace: str, key, value, ttl: float):
+        items = self._namespaces.setdefault(namespace, OrderedDict())
+        items[key] = (time.monotonic() + ttl, value)
+        items.move_to_end(key)
+        while len(items) > self._max_size:
+            items.popitem(last=False)
+
+    # remove all values of namespace
+    async def clear(self, namespace: str):
+        self._namespaces.pop(namespace, None)
+
+    # count values by namespaces
+    def size(self) -> dict:
+        return {namespace: len(items) for namespace, items in self._namespaces.items()}
+
+
+# cache by aiocache: SimpleMemoryCache, RedisCache (shared by processes, needs aioredis), MemcachedCache (needs aiomcache)
+class AiocacheBackend:
+    __slots__ = ('_cache', )
+
+    def __init__(self, cache_class: str='SimpleMemoryCache', **kwargs):
+        """
+        :param cache_class: str. Name of cache class in package aiocache
+        :param kwargs: params of cache class (endpoint, port, ...)
+        """
+        cls = getattr(aiocache, cache_class)
+        # values of other processes are pickled
+        if cls is not aiocache.SimpleMemoryCache:
+            kwargs.setdefault('serializer', PickleSerializer())
+        self._cache = cls(**kwargs)
+
+    # value by key, None if not found or expired
+    async def get(self, namespace: str, key):
+        return await self._cache.get(repr(key), namespace=namespace)
+
+    # set value by key for ttl seconds
+    async def set(self, namespace: str, key, value, ttl: float):
+        await self._cache.set(repr(key), value, ttl=ttl, namespace=namespace)
+
+    # remove all values of namespace
+    async def clear(self, namespace: str):
+        await self._cache.clear(namespace=namespace)
+
+    # count values by namespaces (not known for external cache)
+    def size(self) -> dict:
+        return {}
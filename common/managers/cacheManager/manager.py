@@ -0,0 +1,107 @@
+from settings import logger
+
+from .backends import MemoryBackend, AiocacheBackend
+from .singleflight import SingleFlight
+
+
+# metaclass Singleton
+class Singleton(type):
+    _instances = {}
+
+    def __call__(cls, *args, **kwargs):
+        if cls not in cls._instances:
+            cls._instances[cls] = super(Singleton, cls).__call__(*args, **kwargs)
+        return cls._instances[cls]
+
+
+# Singleton cache of responses by namespaces (TTL), concurrent loads of the same key are coalesced
+class CacheManager(metaclass=Singleton):
+    __slots__ = ('_backend', '_ttl', '_flights', '_generations', '_stats')
+
+    # cache backends
+    BACKEND_NONE = 'none'
+    BACKEND_MEMORY = 'memory'
+    BACKEND_AIOCACHE = 'aiocache'
+
+    def __init__(self):
+        # backend of cache, None - cache is disabled
+        self._backend = None
+        # seconds while value is alive
+        self._ttl = 5
+        # loads in flight
+        self._flights = SingleFlight()
+        # namespace: count of invalidations, value loaded before invalidation is not saved
+        self._generations = dict()
+        # counters
+        self._stats = dict(hits=0, misses=0, invalidations=0, errors=0)
+
+    # set settings for cache backend
+    def set_settings(self, config: dict):
+        backend = config.get('backend') or self.BACKEND_MEMORY
+        self._ttl = float(config.get('ttl') or self._ttl)
+
+        if backend == self.BACKEND_MEMORY:
+            self._backend = MemoryBackend(max_size=int(config.get('max_size') or 1000))
+        elif backend == self.BACKEND_AIOCACHE:
+            params = dict(endpoint=config['endpoint']) if config.get('endpoint') else {}
+            if config.get('port'):
+                params['port'] = int(config['port'])
+            self._backend = AiocacheBackend(config.get('aiocache_class') or 'SimpleMemoryCache', **params)
+        else:
+            self._backend = None
+        logger.info('Cache: backend {}, ttl {}'.format(backend, self._ttl))
+
+    # value from cache or by func() (saved to cache), func is called once for concurrent calls with the same key
+    async def get_or_set(self, namespace: str, key, func):
+        """
+        :param namespace: str. Namespace of values, invalidated together
+        :param key: hashable. Key of value in namespace
+        :param func: callable() -> awaitable, value is not None
+        :return: value
+        """
+        if self._backend is None:
+            return await func()
+
+        try:
+            value = await self._backend.get(namespace, key)
+        except Exception as e:
+            logger.error('CacheManager#get_or_set: {}'.format(e))
+            self._stats['errors'] += 1
+            value = None
+
+        if value is not None:
+            self._stats['hits'] += 1
+            return value
+
+        self._stats['misses'] += 1
+        generation = self._generations.get(namespace, 0)
+        return await self._flights.do((namespace, generation, key), lambda: self._load(namespace, generation, key, func))
+
+    # load value & save to cache if namespace is not invalidated while loading
+    async def _load(self, namespace: str, generation: int, key, func):
+        value = await func()
+        if value is not None and self._generations.get(namespace, 0) == generation:
+            try:
+                await self._backend.set(namespace, key, value, self._ttl)
+            except Exception as e:
+                logger.error('CacheManager#_load: {}'.format(e))
+                self._stats['errors'] += 1
+        return value
+
+    # remove all values of namespace (data changed)
+    async def invalidate(self, namespace: str):
+        self._generations[namespace] = self._generations.get(namespace, 0) + 1
+        self._stats['invalidations'] += 1
+        if self._backend is not None:
+            try:
+                await self._backend.clear(namespace)
+            except Exception as e:
+                logger.error('CacheManager#invalidate: {}'.format(e))
+                self._stats['errors'] += 1
+
+    # statistic by cache: hits, misses, merged loads, ...
+    def get_stats(self) -> dict:
+        result = dict(self._stats)
+        result.update(self._flights.stats())
+        result['size'] = self._backend.size() if self._backend is not None else {}
+        return result
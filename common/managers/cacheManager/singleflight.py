@@ -0,0 +1,51 @@
+import asyncio
+
+
+# Coalescing of concurrent identical calls: one call in flight by key, other callers wait for its result
+class SingleFlight:
+    __slots__ = ('_flights', 'calls', 'merged')
+
+    def __init__(self):
+        # key: Future of call in flight
+        self._flights = dict()
+        # counters: executed calls & calls merged to call in flight
+        self.calls = 0
+        self.merged = 0
+
+    # count calls in flight
+    def __len__(self):
+        return len(self._flights)
+
+    # statistic by calls
+    def stats(self) -> dict:
+        return dict(
+            calls=self.calls,
+            merged=self.merged,
+            in_flight=len(self._flights),
+        )
+
+    # call finished: remove from flights
+    def _done(self, key, future: asyncio.Future):
+        if self._flights.get(key) is future:
+            del self._flights[key]
+        # exception is retrieved (all callers may be cancelled)
+        if not future.cancelled():
+            future.exception()
+
+    # run func() once for all concurrent callers with the same key, result is shared (must not be changed)
+    async def do(self, key, func):
+        """
+        :param key: hashable. Key of call
+        :param func: callable() -> awaitable, called if call with key not in flight
+        :return: result of func
+        """
+        future = self._flights.get(key)
+        if future is not None:
+            self.merged += 1
+        else:
+            self.calls += 1
+            future = self._flights[key] = asyncio.ensure_future(func())
+            future.add_done_callback(lambda f: self._done(key, f))
+
+        # cancel of one caller does not cancel call for others
+        return await asyncio.shield(future)
@@ -3,3 +3,6 @@
 """
 
 from .manager import DBManager
+from .query_stats import QueryStats
+from .pool import PoolTimeoutError
+from .routing import DBRoute
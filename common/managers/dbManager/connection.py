@@ -0,0 +1,77 @@
+from collections import OrderedDict
+
+from asyncpg.exceptions import InvalidCachedStatementError, OutdatedSchemaCacheError
+from asyncpgsa.connection import SAConnection
+
+# counters by prepared statements (all connections of process)
+_stats = dict(
+    # new prepared statements
+    prepared=0,
+    # executions by already prepared statements
+    reused=0,
+    # removed from registry by limit
+    evicted=0,
+    # prepared again after change of db-schema
+    reprepared=0,
+)
+
+
+# Connection with registry of named prepared statements (LRU), registry lives while connection is alive.
+# Statements of registry are prepared by prepare() (not in statement cache of asyncpg), cache of asyncpg is off
+# in pools of DBManager (statement_cache_size=0): selects, execute & cursors go through registry only,
+# writes of batches & transactions (multi-row queries, text by count of rows) are not cached.
+class PreparedConnection(SAConnection):
+    # max count prepared statements per connection
+    registry_size = 100
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # sql-text: PreparedStatement
+        self._registry = OrderedDict()
+
+    @staticmethod
+    # statistic by prepared statements
+    def stats() -> dict:
+        return dict(_stats)
+
+    # get prepared statement from registry or prepare it on server
+    async def prepare_cached(self, query_string: str):
+        statement = self._registry.get(query_string)
+        if statement is not None:
+            _stats['reused'] += 1
+            self._registry.move_to_end(query_string)
+            return statement
+
+        statement = await self.prepare(query_string)
+        _stats['prepared'] += 1
+        self._registry[query_string] = statement
+
+        # remove old statements, server-side statement closed by asyncpg on gc
+        while len(self._registry) > self.registry_size:
+            self._registry.popitem(last=False)
+            _stats['evicted'] += 1
+
+        return statement
+
+    # execute prepared statement by method name (fetch, fetchrow, fetchval, execute - status of command)
+    async def execute_prepared(self, method: str, query_string: str, params: list or tuple, **kwargs):
+        statement = await self.prepare_cached(query_string)
+        try:
+            return await self._call_statement(statement, method, params, kwargs)
+        except (InvalidCachedStatementError, OutdatedSchemaCacheError):
+            # in transaction the statement can not be repeated
+            if self.is_in_transaction():
+                raise
+            # schema was changed - prepare again
+            self._registry.pop(query_string, None)
+            _stats['reprepared'] += 1
+            statement = await self.prepare_cached(query_string)
+            return await self._call_statement(statement, method, params, kwargs)
+
+    @staticmethod
+    # call method of prepared statement, execute - status of command as Connection.execute ('DELETE 1', ...)
+    async def _call_statement(statement, method: str, params: list or tuple, kwargs: dict):
+        if method == 'execute':
+            await statement.fetch(*params, **kwargs)
+            return statement.get_statusmsg()
+        return await getattr(statement, method)(*params, **kwargs)
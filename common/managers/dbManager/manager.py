@@ -1,7 +1,25 @@
+import asyncio
+import time
+
 from asyncpgsa import create_pool, compile_query
 from asyncpg.pool import Pool
+from asyncpg.exceptions import InterfaceError
 from sqlalchemy.dialects.postgresql.base import PGDialect
 
+from settings import logger
+from common.managers.cacheManager.singleflight import SingleFlight
+
+from .statement_cache import StatementCache, CompiledQuery
+from .connection import PreparedConnection
+from .query_stats import QueryStats, current_query_stats
+from .pool import PoolAcquire, PoolGauges, ReplicaPool, CONNECTION_ERRORS
+from .routing import DBRoute, current_db_route, is_read_query
+
+
+# hashable copy of params of query (arrays as tuples)
+def _freeze_params(params) -> tuple:
+    return tuple(_freeze_params(param) if isinstance(param, (list, tuple)) else param for param in params)
+
 
 # metaclass Singleton
 class Singleton(type):
@@ -13,40 +31,153 @@ class Singleton(type):
         return cls._instances[cls]
 
 
+# number from settings by type, default if setting is not set (0 is value)
+def _get_number(config: dict, key: str, default, type_=int):
+    value = config.get(key)
+    return default if value is None or value == '' else type_(value)
+
+
 # Singleton DB Connection instance (postgresql)
 class DBManager(metaclass=Singleton):
-    __slots__ = ('_pool', '_config')
+    __slots__ = ('_pool', '_config', 'statement_cache', 'select_flights', 'pool_gauges', '_replicas', '_replica_next',
+                 '_pins')
+
+    # max count sessions pinned to primary (read-your-writes)
+    MAX_PINS = 10000
+    # seconds of graceful closing of pool of unhealthy replica (terminated after)
+    REPLICA_CLOSE_TIMEOUT = 10
 
     def __init__(self):
         # connections pool
         self._pool = None
         # config for connection to DB
         self._config = {}
+        # cache of compiled queries
+        self.statement_cache = StatementCache()
+        # selects in flight, concurrent identical selects are executed once
+        self.select_flights = SingleFlight()
+        # gauges of connections pool
+        self.pool_gauges = PoolGauges()
+        # pools of read replicas: [ReplicaPool], index of last selected replica
+        self._replicas = []
+        self._replica_next = -1
+        # sessions routed to primary after writes: key: expire time (monotonic)
+        self._pins = dict()
 
     # set settings for db-connections
     def set_settings(self, config: dict):
+        # max connections of pool of process, 0 - max_connections (of all processes) / count_processes
+        max_size = _get_number(config, 'max_size', 0) or \
+            max(1, _get_number(config, 'max_connections', 40) // max(1, _get_number(config, 'count_processes', 1)))
         self._config = dict(
             user=config.get('user'),
             password=config.get('password'),
             database=config.get('database'),
             host=config.get('host'),
             port=config.get('port'),
-            min_size=5,
-            max_size=10,
+            # connections of pool of process (opened on start & max)
+            min_size=min(_get_number(config, 'min_size', 5), max_size),
+            max_size=max_size,
+            # seconds of waiting for connection from pool, 0 - without limit
+            acquire_timeout=_get_number(config, 'acquire_timeout', 0, float) or None,
+            # seconds while idle connection is alive, 0 - without limit
+            max_inactive_connection_lifetime=_get_number(config, 'max_inactive_connection_lifetime', 300, float),
+            # seconds of execution of query, 0 - without limit
+            command_timeout=_get_number(config, 'command_timeout', 0, float) or None,
+            # count rows fetched by one round-trip of cursor
+            cursor_prefetch=_get_number(config, 'cursor_prefetch', 500),
+            # concurrent identical selects are executed once
+            coalesce_selects=str(config.get('coalesce_selects', True)).lower() in ('1', 'true', 'yes', 'on'),
+            # statistic of queries by request (Server-Timing & log)
+            query_stats=str(config.get('query_stats', True)).lower() in ('1', 'true', 'yes', 'on'),
+            # read replicas: host:port or dsn by comma, selects of GET-requests are executed on replicas
+            replicas=[replica.strip() for replica in (config.get('replicas') or '').split(',') if replica.strip()],
+            # selection of replica: round_robin, least_loaded
+            replica_selection=config.get('replica_selection') or 'round_robin',
+            # seconds while session is routed to primary after write, 0 - without pinning
+            replica_pin_seconds=_get_number(config, 'replica_pin_seconds', 0, float),
+            # seconds between connecting to unhealthy replica
+            replica_retry_seconds=_get_number(config, 'replica_retry_seconds', 30, float),
         )
+        if self._config['replica_selection'] not in ('round_robin', 'least_loaded'):
+            raise ValueError('Unknown replica_selection: {}'.format(self._config['replica_selection']))
+        # cursor of asyncpg fetches at least one row by round-trip
+        if self._config['cursor_prefetch'] < 1:
+            raise ValueError('cursor_prefetch must be greater than 0: {}'.format(self._config['cursor_prefetch']))
+        # size of cache compiled queries, 0 - queries are not cached
+        self.statement_cache.set_max_size(_get_number(config, 'statement_cache_size', 1024))
+        # max count prepared statements per connection, 0 - statements are not kept
+        PreparedConnection.registry_size = _get_number(config, 'prepared_statements_size', 100)
+        # min time of queries of request for log line, 0 - all requests
+        QueryStats.log_min_ms = _get_number(config, 'query_stats_log_ms', 0, float)
 
-    # initial connections-pool
+    # dsn for connections to host (host:port), dsn is returned as is
+    def _get_dsn(self, host: str, port=None) -> str:
+        if '://' in host:
+            return host
+        if port is None and ':' in host:
+            host, port = host.rsplit(':', 1)
+        return 'postgresql://%s:%s@%s:%s/%s' % \
+               (self._config['user'], self._config['password'], host,
+                port or self._config['port'], self._config['database'])
+
+    # initial connections-pools of primary & replicas
     async def init_pool(self):
-        # dsn for connections
-        dsn = 'postgresql://%s:%s@%s:%s/%s' % \
-              (self._config['user'], self._config['password'], self._config['host'],
-               self._config['port'], self._config['database'])
-        # create pool
-        self._pool = await create_pool(
+        self._pool = await self._create_pool(self._get_dsn(self._config['host'], self._config['port']))
+        logger.info('DB pool: min_size {}, max_size {}'.format(
+            self._config.get('min_size', 5), self._config.get('max_size', 10)))
+
+        replicas = []
+        for replica in self._config.get('replicas', []):
+            dsn = self._get_dsn(replica)
+            # name of replica without credentials
+            replica = ReplicaPool(dsn.rsplit('@', 1)[-1], dsn)
+            await self._open_replica(replica)
+            replicas.append(replica)
+        self._replicas = replicas
+
+    # connect pool of replica, unhealthy replica (not connected) is not used until next connecting
+    async def _open_replica(self, replica: ReplicaPool):
+        replica.retry_at = None
+        try:
+            replica.pool = await self._create_pool(replica.dsn)
+            logger.info('DB replica: {}'.format(replica.name))
+        except Exception as e:
+            replica.retry_at = time.monotonic() + self._config.get('replica_retry_seconds', 30)
+            logger.error('DB replica {} is unhealthy, selects are executed on primary, err: {}'.format(
+                replica.name, repr(e)))
+
+    # replica is unhealthy after connection error on its pool: pool is closed in background, replica is connected
+    # again after replica_retry_seconds (pool of replica is already changed - nothing to do)
+    def _set_unhealthy(self, replica: ReplicaPool, pool: Pool, error: Exception):
+        if replica.pool is not pool:
+            return
+        replica.pool = None
+        replica.retry_at = time.monotonic() + self._config.get('replica_retry_seconds', 30)
+        logger.error('DB replica {} is unhealthy, selects are executed on primary, err: {}'.format(
+            replica.name, repr(error)))
+        asyncio.ensure_future(self._close_pool(pool))
+
+    # close pool of unhealthy replica: connections in use are released by its queries, terminate by timeout
+    async def _close_pool(self, pool: Pool):
+        try:
+            await asyncio.wait_for(pool.close(), self.REPLICA_CLOSE_TIMEOUT)
+        except Exception as e:
+            logger.error('DBManager#_close_pool: {}'.format(repr(e)))
+            pool.terminate()
+
+    # create connections-pool by dsn
+    async def _create_pool(self, dsn: str) -> Pool:
+        return await create_pool(
             dsn=dsn,
             min_size=self._config.get('min_size', 5),
             max_size=self._config.get('max_size', 10),
-            dialect=PGDialect()
+            max_inactive_connection_lifetime=self._config.get('max_inactive_connection_lifetime', 300),
+            command_timeout=self._config.get('command_timeout'),
+            dialect=PGDialect(),
+            connection_class=PreparedConnection,
+            # statements are cached by registry of PreparedConnection, not twice by asyncpg
+            statement_cache_size=0
         )
 
     # get connections-pool
@@ -55,30 +186,286 @@ class DBManager(metaclass=Singleton):
             await self.init_pool()
         return self._pool
 
+    # acquire connection from pool of primary with timeout: async with await DBManager().acquire() as conn
+    async def acquire(self) -> PoolAcquire:
+        return PoolAcquire(await self.get_pool(), self.pool_gauges, self._config.get('acquire_timeout'))
+
+    # call func(conn) on connection of healthy replica (replica=True) or primary, connection error of replica
+    # (on acquire or in query) marks replica unhealthy & func is called once again on primary
+    async def _call(self, func, replica: bool=False):
+        replica = self._get_replica() if replica and self._replicas else None
+        if replica is not None:
+            pool = replica.pool
+            try:
+                async with PoolAcquire(pool, replica.gauges, self._config.get('acquire_timeout')) as conn:
+                    return await func(conn)
+            except CONNECTION_ERRORS as e:
+                self._set_unhealthy(replica, pool, e)
+            except InterfaceError:
+                # pool is closed by connection error of other query
+                if replica.pool is pool:
+                    raise
+
+        async with await self.acquire() as conn:
+            return await func(conn)
+
+    # healthy replica for next query: by turns or with min connections in use (by turns from equal),
+    # None - all replicas are unhealthy, unhealthy replicas are connected in background after retry time
+    def _get_replica(self) -> ReplicaPool:
+        now = time.monotonic()
+        for replica in self._replicas:
+            if replica.pool is None and replica.retry_at is not None and replica.retry_at <= now:
+                asyncio.ensure_future(self._open_replica(replica))
+
+        index = self._replica_next = (self._replica_next + 1) % len(self._replicas)
+        replicas = [replica for replica in self._replicas[index:] + self._replicas[:index] if replica.pool is not None]
+        if not replicas:
+            return None
+        if self._config.get('replica_selection') == 'least_loaded':
+            return min(replicas, key=lambda r: r.gauges.in_use + r.gauges.waiting)
+        return replicas[0]
+
+    # query is executed on replica: request is routed to replicas & query is select,
+    # write query (query_string None - transaction) routes next selects of request to primary & marks route as wrote
+    def _is_replica_query(self, query_string: str=None) -> bool:
+        route = current_db_route.get()
+        if route is None:
+            return False
+        if query_string is None or not is_read_query(query_string):
+            route.replica = False
+            route.wrote = True
+            return False
+        return route.replica and bool(self._replicas)
+
+    # start route of queries for current context (request): replica - selects to replicas, return token for stop
+    @staticmethod
+    def start_route(replica: bool):
+        return current_db_route.set(DBRoute(replica))
+
+    # stop route of queries by token of start, return DBRoute
+    @staticmethod
+    def stop_route(token) -> DBRoute:
+        route = current_db_route.get()
+        current_db_route.reset(token)
+        return route
+
+    # route requests of session (key) to primary for replica_pin_seconds (read-your-writes)
+    def pin_primary(self, key: str):
+        ttl = self._config.get('replica_pin_seconds')
+        if not key or not ttl or not self._replicas:
+            return
+        now = time.monotonic()
+        if len(self._pins) >= self.MAX_PINS:
+            self._pins = {k: expire for k, expire in self._pins.items() if expire > now}
+            if len(self._pins) >= self.MAX_PINS:
+                self._pins.clear()
+        self._pins[key] = now + ttl
+
+    # requests of session (key) are routed to primary
+    def is_pinned(self, key: str) -> bool:
+        if not key or not self._pins:
+            return False
+        expire = self._pins.get(key)
+        if expire is None:
+            return False
+        if expire <= time.monotonic():
+            del self._pins[key]
+            return False
+        return True
+
+    # compile query, CompiledQuery (from statement_cache) returned as is
+    @staticmethod
+    def _compile(query) -> CompiledQuery:
+        if isinstance(query, CompiledQuery):
+            return query
+        return CompiledQuery(*compile_query(query))
+
+    # statistic by compiled queries & prepared statements
+    def get_stats(self) -> dict:
+        return dict(
+            statement_cache=self.statement_cache.stats(),
+            prepared_statements=PreparedConnection.stats(),
+            coalesced_selects=self.select_flights.stats(),
+            pool=dict(self.pool_gauges.stats(), max_size=self._config.get('max_size', 10)),
+            replicas={replica.name: replica.stats() for replica in self._replicas}
+        )
+
+    # start statistic of queries for current context (request), return token for stop or None if disabled
+    def start_query_stats(self):
+        if not self._config.get('query_stats', True):
+            return None
+        return current_query_stats.set(QueryStats())
+
+    # stop statistic of queries by token of start, return QueryStats or None
+    @staticmethod
+    def stop_query_stats(token) -> QueryStats:
+        if token is None:
+            return None
+        stats = current_query_stats.get()
+        current_query_stats.reset(token)
+        return stats
+
+    # add executed query to statistic of current context
+    @staticmethod
+    def _add_query_stats(query_string: str, started: float):
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.add(query_string, time.perf_counter() - started)
+
     # execute query
     async def query_execute(self, query):
-        query_string, params = compile_query(query)
-        async with (await self.get_pool()).acquire() as conn:
-            return await conn.execute(query_string, *params)
+        started = time.perf_counter()
+        query_string, params = self._compile(query)
+        try:
+            return await self._call(lambda conn: conn.execute_prepared('execute', query_string, params),
+                                    self._is_replica_query(query_string))
+        finally:
+            self._add_query_stats(query_string, started)
 
     # execute query and return one row
     async def query_fetchrow(self, query):
-        query_string, params = compile_query(query)
-        async with (await self.get_pool()).acquire() as conn:
-            return await conn.fetchrow(query_string, *params)
+        started = time.perf_counter()
+        query_string, params = self._compile(query)
+        try:
+            return await self._call(lambda conn: conn.execute_prepared('fetchrow', query_string, params),
+                                    self._is_replica_query(query_string))
+        finally:
+            self._add_query_stats(query_string, started)
 
     # execute query and return all rows
     async def query_fetch(self, query):
-        query_string, params = compile_query(query)
-        async with (await self.get_pool()).acquire() as conn:
-            return await conn.fetch(query_string, *params)
+        started = time.perf_counter()
+        query = self._compile(query)
+        try:
+            return await self._fetch(query, self._is_replica_query(query.query_string))
+        finally:
+            self._add_query_stats(query.query_string, started)
+
+    # execute compiled query and return all rows (without statistic)
+    async def _fetch(self, query: CompiledQuery, replica: bool=False):
+        return await self._call(lambda conn: conn.execute_prepared('fetch', query.query_string, query.params), replica)
+
+    # execute select and return all rows, concurrent identical selects (sql & params) are executed once
+    async def query_fetch_coalesced(self, query) -> list:
+        query = self._compile(query)
+        if not self._config.get('coalesce_selects', True):
+            return await self.query_fetch(query)
+
+        replica = self._is_replica_query(query.query_string)
+        # request wrote: select in flight may be started before write - without coalescing (read-your-writes)
+        route = current_db_route.get()
+        if route is not None and route.wrote:
+            return await self.query_fetch(query)
+        try:
+            key = (replica, query.query_string, _freeze_params(query.params))
+            hash(key)
+        # not hashable params (dict, ...) - without coalescing
+        except TypeError:
+            return await self.query_fetch(query)
+
+        # rows are shared by callers - every caller gets its list, every caller counts query with time of waiting
+        started = time.perf_counter()
+        try:
+            return list(await self.select_flights.do(key, lambda: self._fetch(query, replica)))
+        finally:
+            self._add_query_stats(query.query_string, started)
 
     # execute query and return column[0]
     async def query_fetchval(self, query, column=0):
         """ return a value in the first row. """
-        query_string, params = compile_query(query)
-        async with (await self.get_pool()).acquire() as conn:
-            return await conn.fetchval(query_string, *params, column=column)
+        started = time.perf_counter()
+        query_string, params = self._compile(query)
+        try:
+            return await self._call(lambda conn: conn.execute_prepared('fetchval', query_string, params, column=column),
+                                    self._is_replica_query(query_string))
+        finally:
+            self._add_query_stats(query_string, started)
+
+    # execute query and iterate rows by server-side cursor (prefetch rows by one round-trip), cursor works in transaction
+    # time in statistic is time of cursor with processing of rows, connection error of replica before first row -
+    # replica is unhealthy & cursor is opened on primary
+    async def query_cursor(self, query, prefetch: int=None):
+        started = time.perf_counter()
+        query_string, params = self._compile(query)
+        prefetch = prefetch or self._config.get('cursor_prefetch', 500)
+        try:
+            replica = self._get_replica() if self._is_replica_query(query_string) and self._replicas else None
+            if replica is not None:
+                pool = replica.pool
+                rows = 0
+                acquire = PoolAcquire(pool, replica.gauges, self._config.get('acquire_timeout'))
+                cursor = self._iter_cursor(acquire, query_string, params, prefetch)
+                try:
+                    async for record in cursor:
+                        rows += 1
+                        yield record
+                    return
+                except CONNECTION_ERRORS as e:
+                    if rows:
+                        raise
+                    self._set_unhealthy(replica, pool, e)
+                except InterfaceError:
+                    # pool is closed by connection error of other query
+                    if rows or replica.pool is pool:
+                        raise
+                finally:
+                    await cursor.aclose()
+
+            cursor = self._iter_cursor(await self.acquire(), query_string, params, prefetch)
+            try:
+                async for record in cursor:
+                    yield record
+            finally:
+                await cursor.aclose()
+        finally:
+            self._add_query_stats(query_string, started)
+
+    @staticmethod
+    # iterate rows by server-side cursor on connection of pool (without statistic)
+    async def _iter_cursor(acquire: PoolAcquire, query_string: str, params: list, prefetch: int):
+        async with acquire as conn:
+            async with conn.transaction(readonly=True):
+                statement = await conn.prepare_cached(query_string)
+                async for record in statement.cursor(*params, prefetch=prefetch):
+                    yield record
+
+    # execute queries in one transaction and return rows of all queries
+    async def query_fetch_batch(self, queries: list) -> list:
+        result = []
+        # write queries: next selects of request to primary
+        self._is_replica_query()
+        async with await self.acquire() as conn:
+            # one query - without transaction
+            if len(queries) == 1:
+                started = time.perf_counter()
+                query_string, params = self._compile(queries[0])
+                try:
+                    return await conn.fetch(query_string, *params)
+                finally:
+                    self._add_query_stats(query_string, started)
+
+            async with conn.transaction():
+                for query in queries:
+                    started = time.perf_counter()
+                    query_string, params = self._compile(query)
+                    try:
+                        result.extend(await conn.fetch(query_string, *params))
+                    finally:
+                        self._add_query_stats(query_string, started)
+        return result
+
+    # call func(conn) in transaction on one connection, return result of func (rollback on exception)
+    # transaction is one query in statistic
+    async def query_transaction(self, func):
+        started = time.perf_counter()
+        # transaction on primary: next selects of request to primary
+        self._is_replica_query()
+        try:
+            async with await self.acquire() as conn:
+                async with conn.transaction():
+                    return await func(conn)
+        finally:
+            self._add_query_stats('transaction: {}'.format(getattr(func, '__qualname__', func)), started)
 
     # handler to graceful terminate application
     async def on_shutdown(self, app=None) -> None:
@@ -89,3 +476,7 @@ class DBManager(metaclass=Singleton):
         # close db pool
         if self._pool:
             await self._pool.close()
+        for replica in self._replicas:
+            if replica.pool is not None:
+                await replica.pool.close()
+        self._replicas = []
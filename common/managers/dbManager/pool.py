@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+from asyncpg import PostgresConnectionError
+from asyncpg.exceptions import AdminShutdownError, CannotConnectNowError
+
+from .query_stats import current_query_stats
+
+# errors of connection to db (server is down, connection is lost, server is shutting down or starting)
+CONNECTION_ERRORS = (OSError, PostgresConnectionError, AdminShutdownError, CannotConnectNowError)
+
+
+# connection is not acquired from pool in time of acquire_timeout
+class PoolTimeoutError(Exception):
+    pass
+
+
+# gauges & counters of connections pool
+class PoolGauges:
+    __slots__ = ('in_use', 'waiting', 'max_in_use', 'max_waiting', 'acquires', 'wait_time', 'max_wait_time',
+                 'timeouts')
+
+    def __init__(self):
+        # connections acquired now & peak
+        self.in_use = 0
+        self.max_in_use = 0
+        # acquires waiting for connection now & peak
+        self.waiting = 0
+        self.max_waiting = 0
+        # count acquires, seconds of waiting (all & max), acquires by timeout
+        self.acquires = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.timeouts = 0
+
+    # statistic by pool (durations in milliseconds)
+    def stats(self) -> dict:
+        return dict(
+            in_use=self.in_use,
+            max_in_use=self.max_in_use,
+            waiting=self.waiting,
+            max_waiting=self.max_waiting,
+            acquires=self.acquires,
+            avg_wait_ms=round(self.wait_time / self.acquires * 1000, 3) if self.acquires else 0.0,
+            max_wait_ms=round(self.max_wait_time * 1000, 3),
+            timeouts=self.timeouts,
+        )
+
+
+# pool of read replica: pool is None while replica is unhealthy (not connected), connected again after retry_at
+class ReplicaPool:
+    __slots__ = ('name', 'dsn', 'pool', 'gauges', 'retry_at')
+
+    def __init__(self, name: str, dsn: str):
+        # name of replica without credentials
+        self.name = name
+        self.dsn = dsn
+        self.pool = None
+        self.gauges = PoolGauges()
+        # monotonic time of next connecting of unhealthy replica, None - connecting now
+        self.retry_at = 0.0
+
+    # statistic by replica
+    def stats(self) -> dict:
+        return dict(self.gauges.stats(), healthy=self.pool is not None)
+
+
+# acquire of connection from pool with timeout: async with PoolAcquire(pool, gauges, timeout) as conn
+class PoolAcquire:
+    __slots__ = ('_pool', '_gauges', '_timeout', '_conn')
+
+    def __init__(self, pool, gauges: PoolGauges, timeout: float=None):
+        self._pool = pool
+        self._gauges = gauges
+        # seconds of waiting for connection, None - without limit
+        self._timeout = timeout
+        self._conn = None
+
+    async def __aenter__(self):
+        gauges = self._gauges
+        gauges.waiting += 1
+        gauges.max_waiting = max(gauges.max_waiting, gauges.waiting)
+        started = time.perf_counter()
+        try:
+            self._conn = await self._pool.acquire(timeout=self._timeout)
+        except asyncio.TimeoutError:
+            gauges.timeouts += 1
+            raise PoolTimeoutError('Connection is not acquired in {} s'.format(self._timeout))
+        finally:
+            gauges.waiting -= 1
+
+        wait_time = time.perf_counter() - started
+        gauges.acquires += 1
+        gauges.wait_time += wait_time
+        gauges.max_wait_time = max(gauges.max_wait_time, wait_time)
+        gauges.in_use += 1
+        gauges.max_in_use = max(gauges.max_in_use, gauges.in_use)
+
+        # waiting of request for connections
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.wait += wait_time
+        return self._conn
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._gauges.in_use -= 1
+        await self._pool.release(self._conn)
@@ -0,0 +1,50 @@
+from contextvars import ContextVar
+
+# statistic of queries of current request (context of task), None - not collected
+current_query_stats = ContextVar('current_query_stats', default=None)
+
+
+# count, cumulative time & slowest statement of queries by one request
+class QueryStats:
+    __slots__ = ('count', 'duration', 'slowest', 'slowest_duration', 'wait')
+
+    # min time of queries (milliseconds) of request for log line, 0 - log all requests
+    log_min_ms = 0.0
+
+    def __init__(self):
+        # count queries
+        self.count = 0
+        # seconds of all queries (with waiting of connection)
+        self.duration = 0.0
+        # sql-text of slowest query & its seconds
+        self.slowest = None
+        self.slowest_duration = 0.0
+        # seconds of waiting for connections of pool
+        self.wait = 0.0
+
+    # add executed query
+    def add(self, query_string: str, duration: float):
+        self.count += 1
+        self.duration += duration
+        if duration >= self.slowest_duration:
+            self.slowest = query_string
+            self.slowest_duration = duration
+
+    # statistic must be written to log
+    def is_logged(self) -> bool:
+        return self.count > 0 and self.duration * 1000 >= self.log_min_ms
+
+    # value of header Server-Timing (durations in milliseconds)
+    def server_timing(self) -> str:
+        return 'db;desc="queries: {}";dur={:.3f}, db-slowest;dur={:.3f}, db-wait;dur={:.3f}'.format(
+            self.count, self.duration * 1000, self.slowest_duration * 1000, self.wait * 1000)
+
+    # statistic as dict (durations in milliseconds)
+    def to_dict(self) -> dict:
+        return dict(
+            queries=self.count,
+            db_ms=round(self.duration * 1000, 3),
+            slowest_ms=round(self.slowest_duration * 1000, 3),
+            slowest=self.slowest,
+            wait_ms=round(self.wait * 1000, 3),
+        )
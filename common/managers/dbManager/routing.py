@@ -0,0 +1,21 @@
+from contextvars import ContextVar
+
+# route of queries of current request (context of task), None - all queries to primary
+current_db_route = ContextVar('current_db_route', default=None)
+
+
+# route of queries by one request: selects to replicas until first write (read-your-writes in request)
+class DBRoute:
+    __slots__ = ('replica', 'wrote')
+
+    def __init__(self, replica: bool):
+        # selects are executed on replicas
+        self.replica = replica
+        # request executed write queries (on primary)
+        self.wrote = False
+
+
+# query can be executed on replica: select without locks of rows
+def is_read_query(query_string: str) -> bool:
+    return query_string.lstrip()[:6].upper() == 'SELECT' and 'FOR UPDATE' not in query_string \
+        and 'FOR SHARE' not in query_string
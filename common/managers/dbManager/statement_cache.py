@@ -0,0 +1,159 @@
+from collections import OrderedDict, namedtuple
+
+from asyncpgsa import compile_query
+from asyncpgsa.connection import get_dialect
+from sqlalchemy.sql import visitors, elements, functions
+from sqlalchemy.sql.elements import BindParameter
+
+# dialect for compile queries, the same as in asyncpgsa.compile_query
+_dialect = get_dialect()
+
+# compiled query: sql-text and list of params, may be passed to DBManager.query_* instead of sqlalchemy-query
+CompiledQuery = namedtuple('CompiledQuery', ['query_string', 'params'])
+
+# item of cache: sql-text and binding plan [(bind index, processor), ...]
+_CacheItem = namedtuple('_CacheItem', ['query_string', 'plan'])
+
+
+# shape of element of conditions (all that changes sql-text, without values of binds),
+# None - unknown element (query is not cached)
+def _get_element_shape(element) -> tuple:
+    cls = element.__class__
+    if isinstance(element, BindParameter):
+        return cls, repr(element.type), element.expanding
+    if isinstance(element, elements.ColumnClause):
+        return cls, element.name, element.is_literal, getattr(getattr(element, 'table', None), 'name', None)
+    if isinstance(element, elements.BinaryExpression):
+        return cls, element.operator, element.negate, tuple(sorted(element.modifiers.items()))
+    # CollectionAggregate (any_, all_) is unary expression
+    if isinstance(element, elements.UnaryExpression):
+        return cls, element.operator, element.modifier
+    if isinstance(element, elements.ClauseList):
+        return cls, element.operator
+    if isinstance(element, (elements.Cast, elements.TypeCoerce, elements.TypeClause)):
+        return cls, repr(element.type)
+    if isinstance(element, functions.FunctionElement):
+        return cls, getattr(element, 'name', None), tuple(getattr(element, 'packagenames', None) or ())
+    if isinstance(element, elements.TextClause):
+        return cls, element.text
+    if isinstance(element, elements.Label):
+        return cls, element.name
+    if isinstance(element, (elements.Grouping, elements.Null, elements.True_, elements.False_, elements.Tuple)):
+        return cls,
+    return None
+
+
+# calc shape of conditions (without values) & list bind-params in order of traversal
+def get_conditions_shape(conditions: list) -> (tuple, list):
+    """
+    :param conditions: list of sqlalchemy-conditions
+    :return: (shape: tuple or None if conditions have unknown elements, binds: list of BindParameter)
+    """
+    shape = []
+    binds = []
+    for condition in conditions:
+        for element in visitors.iterate(condition, {}):
+            element_shape = _get_element_shape(element)
+            if element_shape is None:
+                return None, binds
+            if isinstance(element, BindParameter):
+                binds.append(element)
+            shape.append(element_shape)
+    return tuple(shape), binds
+
+
+# LRU cache of compiled queries by key (entity, fields, conditions-shape)
+class StatementCache:
+    __slots__ = ('_items', '_max_size', 'hits', 'misses')
+
+    def __init__(self, max_size: int=1024):
+        # key: _CacheItem
+        self._items = OrderedDict()
+        # max count items in cache
+        self._max_size = max_size
+        # counters
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    # set max size of cache
+    def set_max_size(self, max_size: int):
+        self._max_size = max_size
+        self._evict()
+
+    # clear cache & counters
+    def clear(self):
+        self._items.clear()
+        self.hits = 0
+        self.misses = 0
+
+    # statistic by cache
+    def stats(self) -> dict:
+        return dict(
+            size=len(self._items),
+            max_size=self._max_size,
+            hits=self.hits,
+            misses=self.misses,
+        )
+
+    # remove old items
+    def _evict(self):
+        while len(self._items) > self._max_size:
+            self._items.popitem(last=False)
+
+    # return CompiledQuery by key & conditions, build_query called only if compiled query not in cache
+    def compile(self, key: tuple, conditions: list, build_query) -> CompiledQuery:
+        """
+        :param key: tuple. Key of query without conditions (entity, fields, ...)
+        :param conditions: list of sqlalchemy-conditions, values of it bind to compiled query
+        :param build_query: callable() -> sqlalchemy-query, called on cache-miss
+        :return: CompiledQuery
+        """
+        shape, binds = get_conditions_shape(conditions)
+        # conditions with unknown elements - do not cache query
+        if shape is None:
+            self.misses += 1
+            return CompiledQuery(*compile_query(build_query()))
+        key = (key, shape)
+
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            query = build_query()
+            item = self._compile_item(query, binds)
+            # query has binds not from conditions - do not cache it
+            if item.plan is None:
+                return CompiledQuery(*compile_query(query))
+            self._items[key] = item
+            self._evict()
+        else:
+            self.hits += 1
+            self._items.move_to_end(key)
+
+        return CompiledQuery(
+            item.query_string,
+            [processor(binds[i].effective_value) if processor else binds[i].effective_value for i, processor in item.plan]
+        )
+
+    # compile query & calc binding plan by list bind-params
+    @staticmethod
+    def _compile_item(query, binds: list) -> _CacheItem:
+        compiled = query.compile(dialect=_dialect)
+        # positions of binds (by identity)
+        positions = {id(bind): i for i, bind in enumerate(binds)}
+
+        # params sorted by name, as in asyncpgsa.compile_query
+        names = sorted(((name, bind) for bind, name in compiled.bind_names.items()), key=lambda item: item[0])
+        mapping = {name: '$' + str(i) for i, (name, _) in enumerate(names, start=1)}
+        processors = compiled._bind_processors
+
+        plan = []
+        for name, bind in names:
+            position = positions.get(id(bind))
+            if position is None:
+                return _CacheItem(None, None)
+            plan.append((position, processors.get(name)))
+
+        return _CacheItem(compiled.string % mapping, tuple(plan))
@@ -3,4 +3,5 @@
 """
 
 from .manager import SessionManager
-from .session import Session
\ No newline at end of file
+from .session import Session
+from .store import SessionStoreError
\ No newline at end of file
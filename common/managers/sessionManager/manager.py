@@ -1,11 +1,12 @@
 import asyncio
-import random
-import string
+import secrets
 from settings import logger
 import ujson
 import time
+from collections import OrderedDict
 
 from .session import Session
+from .store import connect_session_store, SessionStoreError
 
 # meta-class
 class Singleton(type):
@@ -19,7 +20,13 @@ class Singleton(type):
 
 # Singleton Session-manager
 class SessionManager(metaclass=Singleton):
-    __slots__ = '_pool', '_sids_users',
+    __slots__ = '_pool', '_sids_users', '_acl', '_store', '_local_ttl', '_local_size', '_checked', \
+                '_ttl', '_idle_timeout', '_max_sessions', '_sweep_interval', '_sweeper', '_stats', \
+                '_count_processes',
+
+    # session backends
+    BACKEND_MEMORY = 'memory'
+    BACKEND_SHARED = 'shared'
 
     def __init__(self):
         """ run self.set_session_type after init! """
@@ -27,17 +34,69 @@ class SessionManager(metaclass=Singleton):
         self._pool = dict()
         # dict accordance sid:user_id
         self._sids_users = dict()
+        # allowed schedules by user-id: frozenset, shared by all sessions of user
+        self._acl = dict()
+
+        # client of shared store of sessions, None - sessions only in memory of process
+        self._store = None
+        # seconds while local session is used without check in shared store
+        self._local_ttl = 5
+        # max count sessions in local cache (for shared store)
+        self._local_size = 10000
+        # sid: time of last check in shared store, order - LRU (for all backends)
+        self._checked = OrderedDict()
+
+        # seconds from login while session is alive, 0 - without limit
+        self._ttl = 0
+        # seconds from last request while session is alive, 0 - without limit
+        self._idle_timeout = 0
+        # max count sessions, least recently used sessions are removed, 0 - without limit
+        self._max_sessions = 0
+        # seconds between runs of sweeper (remove expired sessions)
+        self._sweep_interval = 60
+        # task of sweeper
+        self._sweeper = None
+        # counters
+        self._stats = dict(expired=0, evicted=0)
+        # count web-api processes (ACL of memory backend is cached only for one process)
+        self._count_processes = 1
+
+    # set settings for sessions backend
+    def set_settings(self, config: dict):
+        self._local_ttl = float(config.get('local_ttl') or self._local_ttl)
+        self._local_size = int(config.get('local_size') or self._local_size)
+        self._ttl = float(config.get('ttl') or 0)
+        self._idle_timeout = float(config.get('idle_timeout') or 0)
+        self._max_sessions = int(config.get('max_sessions') or 0)
+        self._sweep_interval = float(config.get('sweep_interval') or self._sweep_interval)
+        self._count_processes = int(config.get('count_processes') or 1)
+
+        # shared store for all processes, seconds of waiting for answer of store
+        if config.get('backend') == self.BACKEND_SHARED:
+            self._store = connect_session_store(config['store_address'], float(config.get('store_timeout') or 1))
+            logger.info('Sessions: shared store {}'.format(config['store_address']))
 
     # generate session by user_platform-type
     async def generate_session(self, data: dict) -> Session:
         """ Generate new session by Entity-data. Return sid """
         # new session
-        result = Session(data, sid=self.generate_sid())
+        result = Session(data, sid=self.generate_sid(), created_at=time.time())
 
         # save to pool
-        self.add_session(result)
+        await self.add_session(result)
 
-        await self.update_acl_by_acc_id(result.id)
+        # ACL from shared store (changed by all processes), from cache of the only process or load from db:
+        # cache of one of many processes misses schedules created by other processes
+        if self._store:
+            acl = await self._store.call('get_acl', result.id)
+        elif self._count_processes == 1:
+            acl = self._acl.get(result.id)
+        else:
+            acl = None
+        if acl is not None:
+            self._set_local_acl(result.id, acl)
+        else:
+            await self.update_acl_by_acc_id(result.id)
 
         logger.debug('Login: {}'.format(result))
         return result
@@ -47,7 +106,15 @@ class SessionManager(metaclass=Singleton):
         return result
 
     # add session to pool
-    def add_session(self, session: Session):
+    async def add_session(self, session: Session):
+        self._add_local_session(session)
+
+        # save to shared store
+        if self._store:
+            await self._store.call('set_session', session.sid, session.__dict__, self._max_sessions)
+
+    # add session to pool of process
+    def _add_local_session(self, session: Session):
         # save session: user-id:sid:dict
         self._pool.setdefault(session.id, {})
         self._pool[session.id][session.sid] = session
@@ -55,47 +122,211 @@ class SessionManager(metaclass=Singleton):
         # add accordance sid-user
         self._sids_users[session.sid] = session.id
 
+        session.accessed_at = time.time()
+        self._checked[session.sid] = time.monotonic()
+        self._checked.move_to_end(session.sid)
+
+        # local cache of shared store: remove old sessions from cache (not from store)
+        if self._store:
+            while len(self._checked) > self._local_size:
+                self._del_local_session(next(iter(self._checked)))
+        # sessions only in process: remove least recently used sessions
+        elif self._max_sessions:
+            while len(self._checked) > self._max_sessions:
+                self._del_local_session(next(iter(self._checked)))
+                self._stats['evicted'] += 1
+
+    # delete session from pool of process
+    def _del_local_session(self, sid: str):
+        user_id = self._sids_users.pop(sid, None)
+        if user_id is None:
+            return
+        self._checked.pop(sid, None)
+        self._pool[user_id].pop(sid, None)
+        # last session of user - remove user from pool & ACL
+        if not self._pool[user_id]:
+            self._pool.pop(user_id)
+            self._acl.pop(user_id, None)
+
+    # load session from shared store to pool of process (read-through)
+    async def _load_session(self, sid: str) -> Session or None:
+        data, acl = await self._store.call('load', sid)
+        # session closed by other process
+        if data is None:
+            self._del_local_session(sid)
+            return None
+
+        if sid in self._sids_users:
+            session = self._pool[self._sids_users[sid]][sid]
+            session.load_dict(data)
+        else:
+            session = Session(data, sid=sid)
+        self._add_local_session(session)
+
+        if acl is not None:
+            self._set_local_acl(session.id, acl)
+        else:
+            session.schedule_ids = self._acl.get(session.id, frozenset())
+        return session
+
     # isset session?
-    def isset_session_by_sid(self, sid: str) -> bool:
+    async def isset_session_by_sid(self, sid: str) -> bool:
         # return True if self._sids_users.get(sid) and self._pool[self._sids_users[sid]].get(sid) else False
-        return True if self._sids_users.get(sid) else False
+        return True if await self.get_session_by_sid(sid) else False
 
-    # get session from loop by SID
-    def get_session_by_sid(self, sid: str) -> Session:
+    # get session from loop by SID, session of local cache is used while shared store is not available,
+    # raise SessionStoreError if session is not in local cache & store is not available
+    async def get_session_by_sid(self, sid: str) -> Session:
         # Session or None
-        return self._pool[self._sids_users[sid]][sid] if self.isset_session_by_sid(sid) else None
+        if not sid:
+            return None
+
+        # only sessions of process
+        if not self._store:
+            session = self._pool[self._sids_users[sid]][sid] if self._sids_users.get(sid) else None
+            if session and self._is_expired(session, time.time()):
+                self._del_local_session(sid)
+                self._stats['expired'] += 1
+                return None
+        else:
+            # local cache, checked in shared store not later than local_ttl
+            checked = self._checked.get(sid)
+            if checked is not None and time.monotonic() - checked < self._local_ttl:
+                session = self._pool[self._sids_users[sid]][sid]
+            else:
+                try:
+                    session = await self._load_session(sid)
+                except SessionStoreError as e:
+                    if checked is None:
+                        raise
+                    logger.error('SessionManager#get_session_by_sid: {}, session of process is used'.format(e))
+                    session = self._pool[self._sids_users[sid]][sid]
+
+        if session:
+            session.accessed_at = time.time()
+            self._checked.move_to_end(sid)
+        return session
+
+    # session is expired by ttl or idle timeout
+    def _is_expired(self, session: Session, now: float) -> bool:
+        return bool((self._ttl and now - session.created_at > self._ttl) or
+                    (self._idle_timeout and now - session.accessed_at > self._idle_timeout))
+
+    # remove expired sessions, return count removed
+    async def sweep(self) -> int:
+        # shared store: expired sessions removed from store, local cache is checked by local_ttl
+        if self._store:
+            return await self._store.call('sweep', self._ttl, self._idle_timeout)
+
+        now = time.time()
+        expired = [sid for sid, user_id in self._sids_users.items() if self._is_expired(self._pool[user_id][sid], now)]
+        for sid in expired:
+            self._del_local_session(sid)
+        self._stats['expired'] += len(expired)
+        return len(expired)
+
+    # background task: remove expired sessions every sweep_interval seconds
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self._sweep_interval)
+            try:
+                count = await self.sweep()
+                if count:
+                    logger.debug('Sessions: removed {} expired'.format(count))
+            except Exception as e:
+                logger.error('SessionManager#sweep: {}'.format(e))
+
+    # handler on start application: run sweeper if sessions can expire
+    async def on_startup(self, app=None):
+        if (self._ttl or self._idle_timeout) and not self._sweeper:
+            self._sweeper = asyncio.ensure_future(self._sweep_loop())
+
+    # handler on shutdown application: stop sweeper, close connection to shared store
+    async def on_shutdown(self, app=None):
+        if self._sweeper:
+            self._sweeper.cancel()
+            self._sweeper = None
+        if self._store:
+            self._store.close()
+
+    # statistic by sessions: live, expired, evicted
+    async def get_stats(self) -> dict:
+        if self._store:
+            return await self._store.call('stats')
+        return dict(live=len(self._sids_users), **self._stats)
 
     # delete session & send empty message to mqtt for delete session
-    def del_session(self, sid: str):
+    async def del_session(self, sid: str):
         # delete from pool & accordance sid-user
-        if self.isset_session_by_sid(sid):
-            self._pool[self._sids_users[sid]].pop(sid)
-            self._sids_users.pop(sid)
+        self._del_local_session(sid)
+
+        # delete from shared store
+        if self._store:
+            await self._store.call('del_session', sid)
 
         # log
         logger.debug('Logout: {}'.format(sid))
 
     # generate sid by session-type
     def generate_sid(self) -> str:
-        """ generate new sid """
-        return ''.join([random.choice(string.ascii_letters + string.digits) for n in range(32)])
+        """ generate new sid: 24 random bytes (os.urandom) in url-safe base64, 32 chars """
+        sid = secrets.token_urlsafe(24)
+        # sid must be unique
+        while sid in self._sids_users:
+            sid = secrets.token_urlsafe(24)
+        return sid
 
     # get session acl
-    def get_session_acl_by_sid(self, sid) -> bool:
-        return self._pool[self._sids_users[sid]][sid].flags if self.isset_session_by_sid(sid) else 0
+    async def get_session_acl_by_sid(self, sid) -> bool:
+        session = await self.get_session_by_sid(sid)
+        return session.flags if session else 0
 
     # is admin session?
-    def is_admin(self, sid) -> bool:
-        return self._pool[self._sids_users[sid]][sid].is_admin if self.isset_session_by_sid(sid) else None
+    async def is_admin(self, sid) -> bool:
+        session = await self.get_session_by_sid(sid)
+        return session.is_admin if session else None
 
-    # update acl for Sessions by account-id, save session
+    # update acl for Sessions by account-id, one request to db for all sessions of user
     async def update_acl_by_acc_id(self, user_id: int):
-        # list session by account-id
-        sessions = self._pool.get(user_id, {})
-        # by all account-sessions
-        for sid in sessions:
-            # session
-            session = sessions[sid]
-            # update acl
-            # TODO: This is bad code, many requests to db
-            await session.update_acl()
+        await self.set_acl(user_id, await Session.load_schedule_ids(user_id))
+
+    # set allowed schedules for user & all it sessions
+    async def set_acl(self, user_id: int, schedule_ids: set or frozenset):
+        # not logged in user - nothing to update
+        if user_id not in self._pool:
+            return
+
+        self._set_local_acl(user_id, schedule_ids)
+
+        # save to shared store
+        if self._store:
+            await self._store.call('set_acl', user_id, list(schedule_ids))
+
+    # set allowed schedules for sessions of user in process
+    def _set_local_acl(self, user_id: int, schedule_ids: set or frozenset or list):
+        if user_id not in self._pool:
+            return
+
+        acl = self._acl[user_id] = frozenset(schedule_ids)
+        for session in self._pool[user_id].values():
+            session.schedule_ids = acl
+
+    # add allowed schedules for user (created schedules)
+    async def add_acl_schedules(self, user_id: int, schedule_ids: list or set):
+        # change in shared store, store return new ACL
+        if self._store:
+            acl = await self._store.call('add_acl', user_id, list(schedule_ids))
+            if acl is not None:
+                self._set_local_acl(user_id, acl)
+        elif user_id in self._acl:
+            await self.set_acl(user_id, self._acl[user_id].union(schedule_ids))
+
+    # remove allowed schedules for user (deleted schedules)
+    async def remove_acl_schedules(self, user_id: int, schedule_ids: list or set):
+        # change in shared store, store return new ACL
+        if self._store:
+            acl = await self._store.call('remove_acl', user_id, list(schedule_ids))
+            if acl is not None:
+                self._set_local_acl(user_id, acl)
+        elif user_id in self._acl:
+            await self.set_acl(user_id, self._acl[user_id].difference(schedule_ids))
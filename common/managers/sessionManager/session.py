@@ -4,7 +4,8 @@ ACL = dict(USER=0x1, CUSTOMER=0x1000)
 
 # base Session
 class Session:
-    __slots__ = 'id', 'login', 'name', 'sid', 'email', 'phone', 'description', 'flags', 'schedule_ids'
+    __slots__ = 'id', 'login', 'name', 'sid', 'email', 'phone', 'description', 'flags', 'schedule_ids', \
+                'created_at', 'accessed_at'
 
     # load data from dict/object or kwargs
     def __init__(self, data: dict={}, **kwargs):
@@ -26,8 +27,12 @@ class Session:
         self.flags = 0
         # str
         self.sid = None
-        #
-        self.schedule_ids = []
+        # allowed schedules, frozenset shared by all sessions of user
+        self.schedule_ids = frozenset()
+        # time of login (timestamp)
+        self.created_at = 0
+        # time of last request (timestamp)
+        self.accessed_at = 0
 
         # set attrs from data-dict
         if data:
@@ -62,7 +67,8 @@ class Session:
             email=self.email,
             phone=self.phone,
             description=self.description,
-            flags=self.flags
+            flags=self.flags,
+            created_at=self.created_at
         )
 
     def __str__(self):
@@ -70,10 +76,15 @@ class Session:
 
     # update ACL (allowed schedules)
     async def update_acl(self):
-        self.schedule_ids = [item['id'] for item in await self._get_schedule_ids(self.id)]
+        self.schedule_ids = await self.load_schedule_ids(self.id)
+
+    @classmethod
+    # load allowed schedule-ids from db
+    async def load_schedule_ids(cls, id) -> frozenset:
+        return frozenset(item['id'] for item in await cls._get_schedule_ids(id))
 
     @classmethod
     # get allowed schedule-ids
     async def _get_schedule_ids(cls, id) -> list:
         res = await Schedule.select_where(cls_fields={Schedule.id}, conditions=[Schedule.creater_id == id])
-        return res
\ No newline at end of file
+        return res
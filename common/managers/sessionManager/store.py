@@ -0,0 +1,245 @@
+"""
+    Shared session store for all web-api processes (process of store, asyncio by unix-socket)
+"""
+
+import asyncio
+import os
+import time
+import ujson
+from collections import OrderedDict, deque
+from multiprocessing import Process
+
+
+# Store of sessions & ACL, lives in the process of manager-server
+class SessionStore:
+    def __init__(self):
+        # sid: dict session data, order - LRU
+        self._sessions = OrderedDict()
+        # sid: time of last load (timestamp)
+        self._accessed = dict()
+        # user-id: set sids
+        self._users = dict()
+        # user-id: list allowed schedules
+        self._acl = dict()
+        # counters
+        self._expired = 0
+        self._evicted = 0
+
+    # get session data & ACL of user by sid, (None, None) if session not found
+    def load(self, sid: str) -> tuple:
+        data = self._sessions.get(sid)
+        if data is None:
+            return None, None
+        self._sessions.move_to_end(sid)
+        self._accessed[sid] = time.time()
+        return data, self._acl.get(data['id'])
+
+    # save session data, remove least recently used sessions over max_sessions (0 - without limit)
+    def set_session(self, sid: str, data: dict, max_sessions: int=0):
+        self._sessions[sid] = data
+        self._accessed[sid] = time.time()
+        self._users.setdefault(data['id'], set()).add(sid)
+
+        while max_sessions and len(self._sessions) > max_sessions:
+            self.del_session(next(iter(self._sessions)))
+            self._evicted += 1
+
+    # delete session, ACL of user removed with last session
+    def del_session(self, sid: str):
+        data = self._sessions.pop(sid, None)
+        if data is None:
+            return
+        self._accessed.pop(sid, None)
+        sids = self._users.get(data['id'], set())
+        sids.discard(sid)
+        if not sids:
+            self._users.pop(data['id'], None)
+            self._acl.pop(data['id'], None)
+
+    # get allowed schedules of user
+    def get_acl(self, user_id: int) -> list or None:
+        return self._acl.get(user_id)
+
+    # save allowed schedules of user
+    def set_acl(self, user_id: int, schedule_ids: list):
+        self._acl[user_id] = schedule_ids
+
+    # add allowed schedules of user, return new list (atomic for all processes)
+    def add_acl(self, user_id: int, schedule_ids: list) -> list or None:
+        if user_id in self._acl:
+            self._acl[user_id] = list(set(self._acl[user_id]).union(schedule_ids))
+        return self._acl.get(user_id)
+
+    # remove allowed schedules of user, return new list (atomic for all processes)
+    def remove_acl(self, user_id: int, schedule_ids: list) -> list or None:
+        if user_id in self._acl:
+            self._acl[user_id] = list(set(self._acl[user_id]).difference(schedule_ids))
+        return self._acl.get(user_id)
+
+    # count sessions in store
+    def count(self) -> int:
+        return len(self._sessions)
+
+    # remove expired sessions: by time of login (ttl) & by time of last load (idle_timeout), return count
+    def sweep(self, ttl: float=0, idle_timeout: float=0) -> int:
+        now = time.time()
+        expired = [
+            sid for sid, data in self._sessions.items()
+            if (ttl and now - data.get('created_at', now) > ttl) or
+               (idle_timeout and now - self._accessed.get(sid, now) > idle_timeout)
+        ]
+        for sid in expired:
+            self.del_session(sid)
+        self._expired += len(expired)
+        return len(expired)
+
+    # statistic by sessions in store
+    def stats(self) -> dict:
+        return dict(
+            live=len(self._sessions),
+            expired=self._expired,
+            evicted=self._evicted,
+        )
+
+
+# methods of store called by clients
+STORE_METHODS = frozenset((
+    'load', 'set_session', 'del_session', 'get_acl', 'set_acl', 'add_acl', 'remove_acl', 'count', 'sweep', 'stats'
+))
+
+
+# store is not available: no connection, no answer in timeout
+class SessionStoreError(Exception):
+    pass
+
+
+# protocol: request - line of json [method, args], answer - line of json [error or None, result],
+# answers are sent in order of requests of connection
+async def _handle_client(store: SessionStore, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                method, args = ujson.loads(line)
+                if method not in STORE_METHODS:
+                    raise ValueError('Unknown method of store: {}'.format(method))
+                answer = [None, getattr(store, method)(*args)]
+            except Exception as e:
+                answer = [repr(e), None]
+            writer.write(ujson.dumps(answer).encode() + b'\n')
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+# run server of store (target of process of store)
+def _serve(address: str):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    store = SessionStore()
+    loop.run_until_complete(asyncio.start_unix_server(
+        lambda reader, writer: _handle_client(store, reader, writer), path=address
+    ))
+    loop.run_forever()
+
+
+# start process of store (run in main process before start web-api sub-processes)
+def start_session_store(address: str, wait: float=5) -> Process:
+    # remove socket of previous run
+    if os.path.exists(address):
+        os.remove(address)
+    process = Process(target=_serve, args=(address,), name='session_store', daemon=True)
+    process.start()
+    # wait for socket of server
+    deadline = time.monotonic() + wait
+    while not os.path.exists(address) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return process
+
+
+# client of store (in web-api sub-process): one connection, requests are pipelined, answers wait not longer timeout
+class SessionStoreClient:
+    __slots__ = ('_address', '_timeout', '_reader', '_writer', '_waiters', '_read_task', '_connect_lock')
+
+    def __init__(self, address: str, timeout: float=1):
+        self._address = address
+        # seconds of waiting for connection & for answer
+        self._timeout = timeout
+        # connection
+        self._reader = None
+        self._writer = None
+        # futures of answers in order of requests
+        self._waiters = deque()
+        # task of reading answers
+        self._read_task = None
+        # lock of connecting (created in loop)
+        self._connect_lock = None
+
+    # open connection if it is closed
+    async def _connect(self):
+        if self._writer is not None:
+            return
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is None:
+                self._reader, self._writer = await asyncio.open_unix_connection(self._address)
+                self._read_task = asyncio.ensure_future(self._read(self._reader))
+
+    # read answers of connection and resolve futures in order of requests
+    async def _read(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    raise ConnectionError('Connection closed by store')
+                future = self._waiters.popleft()
+                if not future.done():
+                    future.set_result(ujson.loads(line))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # connection is not replaced by new one
+            if self._reader is reader:
+                self._read_task = None
+                self.close(e)
+
+    # close connection, waiting requests are failed
+    def close(self, reason: Exception=None):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+        if self._read_task is not None:
+            self._read_task.cancel()
+        self._read_task = None
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_exception(SessionStoreError('Session store is not available: {!r}'.format(reason)))
+
+    # call method of store, raise SessionStoreError if store is not available
+    async def call(self, method: str, *args):
+        try:
+            await asyncio.wait_for(self._connect(), self._timeout)
+            future = asyncio.get_event_loop().create_future()
+            self._waiters.append(future)
+            self._writer.write(ujson.dumps([method, args]).encode() + b'\n')
+            error, result = await asyncio.wait_for(future, self._timeout)
+        except SessionStoreError:
+            raise
+        # answers of connection are out of order after timeout - connection is closed
+        except (OSError, asyncio.TimeoutError) as e:
+            self.close(e)
+            raise SessionStoreError('Session store is not available: {!r}'.format(e))
+        if error is not None:
+            raise SessionStoreError('Error of session store: {}'.format(error))
+        return result
+
+
+# client of store by unix-socket (run in web-api sub-process), connected on first call
+def connect_session_store(address: str, timeout: float=1) -> SessionStoreClient:
+    return SessionStoreClient(address, timeout)
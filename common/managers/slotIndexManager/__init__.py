@@ -0,0 +1,5 @@
+"""
+    SlotIndexManager (index of schedule details by time)
+"""
+
+from .manager import SlotIndexManager
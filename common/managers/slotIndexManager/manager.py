@@ -0,0 +1,195 @@
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from sqlalchemy.sql import any_
+
+from settings import logger
+from common.managers.cacheManager import SingleFlight
+from entity.schDetail import SCHDetail
+
+
+# metaclass Singleton
+class Singleton(type):
+    _instances = {}
+
+    def __call__(cls, *args, **kwargs):
+        if cls not in cls._instances:
+            cls._instances[cls] = super(Singleton, cls).__call__(*args, **kwargs)
+        return cls._instances[cls]
+
+
+# details of one schedule sorted by time: parallel arrays for bisect
+class _ScheduleSlots:
+    __slots__ = ('times', 'rows', 'expire')
+
+    def __init__(self, rows: list, expire: float):
+        self.rows = sorted(rows, key=lambda row: (row['time'], row['id']))
+        self.times = [row['time'] for row in self.rows]
+        # monotonic time of reload
+        self.expire = expire
+
+    # rows with time in [time_from, time_to)
+    def range(self, time_from: int=None, time_to: int=None) -> list:
+        start = 0 if time_from is None else bisect_left(self.times, time_from)
+        end = len(self.times) if time_to is None else bisect_left(self.times, time_to)
+        return self.rows[start:end]
+
+    # insert row by time
+    def insert(self, row: dict):
+        i = bisect_right(self.times, row['time'])
+        self.times.insert(i, row['time'])
+        self.rows.insert(i, row)
+
+    # remove row by id & time
+    def remove(self, rec_id: int, rec_time: int):
+        for i in range(bisect_left(self.times, rec_time), bisect_right(self.times, rec_time)):
+            if self.rows[i]['id'] == rec_id:
+                del self.times[i]
+                del self.rows[i]
+                return
+
+
+# Singleton index of schedule details (slots) by time: loaded lazily by schedule, updated by changes of details
+class SlotIndexManager(metaclass=Singleton):
+    __slots__ = ('_enabled', '_ttl', '_max_schedules', '_schedules', '_positions', '_generation', '_flights', '_stats')
+
+    # fields of details in index
+    FIELDS = ('id', 'time', 'description', 'members', 'price', 'schedule_id')
+
+    def __init__(self):
+        # index is used by range queries
+        self._enabled = True
+        # seconds while index of schedule is used, changes by other processes are visible after reload
+        self._ttl = 60
+        # max count schedules in index, least recently used schedules are removed
+        self._max_schedules = 10000
+        # schedule_id: _ScheduleSlots, order - LRU
+        self._schedules = OrderedDict()
+        # id of detail: (schedule_id, time) in index
+        self._positions = dict()
+        # count of changes, index loaded before change is not saved
+        self._generation = 0
+        # loads in flight
+        self._flights = SingleFlight()
+        # counters
+        self._stats = dict(hits=0, loads=0, updates=0, invalidations=0, evicted=0)
+
+    # set settings for index
+    def set_settings(self, config: dict):
+        self._enabled = str(config.get('enabled', True)).lower() in ('1', 'true', 'yes', 'on')
+        self._ttl = float(config.get('ttl') or self._ttl)
+        self._max_schedules = int(config.get('max_schedules') or self._max_schedules)
+        self.invalidate()
+        logger.info('Slot index: enabled {}, ttl {}, max_schedules {}'.format(
+            self._enabled, self._ttl, self._max_schedules))
+
+    @property
+    # index is used by range queries
+    def enabled(self) -> bool:
+        return self._enabled
+
+    # statistic by index
+    def get_stats(self) -> dict:
+        return dict(self._stats, schedules=len(self._schedules), slots=len(self._positions))
+
+    # details of schedules with time in [time_from, time_to), ordered by schedule_id & time
+    async def get_range(self, schedule_ids, time_from: int=None, time_to: int=None) -> list:
+        now = time.monotonic()
+        schedule_ids = sorted(schedule_ids)
+        missing = tuple(schedule_id for schedule_id in schedule_ids
+                        if schedule_id not in self._schedules or self._schedules[schedule_id].expire < now)
+        self._stats['hits'] += len(schedule_ids) - len(missing)
+
+        # concurrent loads of the same schedules are executed once
+        loaded = await self._flights.do((self._generation, missing), lambda: self._load(missing)) if missing else {}
+
+        result = []
+        for schedule_id in schedule_ids:
+            slots = loaded.get(schedule_id)
+            if slots is None:
+                slots = self._schedules.get(schedule_id)
+                if slots is not None:
+                    self._schedules.move_to_end(schedule_id)
+            if slots:
+                result.extend(slots.range(time_from, time_to))
+        return result
+
+    # load details of schedules, index is saved if it was not changed while loading
+    async def _load(self, schedule_ids: tuple) -> dict:
+        generation = self._generation
+        self._stats['loads'] += 1
+
+        rows = {schedule_id: [] for schedule_id in schedule_ids}
+        for record in await SCHDetail.select_where(str_fields=self.FIELDS,
+                                                   conditions=[SCHDetail.schedule_id == any_(list(schedule_ids))]):
+            rows[record['schedule_id']].append(dict(record))
+
+        expire = time.monotonic() + self._ttl
+        loaded = {schedule_id: _ScheduleSlots(items, expire) for schedule_id, items in rows.items()}
+        if generation == self._generation:
+            for schedule_id, slots in loaded.items():
+                self._drop(schedule_id)
+                self._schedules[schedule_id] = slots
+                self._positions.update((row['id'], (schedule_id, row['time'])) for row in slots.rows)
+            # remove least recently used schedules over max_schedules
+            while len(self._schedules) > self._max_schedules:
+                self._drop(next(iter(self._schedules)))
+                self._stats['evicted'] += 1
+        return loaded
+
+    # remove index of schedule
+    def _drop(self, schedule_id: int):
+        slots = self._schedules.pop(schedule_id, None)
+        if slots:
+            for row in slots.rows:
+                self._positions.pop(row['id'], None)
+
+    # remove detail from index
+    def _remove(self, rec_id: int) -> tuple:
+        position = self._positions.pop(rec_id, None)
+        if position and position[0] in self._schedules:
+            self._schedules[position[0]].remove(rec_id, position[1])
+        return position
+
+    # created/updated details: records with all fields of index are placed by time, else schedules are reloaded
+    def update(self, records: list):
+        self._generation += 1
+        self._stats['updates'] += 1
+        for record in records:
+            position = self._remove(record['id'])
+            keys = set(record.keys())
+
+            if keys.issuperset(self.FIELDS):
+                row = {field: record[field] for field in self.FIELDS}
+                slots = self._schedules.get(row['schedule_id'])
+                # not loaded schedule is loaded with detail
+                if slots:
+                    slots.insert(row)
+                    self._positions[row['id']] = (row['schedule_id'], row['time'])
+            elif 'schedule_id' in keys:
+                self._drop(record['schedule_id'])
+                if position:
+                    self._drop(position[0])
+            else:
+                # schedule of detail is not known
+                self.invalidate()
+                return
+
+    # deleted details
+    def remove(self, ids: list):
+        self._generation += 1
+        self._stats['updates'] += 1
+        for rec_id in ids:
+            self._remove(rec_id)
+
+    # remove index of schedules (all schedules if schedule_ids is None), it is loaded again by next range query
+    def invalidate(self, schedule_ids: list=None):
+        self._generation += 1
+        self._stats['invalidations'] += 1
+        if schedule_ids is None:
+            self._schedules.clear()
+            self._positions.clear()
+        else:
+            for schedule_id in schedule_ids:
+                self._drop(schedule_id)
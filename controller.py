@@ -1,10 +1,11 @@
-import ujson
 import aiohttp_jinja2
 from aiohttp import web
 from aiohttp.hdrs import METH_GET, METH_PUT, METH_POST, METH_DELETE
 from marshmallow import Schema, fields
 
 from core.exceptions import IncorrectParamsException
+from core.serializer import dumps, json_response
+from core.stats import get_service_stats
 from core.web_view import DefaultMethodsImpl, ExtendedApiView, DefGETParamsSchema, SystemACL
 from entity.models.UserModel import UserModel
 from entity.models.AuthModel import AuthModel
@@ -13,6 +14,8 @@ from entity.models.ScheduleModel import ScheduleModel, ScheduleOnlineModel
 from entity.models.ScheduleDetailModel import ScheduleDetailModel
 from entity.models.OrderModel import OrderModel
 from entity.models.CustomerModel import CustomerModel
+from entity.models.AvailabilityModel import AvailabilityModel
+from entity.models.ReportModel import ScheduleReportModel
 
 
 # index-page
@@ -61,12 +64,12 @@ class UserAuthCommon(DefaultMethodsImpl):
         result = await (self.get_model()).confirm_email(key=self.request.rel_url.query.get('email_key', None))
 
         # json-response
-        resp = web.json_response()
+        resp = json_response()
         # status 200 or 403
         if result:
-            resp.body = ujson.dumps(dict(
+            resp.body = dumps(dict(
                 result=True
-            ))
+            )).encode()
         else:
             resp.set_status(status=403, reason='Access denied..')
 
@@ -80,14 +83,14 @@ class UserAuthCommon(DefaultMethodsImpl):
         result, error = await (self.get_model()).login(login=body_data['login'], password=body_data['password'])
 
         # json-response
-        resp = web.json_response()
+        resp = json_response()
         # status 200 or 403
         if error:
             resp.set_status(status=403, reason=error)
         elif result:
-            resp.body = ujson.dumps(dict(
+            resp.body = dumps(dict(
                 result=result
-            ))
+            )).encode()
         else:
             resp.set_status(status=403, reason='Access denied..')
 
@@ -97,10 +100,10 @@ class UserAuthCommon(DefaultMethodsImpl):
     async def delete(self):
         # model.logout
         sid = self.request.headers.get('X-AccessToken')
-        result = (self.get_model()).logout(sid) if sid else True
+        result = await (self.get_model()).logout(sid) if sid else True
 
         # json-response
-        resp = web.json_response(data=dict(result=[], errors=[]))
+        resp = json_response(data=dict(result=[], errors=[]))
         # status 200 or 500
         if result:
             resp.set_status(status=200, reason='Success')
@@ -145,12 +148,12 @@ class CustomerAuthCommon(DefaultMethodsImpl):
         result = await (self.get_model()).confirm_email(key=self.request.rel_url.query.get('email_key', None))
 
         # json-response
-        resp = web.json_response()
+        resp = json_response()
         # status 200 or 403
         if result:
-            resp.body = ujson.dumps(dict(
+            resp.body = dumps(dict(
                 result=True
-            ))
+            )).encode()
         else:
             resp.set_status(status=403, reason='Access denied..')
 
@@ -164,14 +167,14 @@ class CustomerAuthCommon(DefaultMethodsImpl):
         result, error = await (self.get_model()).login(login=body_data['login'], password=body_data['password'])
 
         # json-response
-        resp = web.json_response()
+        resp = json_response()
         # status 200 or 403
         if error:
             resp.set_status(status=403, reason=error)
         elif result:
-            resp.body = ujson.dumps(dict(
+            resp.body = dumps(dict(
                 result=result
-            ))
+            )).encode()
         else:
             resp.set_status(status=403, reason='Access denied..')
 
@@ -181,10 +184,10 @@ class CustomerAuthCommon(DefaultMethodsImpl):
     async def delete(self):
         # model.logout
         sid = self.request.headers.get('X-AccessToken')
-        result = (self.get_model()).logout(sid) if sid else True
+        result = await (self.get_model()).logout(sid) if sid else True
 
         # json-response
-        resp = web.json_response(data=dict(result=[], errors=[]))
+        resp = json_response(data=dict(result=[], errors=[]))
         # status 200 or 500
         if result:
             resp.set_status(status=200, reason='Success')
@@ -204,7 +207,24 @@ class IsAuth (ExtendedApiView):
         # sid from header
         request_sid = self.request.headers.get('X-AccessToken')
         # return json-response
-        return web.json_response(data=dict(result=[dict(access=bool(self.session.sid == request_sid))], errors=[]))
+        return json_response(data=dict(result=[dict(access=bool(self.session.sid == request_sid))], errors=[]))
+
+
+# statistic of managers of process, only for admin
+class ServiceStats(ExtendedApiView):
+    @classmethod
+    def _get_params_schemas(cls) -> dict:
+        return {}
+
+    # HTTP: GET, only for admin
+    async def get(self):
+        if self.session and self.session.is_admin:
+            resp = json_response(data=dict(result=[await get_service_stats()], errors=[]))
+        else:
+            resp = json_response()
+            resp.set_status(status=403, reason='Access denied..')
+
+        return resp
 
 
 # Class View
@@ -216,13 +236,12 @@ class User(DefaultMethodsImpl):
     # HTTP: GET
     async def get(self):
         # get models
-        data = await (self.get_model()).get_entities(
+        return await self.get_entities_response(
+            self.get_model(),
             ids=self.request_def_params['ids'],
             filter_name=self.request.rel_url.query.get('name', None)
         )
 
-        return web.json_response(data=dict(result=data[0], errors=data[1]))
-
 
 # Class View
 class Schedule(DefaultMethodsImpl):
@@ -234,27 +253,23 @@ class Schedule(DefaultMethodsImpl):
     async def get(self):
         if self.session and self.session.flags & SystemACL.USER_ACL:
             # get models
-            data = await (self.get_model()).get_entities(
+            resp = await self.get_entities_response(
+                self.get_model(),
                 ids=self.request_def_params['ids'],
                 filter_name=self.request.rel_url.query.get('name', None)
             )
-            resp = web.json_response(data=dict(result=data[0], errors=data[1]))
         else:
-            resp = web.json_response()
+            resp = json_response()
             resp.set_status(status=403, reason='Access denied..')
         return resp
 
     # HTTP: POST, only for User
     async def post(self):
         if self.session and self.session.flags & SystemACL.USER_ACL:
-            # json-response
+            # json-response, ACL of sessions updated by ScheduleModel
             resp = await super().post()
-
-            if self.session and self.session.id:
-                # update session
-                await self.session_storage.update_acl_by_acc_id(self.session.id)
         else:
-            resp = web.json_response()
+            resp = json_response()
             resp.set_status(status=403, reason='Access denied..')
 
         return resp
@@ -265,7 +280,7 @@ class Schedule(DefaultMethodsImpl):
             # json-response
             resp = await super().put()
         else:
-            resp = web.json_response()
+            resp = json_response()
             resp.set_status(status=403, reason='Access denied..')
 
         return resp
@@ -276,7 +291,7 @@ class Schedule(DefaultMethodsImpl):
             # json-response
             resp = await super().delete()
         else:
-            resp = web.json_response()
+            resp = json_response()
             resp.set_status(status=403, reason='Access denied..')
 
         return resp
@@ -301,20 +316,89 @@ class ScheduleOnline(DefaultMethodsImpl):
     def get_model(self) -> ScheduleOnlineModel:
         return ScheduleOnlineModel(select_fields=self.request_def_params.get('fields'))
 
-    # HTTP: GET
+    # HTTP: GET, response from cache (invalidated by changes of schedules)
     async def get(self):
         # get models
-        data = await (self.get_model()).get_entities(
+        return await self.get_cached_entities_response(
+            self.get_model(),
+            ScheduleOnlineModel.CACHE_NAMESPACE,
             ids=self.request_def_params['ids'],
             filter_name=self.request.rel_url.query.get('name', None)
         )
 
-        return web.json_response(data=dict(result=data[0], errors=data[1]))
+
+# schema for get-params of availability: time range [time_from, time_to), free - only slots with free places
+class ScheduleAvailabilityGetParamsSchema(DefGETParamsSchema):
+    time_from = fields.Integer()
+    time_to = fields.Integer()
+    free = fields.Boolean()
+
+
+# slots of schedules with remaining places, ids - ids of schedules
+class ScheduleAvailability(DefaultMethodsImpl):
+
+    is_auth = False
+
+    @classmethod
+    def _get_params_schemas(cls) -> dict:
+        return {METH_GET: ScheduleAvailabilityGetParamsSchema()}
+
+    # get business-account
+    def get_model(self) -> AvailabilityModel:
+        return AvailabilityModel(select_fields=self.request_def_params.get('fields'))
+
+    # HTTP: GET
+    async def get(self):
+        # get slots by one query
+        data = await (self.get_model()).get_entities(
+            ids=self.request_def_params['ids'],
+            time_from=self.request_def_params.get('time_from'),
+            time_to=self.request_def_params.get('time_to'),
+            only_free=self.request_def_params.get('free', False),
+        )
+
+        return json_response(data=dict(result=data[0], errors=data[1]))
+
+
+# schema for get-params of reports: time range [time_from, time_to)
+class ScheduleReportGetParamsSchema(DefGETParamsSchema):
+    time_from = fields.Integer()
+    time_to = fields.Integer()
+
+
+# reports by schedules: occupancy & revenue of slots, statuses of orders, ids - ids of schedules
+class ScheduleReport(DefaultMethodsImpl):
+    @classmethod
+    def _get_params_schemas(cls) -> dict:
+        return {METH_GET: ScheduleReportGetParamsSchema()}
+
+    # get business-account
+    def get_model(self) -> ScheduleReportModel:
+        return ScheduleReportModel(select_fields=self.request_def_params.get('fields'), allowed_schedule_ids=self.session.schedule_ids)
+
+    # HTTP: GET, only for User
+    async def get(self):
+        if self.session and self.session.flags & SystemACL.USER_ACL:
+            # reports by columns of orders & slots
+            data = await (self.get_model()).get_entities(
+                ids=self.request_def_params['ids'],
+                time_from=self.request_def_params.get('time_from'),
+                time_to=self.request_def_params.get('time_to'),
+            )
+            resp = json_response(data=dict(result=data[0], errors=data[1]))
+        else:
+            resp = json_response()
+            resp.set_status(status=403, reason='Access denied..')
+
+        return resp
 
 
 # schema for default get-params
 class ScheduleDetailMethodGetParamsSchema(DefGETParamsSchema):
     schedules = fields.List(fields.Integer())
+    # time range [time_from, time_to)
+    time_from = fields.Integer()
+    time_to = fields.Integer()
 
 
 # Class View
@@ -334,13 +418,15 @@ class ScheduleDetail(DefaultMethodsImpl):
         if self.session and self.session.flags & SystemACL.USER_ACL:
             # json-response
             # get tags by get-params
-            data = await (self.get_model()).get_entities(
+            resp = await self.get_entities_response(
+                self.get_model(),
                 ids=self.request_def_params['ids'],
                 schedule_ids=self.request_def_params['schedules'],
+                time_from=self.request_def_params.get('time_from'),
+                time_to=self.request_def_params.get('time_to'),
             )
-            resp = web.json_response(data=dict(result=data[0], errors=data[1]))
         else:
-            resp = web.json_response()
+            resp = json_response()
             resp.set_status(status=403, reason='Access denied..')
 
         return resp
@@ -351,7 +437,7 @@ class ScheduleDetail(DefaultMethodsImpl):
             # json-response
             resp = await super().post()
         else:
-            resp = web.json_response()
+            resp = json_response()
             resp.set_status(status=403, reason='Access denied..')
 
         return resp
@@ -362,7 +448,7 @@ class ScheduleDetail(DefaultMethodsImpl):
             # json-response
             resp = await super().put()
         else:
-            resp = web.json_response()
+            resp = json_response()
             resp.set_status(status=403, reason='Access denied..')
 
         return resp
@@ -373,7 +459,7 @@ class ScheduleDetail(DefaultMethodsImpl):
             # json-response
             resp = await super().delete()
         else:
-            resp = web.json_response()
+            resp = json_response()
             resp.set_status(status=403, reason='Access denied..')
 
         return resp
@@ -403,16 +489,16 @@ class Order(DefaultMethodsImpl):
     async def get(self):
         if self.session and self.session.flags & SystemACL.USER_ACL:
             # json-response
-            data = await (self.get_model()).get_entities(
+            resp = await self.get_entities_response(
+                self.get_model(),
                 ids=self.request_def_params['ids'],
                 filter_name=self.request.rel_url.query.get('name', None),
                 schedule_ids=self.request_def_params['schedules'],
                 customer_ids=self.request_def_params['customers'],
                 status=self.request_def_params['status'],
             )
-            resp = web.json_response(data=dict(result=data[0], errors=data[1]))
         else:
-            resp = web.json_response()
+            resp = json_response()
             resp.set_status(status=403, reason='Access denied..')
 
         return resp
@@ -423,7 +509,7 @@ class Order(DefaultMethodsImpl):
             # json-response
             resp = await super().delete()
         else:
-            resp = web.json_response()
+            resp = json_response()
             resp.set_status(status=403, reason='Access denied..')
 
         return resp
@@ -449,11 +535,10 @@ class Customer(DefaultMethodsImpl):
 
     # HTTP: GET
     async def get(self):
-        # get tags by get-params
-        data = await (self.get_model()).get_entities(
+        # json-response by get-params
+        return await self.get_entities_response(
+            self.get_model(),
             ids=self.request_def_params['ids'],
             filter_name=self.request.rel_url.query.get('name', None),
             schedule_ids=self.request_def_params['schedules'],
-        )
-
-        return web.json_response(data=dict(result=data[0], errors=data[1]))
\ No newline at end of file
+        )
\ No newline at end of file
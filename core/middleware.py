@@ -4,23 +4,58 @@
 
 from aiohttp import web, hdrs
 from .exceptions import IncorrectParamsException, AccessException
+from .serializer import dumps, json_response
+from .web_view import get_auth_token_from_request
 from settings import logger
+from common.managers.dbManager import DBManager, PoolTimeoutError
+from common.managers.sessionManager import SessionStoreError
 import asyncio
 
 
 @web.middleware
-# try-except middleware
+# try-except middleware, statistic of db-queries by request: header Server-Timing & log line,
+# selects of GET-requests to replicas (session is routed to primary after its writes)
 async def filter_errors_request(request: web.Request, handler) -> web.Response:
     # allowed method OPTIONS
     if request.method == hdrs.METH_OPTIONS:
-        return web.json_response(status=200)
+        return json_response(status=200)
 
+    session_key = get_auth_token_from_request(request, getattr(request.app, 'auth_header_name', ''))
+    route_token = DBManager().start_route(
+        request.method in (hdrs.METH_GET, hdrs.METH_HEAD) and not DBManager().is_pinned(session_key))
+    token = DBManager().start_query_stats()
     try:
+        response = await handle_request(request, handler)
+    finally:
+        stats = DBManager().stop_query_stats(token)
+        if DBManager().stop_route(route_token).wrote:
+            DBManager().pin_primary(session_key)
+
+    if stats is not None:
+        # headers of streaming response are already sent
+        if not response.prepared:
+            response.headers['Server-Timing'] = stats.server_timing()
+        if stats.is_logged():
+            gauges = DBManager().pool_gauges
+            logger.info('query_stats {}'.format(dumps(dict(
+                stats.to_dict(), method=request.method, path=request.path, status=response.status,
+                pool_in_use=gauges.in_use, pool_waiting=gauges.waiting))))
+    return response
+
+
+# response of handler, exceptions to responses with errors
+async def handle_request(request: web.Request, handler) -> web.Response:
+    try:
+        # session of request is loaded before view (shared store is asynchronous), view checks it by is_auth
+        session_storage = getattr(request.app, 'session_storage', None)
+        if session_storage is not None:
+            request['session'] = await session_storage.get_session_by_sid(
+                get_auth_token_from_request(request, getattr(request.app, 'auth_header_name', '')))
         response = await handler(request)
     # exception "default params not validate", code = 400
     except IncorrectParamsException as e:
         logger.error(e)
-        response = web.json_response(
+        response = json_response(
             status=400,
             data=dict(
                 errors=e.errors
@@ -29,6 +64,16 @@ async def filter_errors_request(request: web.Request, handler) -> web.Response:
     # exception "access denied"
     except AccessException as e:
         response = web.Response(status=e.code, reason=e.msg)
+    # connections pool is exhausted or store of sessions is not available, code = 503 (client may retry)
+    except (PoolTimeoutError, SessionStoreError) as e:
+        logger.error('Fail request, err: {}'.format(repr(e)))
+        response = json_response(
+            status=503,
+            data={'errors': {
+                'reason': 'Service is overloaded, try again later'
+            }},
+            headers={hdrs.RETRY_AFTER: '1'}
+        )
     # TODO: Write the correct handling of errors
     # other exceptions
     except Exception as e:
@@ -37,7 +82,7 @@ async def filter_errors_request(request: web.Request, handler) -> web.Response:
         # else return response with code 500
         else:
             logger.error('Fail request, err: {}'.format(repr(e)))
-            response = web.json_response(
+            response = json_response(
                 status=500,
                 data={'errors': {
                     'reason': 'Error on running API-handlers: {}'.format(repr(e))
@@ -0,0 +1,108 @@
+"""
+    Serializer of responses (json): backend by config, projection of records to result items
+"""
+
+import json
+import ujson
+from aiohttp import web
+
+# backends: name: dumps(obj) -> str
+BACKENDS = {
+    'ujson': lambda obj: ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False),
+    'json': lambda obj: json.dumps(obj, ensure_ascii=False, separators=(',', ':')),
+}
+DEFAULT_BACKEND = 'ujson'
+
+# dumps of current backend
+_dumps = BACKENDS[DEFAULT_BACKEND]
+# projections by fields
+_projections = dict()
+# max count projections in cache
+MAX_PROJECTIONS = 1024
+
+
+# set backend of serializer by name
+def set_serializer(name: str=None):
+    global _dumps
+    _dumps = BACKENDS[name or DEFAULT_BACKEND]
+
+
+# object to json
+def dumps(obj) -> str:
+    return _dumps(obj)
+
+
+# json serialized already (by db), inserted to json as is by dumps_raw
+class RawJSON(str):
+    __slots__ = ()
+
+
+# dict to json, values of RawJSON are inserted as is
+def dumps_raw(data: dict) -> str:
+    return '{' + ','.join(_dumps(str(key)) + ':' + (value if isinstance(value, RawJSON) else _dumps(value))
+                          for key, value in data.items()) + '}'
+
+
+# data of json_response is not passed: response with empty body (as web.json_response)
+_EMPTY = object()
+
+
+# json-response by serializer
+def json_response(data=_EMPTY, status: int=200, reason: str=None, headers: dict=None) -> web.Response:
+    return web.Response(body=None if data is _EMPTY else _dumps(data).encode(), status=status, reason=reason,
+                        headers=headers, content_type='application/json')
+
+
+# projection of records (asyncpg.Record or dict) to result items by fields,
+# positions of fields are found once by columns of records: values are taken by positions
+class Projection:
+    __slots__ = ('fields', '_positions')
+
+    def __init__(self, fields: tuple):
+        self.fields = tuple(fields)
+        # columns of record: (((field, position), ...) of fields in record, {field: None} of fields not in record)
+        self._positions = dict()
+
+    # positions of fields by columns of record, missing fields are None
+    def _get_positions(self, record) -> tuple:
+        columns = tuple(record.keys())
+        positions = self._positions.get(columns)
+        if positions is None:
+            indexes = {column: i for i, column in enumerate(columns)}
+            positions = self._positions[columns] = (
+                tuple((field, indexes[field]) for field in self.fields if field in indexes),
+                dict.fromkeys(field for field in self.fields if field not in indexes),
+            )
+        return positions
+
+    # result item by record
+    def item(self, record) -> dict:
+        if isinstance(record, dict):
+            return {field: record.get(field) for field in self.fields}
+        pairs, missing = self._get_positions(record)
+        item = {field: record[i] for field, i in pairs}
+        if missing:
+            item.update(missing)
+        return item
+
+    # result items by records (records of one query have the same columns)
+    def items(self, records: list) -> list:
+        if not records:
+            return []
+        if isinstance(records[0], dict):
+            return [self.item(record) for record in records]
+        pairs, missing = self._get_positions(records[0])
+        if missing:
+            return [dict({field: record[i] for field, i in pairs}, **missing) for record in records]
+        return [{field: record[i] for field, i in pairs} for record in records]
+
+
+# projection by fields (cached)
+def get_projection(fields) -> Projection:
+    key = fields if isinstance(fields, frozenset) else frozenset(fields)
+    projection = _projections.get(key)
+    if projection is None:
+        if len(_projections) >= MAX_PROJECTIONS:
+            _projections.clear()
+        projection = _projections[key] = Projection(sorted(key))
+    return projection
@@ -0,0 +1,52 @@
+"""
+    Statistic of managers of process: for endpoint of admins & periodic log line
+"""
+
+import asyncio
+
+from settings import logger
+from .serializer import dumps
+from common.managers.dbManager import DBManager
+from common.managers.sessionManager import SessionManager
+from common.managers.cacheManager import CacheManager
+from common.managers.slotIndexManager import SlotIndexManager
+
+
+# statistic of managers of process: statements, merged selects, pools, sessions, response cache, index of slots
+async def get_service_stats() -> dict:
+    return dict(
+        db=DBManager().get_stats(),
+        sessions=await SessionManager().get_stats(),
+        cache=CacheManager().get_stats(),
+        slot_index=SlotIndexManager().get_stats(),
+    )
+
+
+# background task: statistic of managers to log every interval seconds (0 - off)
+class StatsLogger:
+    __slots__ = ('_interval', '_task')
+
+    def __init__(self, interval: float=0):
+        self._interval = float(interval or 0)
+        # task of logger
+        self._task = None
+
+    # write statistic to log every interval seconds
+    async def _log_loop(self):
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                logger.info('service_stats {}'.format(dumps(await get_service_stats())))
+            except Exception as e:
+                logger.error('StatsLogger#log: {}'.format(e))
+
+    # handler on start application: run logger
+    async def on_startup(self, app=None):
+        if self._interval and not self._task:
+            self._task = asyncio.ensure_future(self._log_loop())
+
+    # handler on shutdown application: stop logger
+    async def on_shutdown(self, app=None):
+        if self._task:
+            self._task.cancel()
+            self._task = None
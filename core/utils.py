@@ -1,5 +1,7 @@
+import os
+import base64
 import string
-import random
+import secrets
 
 import asyncio
 from aiohttp import web
@@ -62,28 +64,6 @@ def get_error_item(selector: str='', value=None, reason: str='Not found', **kwar
     return error
 
 
-# standard result item
-def get_result_item(data, fields) -> dict:
-    """
-    :param data: dict or asyncpgsa.record.Record
-    :param fields: list or set
-    :return: dict
-    """
-    result = {}
-    # if dict
-    if isinstance(data, dict):
-        for field in fields:
-            result[field] = data.get(field, None)
-    # if Record
-    else:
-        for field in fields:
-            try:
-                result[field] = data[field]
-            except:
-                result[field] = None
-    return result
-
-
 # validate dict by schema
 def validate_by_schema(schema, data: dict) -> {dict, list}:
     # validate-data
@@ -98,6 +78,30 @@ def validate_by_schema(schema, data: dict) -> {dict, list}:
     return v_data, errors
 
 
-# generate unique key
-def keygen(size=12, chars=string.ascii_uppercase + string.digits):
-    return ''.join(random.choice(chars) for x in range(size))
\ No newline at end of file
+# validate list of dicts by schema (one load with many=True), return [(v_data, errors), ...] in order of items
+def validate_many_by_schema(schema, items: list) -> list:
+    # validate all items
+    vd = schema.load(items, many=True)
+    result = []
+    for i, data in enumerate(items):
+        # errors of item by index, item is not dict - error in _schema
+        if i in vd.errors:
+            result.append((None, calc_errors_from_vd(
+                errors=vd.errors[i] or {'_schema': vd.errors.get('_schema', [])},
+                data_on_validate=data
+            )))
+        else:
+            result.append((vd.data[i], []))
+    return result
+
+
+# default chars for keygen
+KEYGEN_CHARS = string.ascii_uppercase + string.digits
+
+
+# generate unique key (cryptographically secure)
+def keygen(size=12, chars=KEYGEN_CHARS):
+    # default chars: base32 of random bytes (A-Z, 2-7 is subset of default chars)
+    if chars == KEYGEN_CHARS:
+        return base64.b32encode(os.urandom(size * 5 // 8 + 1)).decode()[:size]
+    return ''.join(secrets.choice(chars) for x in range(size))
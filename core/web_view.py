@@ -4,15 +4,21 @@
 
 from collections import namedtuple
 import asyncio
+import base64
+import ujson
 from aiohttp import web, web_request
 from aiohttp.hdrs import METH_GET, METH_PUT, METH_POST, METH_DELETE
 from abc import ABCMeta, abstractmethod
 
-from marshmallow import Schema, fields, UnmarshalResult
+from marshmallow import Schema, fields, validate, UnmarshalResult
 from .exceptions import IncorrectParamsException, AccessException
+from .utils import get_error_item
+from .serializer import dumps, dumps_raw, json_response
+from settings import logger
 
 from common.managers.sessionManager import SessionManager
 from common.managers.sessionManager import Session
+from common.managers.cacheManager import CacheManager
 
 
 # tag types
@@ -30,6 +36,23 @@ def get_auth_token_from_request(request: web.Request, param_name: str) -> str:
     return request.headers.get(param_name) or request.cookies.get(param_name)
 
 
+# max count records in page
+MAX_PAGE_LIMIT = 10000
+
+
+# opaque cursor of next page by id of last record of page
+def encode_page_cursor(after_id: int) -> str:
+    return base64.urlsafe_b64encode(ujson.dumps(dict(after_id=after_id)).encode()).decode().rstrip('=')
+
+
+# id of last record of previous page by cursor
+def decode_page_cursor(cursor: str) -> int:
+    try:
+        return int(ujson.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))['after_id'])
+    except Exception:
+        raise IncorrectParamsException('Incorrect get-params', [dict(selector='cursor', reason='Not validate')])
+
+
 # schema for default get-params
 class DefParamsSchema(Schema):
     ids = fields.List(fields.Integer())
@@ -39,6 +62,12 @@ class DefParamsSchema(Schema):
 # GET: schema for default get-params
 class DefGETParamsSchema(Schema):
     ids = fields.List(fields.Integer(), default='all')
+    # streaming response: json - chunked json {result, errors}, ndjson - item by line
+    stream = fields.String(validate=validate.OneOf(('', 'json', 'ndjson')))
+    # keyset pagination: records with id > after_id (or id from cursor of previous page) not more than limit
+    after_id = fields.Integer()
+    limit = fields.Integer(validate=validate.Range(min=1, max=MAX_PAGE_LIMIT))
+    cursor = fields.String()
     fields = fields.List(fields.String())
 
 
@@ -72,8 +101,8 @@ class ExtendedApiView(web.View, metaclass=ABCMeta):
         super().__init__(request)
         # default get params
         self._request_get_params = None
-        # authentification-Session
-        self._session = self.session_storage.get_session_by_sid(get_auth_token_from_request(self.request, self.auth_header_name))
+        # authentification-Session, loaded by middleware (shared store is asynchronous)
+        self._session = request.get('session')
 
         if self.is_auth and not self._session:
             # error access denied
@@ -127,7 +156,8 @@ class ExtendedApiView(web.View, metaclass=ABCMeta):
                 # calc param by schema.type (list or not)
                 if type(self._get_params_schema.fields[param_name]) == fields.List:
                     params[param_name] = p.split(',') if p else []
-                else:
+                # empty param is set only for string
+                elif p or isinstance(self._get_params_schema.fields[param_name], fields.String):
                     params[param_name] = p
 
         # validate
@@ -147,6 +177,18 @@ class ExtendedApiView(web.View, metaclass=ABCMeta):
             self._request_get_params = self._select_request_get_params()
         return self._request_get_params
 
+    # params of page: after_id (by cursor or get-param after_id) & limit
+    def get_page_params(self) -> dict:
+        params = self.request_def_params
+        page = {}
+        if params.get('cursor'):
+            page['after_id'] = decode_page_cursor(params['cursor'])
+        elif params.get('after_id') is not None:
+            page['after_id'] = params['after_id']
+        if params.get('limit'):
+            page['limit'] = params['limit']
+        return page
+
     @property
     # auth header name
     def auth_header_name(self) -> str:
@@ -169,27 +211,15 @@ class ExtendedApiView(web.View, metaclass=ABCMeta):
         return self.validate_body_params(await self.get_body_data())
 
 
-# func-callback by finished Task
-def task_finished_callback(task: asyncio.Task, res: list, err: list):
-    # get task-result
-    task_result = task.result()
-    # if result
-    if task_result[0]:
-        if isinstance(task_result[0], list):
-            res.extend(task_result[0])
-        else:
-            res.append(task_result[0])
-    # if errors
-    if task_result[1]:
-        if isinstance(task_result[1], list):
-            err.extend(task_result[1])
-        else:
-            err.append(task_result[1])
-
-
 # abstract class: default implementation API-methods
 # this class extends ExtendedApiViewBase
 class DefaultMethodsImpl(ExtendedApiView, metaclass=ABCMeta):
+    # formats of streaming response
+    STREAM_JSON = 'json'
+    STREAM_NDJSON = 'ndjson'
+    # size of buffer (bytes) written to streaming response by one chunk
+    stream_chunk_size = 64 * 1024
+
     @abstractmethod
     def get_model(self):
         """
@@ -227,12 +257,126 @@ class DefaultMethodsImpl(ExtendedApiView, metaclass=ABCMeta):
 
         # get-param 'fields' - used to create a model
 
-        data = await (self.get_model()).get_entities(
+        # return json-response
+        return await self.get_entities_response(
+            self.get_model(),
             ids=self.request_def_params['ids']
         )
 
-        # return json-response
-        return web.json_response(data=dict(result=data[0], errors=data[1]))
+    # response by model.get_entities, streaming response if get-param stream is set (page by limit is not streamed)
+    async def get_entities_response(self, model, **kwargs) -> web.StreamResponse:
+        page = self.get_page_params()
+        if self.request_def_params.get('stream') and not page.get('limit'):
+            return await self.stream_entities_response(model, **page, **kwargs)
+
+        if self.is_db_json(model, page):
+            return web.Response(body=await self.get_entities_json_body(model, page, **kwargs),
+                                content_type='application/json')
+
+        return json_response(data=await self.get_entities_data(model, page, **kwargs))
+
+    # grouped result is built by db as json (setting of app), not for pages by limit
+    def is_db_json(self, model, page: dict) -> bool:
+        return bool(model.group_by_field) and not page.get('limit') and \
+            getattr(self.request.app, 'db_json_aggregation', False)
+
+    # body of response by model.get_entities_json: json of result from db is inserted as is
+    async def get_entities_json_body(self, model, page: dict, **kwargs) -> bytes:
+        result, errors = await model.get_entities_json(**page, **kwargs)
+        return dumps_raw(dict(result=result, errors=errors)).encode()
+
+    # data of response by model.get_entities: {result, errors} & cursor of next page for page by limit
+    async def get_entities_data(self, model, page: dict, **kwargs) -> dict:
+        data = await model.get_entities(**page, **kwargs)
+        response = dict(result=data[0], errors=data[1])
+        # cursor of next page, None - last page
+        if page.get('limit'):
+            response['cursor'] = encode_page_cursor(model.next_after_id) if model.next_after_id is not None else None
+        return response
+
+    # response by model.get_entities from cache (namespace of CacheManager), streaming response is not cached
+    async def get_cached_entities_response(self, model, namespace: str, **kwargs) -> web.StreamResponse:
+        page = self.get_page_params()
+        if self.request_def_params.get('stream') and not page.get('limit'):
+            return await self.stream_entities_response(model, **page, **kwargs)
+
+        # key by fields, page & params of get_entities
+        key = (
+            tuple(sorted(model.select_fields)),
+            tuple(sorted(page.items())),
+            tuple((name, tuple(value) if isinstance(value, (list, set)) else value) for name, value in sorted(kwargs.items())),
+        )
+
+        # cached body of response
+        async def get_body() -> bytes:
+            if self.is_db_json(model, page):
+                return await self.get_entities_json_body(model, page, **kwargs)
+            return dumps(await self.get_entities_data(model, page, **kwargs)).encode()
+
+        return web.Response(body=await CacheManager().get_or_set(namespace, key, get_body), content_type='application/json')
+
+    # streaming response by model.iter_entities: records are read by cursor and written by chunks
+    async def stream_entities_response(self, model, **kwargs) -> web.StreamResponse:
+        ndjson = self.request_def_params.get('stream') == self.STREAM_NDJSON
+        grouped = bool(model.group_by_field)
+
+        resp = web.StreamResponse()
+        resp.content_type = 'application/x-ndjson' if ndjson else 'application/json'
+        resp.enable_chunked_encoding()
+        await resp.prepare(self.request)
+
+        # buffer of chunk
+        chunk = []
+        size = 0
+        # current group (grouped json), first item of array
+        group = None
+        first = True
+        errors = []
+
+        # json: {"result": [item, ...]} or {"result": [{"group": [item, ...], ...}]}
+        if not ndjson:
+            chunk.append('{"result":[')
+
+        try:
+            async for group_value, item in model.iter_entities(errors=errors, **kwargs):
+                if ndjson:
+                    result = {group_value: [item]} if grouped else item
+                    part = dumps(dict(result=result)) + '\n'
+                elif grouped:
+                    # new group: close array of previous group
+                    if first:
+                        part = '{' + dumps(str(group_value)) + ':[' + dumps(item)
+                        group = group_value
+                    elif group_value != group:
+                        part = '],' + dumps(str(group_value)) + ':[' + dumps(item)
+                        group = group_value
+                    else:
+                        part = ',' + dumps(item)
+                else:
+                    part = dumps(item) if first else ',' + dumps(item)
+                first = False
+
+                chunk.append(part)
+                size += len(part)
+                if size >= self.stream_chunk_size:
+                    await resp.write(''.join(chunk).encode())
+                    chunk, size = [], 0
+        # headers are sent - error is added to errors of response
+        except Exception as e:
+            logger.error('DefaultMethodsImpl#stream_entities_response: {}'.format(repr(e)))
+            errors.append(get_error_item(reason='Error on execute query'))
+
+        # close envelope & add errors
+        if ndjson:
+            chunk.append(dumps(dict(errors=errors)) + '\n')
+        else:
+            if grouped and not first:
+                chunk.append(']}')
+            chunk.append('],"errors":' + dumps(errors) + '}')
+
+        await resp.write(''.join(chunk).encode())
+        await resp.write_eof()
+        return resp
 
     # HTTP: POST, kwargs added to data for created items
     async def post(self, **kwargs):
@@ -242,31 +386,14 @@ class DefaultMethodsImpl(ExtendedApiView, metaclass=ABCMeta):
         # create model
         model = self.get_model()
 
-        # result vars
-        result = []
-        errors = []
-
-        # list tasks
-        tasks = []
-        # create Tasks
-        for item in body_data:
-            # create coroutine
-            coro = model.create_entity(
-                data=item,
-                **kwargs
-            )
-            # create Task by coroutine
-            task = asyncio.create_task(coro)
-            # add callback by finished
-            task.add_done_callback(lambda task: task_finished_callback(task=task, res=result, err=errors))
-            # add to list tasks
-            tasks.append(task)
-
-        # wait tasks create Fleets
-        await asyncio.wait(tasks)
+        # validate all items and create its by one query
+        result, errors = await model.create_entities(
+            items=body_data,
+            **kwargs
+        )
 
         # return json-response
-        return web.json_response(data=dict(result=result, errors=errors))
+        return json_response(data=dict(result=result, errors=errors))
 
     # HTTP: PUT
     async def put(self):
@@ -276,30 +403,13 @@ class DefaultMethodsImpl(ExtendedApiView, metaclass=ABCMeta):
         # Fleet model
         model = self.get_model()
 
-        # result vars
-        result = []
-        errors = []
-
-        # list tasks
-        tasks = []
-        # create Tasks
-        for item in body_data:
-            # create coroutine
-            coro = model.update_entity(
-                data=item,
-            )
-            # create Task by coroutine
-            task = asyncio.create_task(coro)
-            # add callback by finished
-            task.add_done_callback(lambda task: task_finished_callback(task=task, res=result, err=errors))
-            # add to list tasks
-            tasks.append(task)
-
-        # wait tasks update
-        await asyncio.wait(tasks)
+        # validate all items and update its by one query
+        result, errors = await model.update_entities(
+            items=body_data
+        )
 
         # return json-response
-        return web.json_response(data=dict(result=result, errors=errors))
+        return json_response(data=dict(result=result, errors=errors))
 
     # HTTP: DELETE
     async def delete(self):
@@ -315,23 +425,10 @@ class DefaultMethodsImpl(ExtendedApiView, metaclass=ABCMeta):
 
         # TODO: add msg to response: set ids
         if ids:
-            # list tasks
-            tasks = []
-            # create Tasks
-            for id in ids:
-                # create coroutine
-                coro = model.delete_entity(
-                    obj_id=id
-                )
-                # create Task by coroutine
-                task = asyncio.create_task(coro)
-                # add callback by finished
-                task.add_done_callback(lambda task: task_finished_callback(task=task, res=result, err=errors))
-                # add to list tasks
-                tasks.append(task)
-
-            # wait tasks update
-            await asyncio.wait(tasks)
+            # delete all ids by one query
+            result, errors = await model.delete_entities(
+                ids=ids
+            )
 
         # return json-response
-        return web.json_response(data=dict(result=result, errors=errors))
+        return json_response(data=dict(result=result, errors=errors))
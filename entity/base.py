@@ -1,10 +1,15 @@
+from collections import OrderedDict
+from itertools import chain
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Integer
 from sqlalchemy.sql import select, update, delete, insert, \
-    any_, \
+    any_, func, cast, bindparam, literal_column, \
     elements
+from sqlalchemy.dialects.postgresql import ARRAY, aggregate_order_by
 from asyncpg.exceptions import UniqueViolationError
 
 from settings import logger
+from core.serializer import dumps
 from common.managers.dbManager import DBManager
 
 Base = declarative_base()
@@ -12,35 +17,125 @@ Base = declarative_base()
 
 # BaseEntity for Entity
 class BaseEntity(object):
+    # max count params in one query (postgresql limit is 32767)
+    MAX_QUERY_PARAMS = 32000
+
     # properties to dict
     def to_dict(self) -> dict:
         return self.__dict__
 
     @classmethod
-    # get fields-records from DB by condition
-    async def select_where(cls, cls_fields: set=(), str_fields: set=(), conditions: list=None):
-        # query = select([cls.__getattribute__(cls, field) for field in fields] if fields else [cls])
+    # list of columns by names of fields
+    def _get_fields(cls, cls_fields: tuple=(), str_fields: tuple=()) -> list:
+        fields = list(cls_fields)
+        for field in str_fields:
+            try:
+                fields.append(cls.__getattribute__(cls, field))
+            except:
+                logger.debug('Field {} not found in cls {}'.format(field, cls))
+        return fields if fields else [cls]
 
-        if not cls_fields and not str_fields:
-            fields = [cls]
-        else:
-            fields = list(cls_fields) if cls_fields else []
-            if str_fields:
-                for field in str_fields:
-                    try:
-                        fields.append(cls.__getattribute__(cls, field))
-                    except:
-                        logger.debug('Field {} not found in cls {}'.format(field, cls))
-
-        query = select(fields if fields else [cls])
-
-        # add conditions
-        if conditions:
+    @classmethod
+    # compiled select-query by fields & conditions (from cache of compiled queries), order_by - names of fields
+    def _compile_select(cls, cls_fields: set=(), str_fields: set=(), conditions: list=None, order_by: tuple=(),
+                        limit: int=None):
+        # fields in stable order (key of compiled query)
+        cls_fields = tuple(sorted(cls_fields, key=str)) if cls_fields else ()
+        str_fields = tuple(sorted(str_fields)) if str_fields else ()
+        order_by = tuple(order_by)
+        # only sql-conditions
+        conditions = [condition for condition in conditions or () if isinstance(condition, elements.ColumnElement)]
+        # limit is bind-param, value bind to compiled query as values of conditions
+        limit = bindparam('limit', limit, type_=Integer) if limit else None
+
+        # create query, called only if query not in cache
+        def build_query():
+            query = select(cls._get_fields(cls_fields, str_fields))
             for condition in conditions:
-                if isinstance(condition, elements.ColumnElement):
-                    query = query.where(condition)
+                query = query.where(condition)
+            if order_by:
+                query = query.order_by(*(cls.__getattribute__(cls, field) for field in order_by))
+            if limit is not None:
+                query = query.limit(limit)
+            return query
+
+        # compiled query from cache: only bind values of conditions
+        return DBManager().statement_cache.compile(
+            key=(cls, tuple(map(str, cls_fields)), str_fields, order_by),
+            conditions=conditions if limit is None else conditions + [limit],
+            build_query=build_query
+        )
 
-        return await DBManager().query_fetch(query)
+    @classmethod
+    # get fields-records from DB by condition, order_by - names of fields, concurrent identical selects are merged
+    async def select_where(cls, cls_fields: set=(), str_fields: set=(), conditions: list=None, order_by: tuple=(),
+                           limit: int=None):
+        return await DBManager().query_fetch_coalesced(
+            cls._compile_select(cls_fields, str_fields, conditions, order_by, limit)
+        )
+
+    @classmethod
+    # iterate fields-records from DB by condition with cursor (records are not loaded at once)
+    def select_where_cursor(cls, cls_fields: set=(), str_fields: set=(), conditions: list=None, order_by: tuple=(),
+                            prefetch: int=None):
+        return DBManager().query_cursor(cls._compile_select(cls_fields, str_fields, conditions, order_by), prefetch)
+
+    @classmethod
+    # get fields from DB by condition as columns: one row of arrays (array_agg), {field: list of values}
+    async def select_columns(cls, str_fields: tuple, conditions: list=None) -> dict:
+        str_fields = tuple(str_fields)
+        # only sql-conditions
+        conditions = [condition for condition in conditions or () if isinstance(condition, elements.ColumnElement)]
+
+        # create query, called only if query not in cache
+        def build_query():
+            query = select([func.array_agg(cls.__getattribute__(cls, field)).label(field) for field in str_fields])
+            for condition in conditions:
+                query = query.where(condition)
+            return query
+
+        record = await DBManager().query_fetchrow(DBManager().statement_cache.compile(
+            key=(cls, 'columns', str_fields),
+            conditions=conditions,
+            build_query=build_query
+        ))
+        # array_agg of no rows is null
+        return {field: record[field] or [] for field in str_fields}
+
+    @classmethod
+    # records grouped by field as json built by db: {"group value": [{field: value, ...}, ...], ...} or None (no records)
+    async def select_grouped_json(cls, str_fields: set, group_by: str, conditions: list=None) -> str:
+        str_fields = tuple(sorted(str_fields))
+        # only sql-conditions
+        conditions = [condition for condition in conditions or () if isinstance(condition, elements.ColumnElement)]
+
+        # create query, called only if query not in cache
+        def build_query():
+            # json of record: json_build_object('field', field, ...), names of fields are checked by models
+            item = func.json_build_object(*chain.from_iterable(
+                (literal_column("'{}'".format(field)), cls.__getattribute__(cls, field)) for field in str_fields
+            ))
+            group = cls.__getattribute__(cls, group_by)
+            groups = select([
+                group.label('group_value'),
+                func.json_agg(aggregate_order_by(item, cls.id)).label('group_items'),
+            ])
+            for condition in conditions:
+                groups = groups.where(condition)
+            groups = groups.group_by(group).alias('g')
+            return select([func.json_object_agg(groups.c.group_value, groups.c.group_items)])
+
+        # compiled query from cache: only bind values of conditions
+        records = await DBManager().query_fetch_coalesced(DBManager().statement_cache.compile(
+            key=(cls, 'grouped_json', str_fields, group_by),
+            conditions=conditions,
+            build_query=build_query
+        ))
+        value = records[0][0] if records else None
+        # json is decoded by codec of connection
+        if value is not None and not isinstance(value, str):
+            value = dumps(value)
+        return value
 
     @classmethod
     # get all records from DB
@@ -86,6 +181,98 @@ class BaseEntity(object):
 
         return rc, msg
 
+    @classmethod
+    # insert many records into table by multi-row inserts in one transaction, if inserts are failed - one by one
+    # (savepoint by record)
+    async def create_many(cls, values_list: list, return_fields: list or set=None) -> {list or bool, str}:
+        """
+        :param values_list: list of validated values of records
+        :param return_fields: fields of created records
+        :return: ([(record or None, reason of not created record), ...] in order of values_list, msg) or (False, msg)
+        """
+        # message/error
+        msg = ''
+        # list returning-fields
+        if not return_fields:
+            return_fields = ['id']
+        returning = [cls.__getattribute__(cls, field) for field in return_fields]
+
+        async def create(conn) -> list:
+            return await cls.insert_many(conn, values_list, returning)
+
+        # create records on one connection
+        try:
+            rc = await DBManager().query_transaction(create)
+        except Exception as e:
+            logger.error('common.entity.baseEntity.BaseEntity#create_many: {}'.format(e))
+            rc, msg = False, 'Records are not created'
+
+        return rc, msg
+
+    @classmethod
+    # insert records on connection of transaction by multi-row inserts (savepoint), if inserts are failed - one by one
+    # (savepoint by record), return [(record or None, reason of not created record), ...] in order of values_list
+    async def insert_many(cls, conn, values_list: list, returning: list, reason: str='Record is not created') -> list:
+        try:
+            async with conn.transaction():
+                return [(record, '') for record in await cls._insert_rows(conn, values_list, returning)]
+        except Exception as e:
+            logger.error('common.entity.baseEntity.BaseEntity#insert_many: {}'.format(e))
+
+        result = []
+        for values in values_list:
+            query_string, params = DBManager._compile(insert(cls).values(values).returning(*returning))
+            try:
+                async with conn.transaction():
+                    result.append((await conn.fetchrow(query_string, *params), ''))
+            except UniqueViolationError:
+                result.append((None, 'Record already exists'))
+            except Exception as e:
+                logger.error('common.entity.baseEntity.BaseEntity#insert_many: {}'.format(e))
+                result.append((None, reason))
+        return result
+
+    @classmethod
+    # insert records by multi-row inserts, return records in order of values_list: ids of new records are taken
+    # from sequence before insert, records are matched to values by id (order of rows of RETURNING is not guaranteed)
+    async def _insert_rows(cls, conn, values_list: list, returning: list) -> list:
+        count = sum(1 for values in values_list if values.get('id') is None)
+        query_string, params = DBManager._compile(cls._get_next_ids_query(count))
+        ids = iter([record[0] for record in await conn.fetch(query_string, *params)] if count else ())
+        values_list = [values if values.get('id') is not None else dict(values, id=next(ids)) for values in values_list]
+
+        # id is needed for matching of records
+        if not any(column is cls.id for column in returning):
+            returning = returning + [cls.id]
+        records = {}
+        for query in cls._get_create_many_queries(values_list, returning):
+            query_string, params = DBManager._compile(query)
+            for record in await conn.fetch(query_string, *params):
+                records[record['id']] = record
+        return [records[values['id']] for values in values_list]
+
+    @classmethod
+    # query of count next values of sequence of id
+    def _get_next_ids_query(cls, count: int):
+        sequence = func.pg_get_serial_sequence('"{}"'.format(cls.__tablename__), 'id')
+        return select([func.nextval(sequence)]).select_from(func.generate_series(1, count))
+
+    @classmethod
+    # multi-row inserts by limit of params, rows with the same fields - one query (missing fields are set by defaults
+    # of columns)
+    def _get_create_many_queries(cls, values_list: list, returning: list) -> list:
+        groups = OrderedDict()
+        for values in values_list:
+            groups.setdefault(tuple(sorted(values)), []).append(values)
+
+        queries = []
+        for keys, rows in groups.items():
+            # count rows in one query by limit of params
+            size = max(1, cls.MAX_QUERY_PARAMS // max(len(keys), 1))
+            for i in range(0, len(rows), size):
+                queries.append(insert(cls).values(rows[i:i + size]).returning(*returning))
+        return queries
+
     @classmethod
     # update record in db by entity.id
     async def update(cls, values: dict, rec_id: int=None, conditions: list=[], return_fields: list or set=None) -> {dict or bool, str}:
@@ -114,6 +301,52 @@ class BaseEntity(object):
 
         return ru, msg
 
+    @classmethod
+    # update many records by one query: UPDATE ... FROM (SELECT unnest(arrays)), every item of values_list has id
+    async def update_many(cls, values_list: list, conditions: list=None, return_fields: list or set=None) -> {list or bool, str}:
+        # message/error
+        msg = ''
+        # list returning-fields
+        if not return_fields:
+            return_fields = {'id'}
+        returning = [cls.__getattribute__(cls, field) for field in return_fields]
+
+        # one row can not be updated by two items in one query (value of row is chosen by db)
+        if len({values['id'] for values in values_list}) != len(values_list):
+            return False, 'Duplicate id in records'
+
+        # rows with the same fields - one query
+        groups = OrderedDict()
+        for values in values_list:
+            groups.setdefault(tuple(sorted(values)), []).append(values)
+
+        # create queries and execute in one transaction
+        try:
+            ru = await DBManager().query_fetch_batch([
+                cls._get_update_many_query(keys, rows, conditions or [], returning) for keys, rows in groups.items()
+            ])
+        except Exception as e:
+            logger.error('common.entity.baseEntity.BaseEntity#update_many: {}'.format(e))
+            ru, msg = False, 'Error update records'
+
+        return ru, msg
+
+    @classmethod
+    # query for update rows with the same fields, values of every field are sent by one array
+    def _get_update_many_query(cls, keys: tuple, rows: list, conditions: list, returning: list):
+        columns = cls.__table__.c
+        # table of new values: (SELECT unnest($1::type[]) AS id, unnest($2::type[]) AS field, ...) AS v
+        values = select([
+            func.unnest(cast([row[key] for row in rows], ARRAY(columns[key].type))).label(key) for key in keys
+        ]).alias('v')
+
+        query = update(cls).values({key: values.c[key] for key in keys if key != 'id'}).where(cls.id == values.c.id)
+        for condition in conditions:
+            if isinstance(condition, elements.ColumnElement):
+                query = query.where(condition)
+
+        return query.returning(*returning)
+
     @classmethod
     # update records in db by conditions
     async def update_by_conditions(cls, values: dict, conditions: list=None, return_fields: list or set=None, force: bool=False) -> dict or bool:
@@ -145,3 +378,26 @@ class BaseEntity(object):
     # delete record from DB by record_id
     async def delete_by_id(cls, rec_id: int):
         return await DBManager().query_execute(delete(cls).where(cls.id == rec_id))
+
+    @classmethod
+    # delete records by ids & conditions by one query, return records (id, deleted) for all existing ids
+    async def delete_by_ids(cls, rec_ids: list or set, conditions: list=None) -> list or None:
+        """
+        :return: list of records (id, deleted: bool) or None on error.
+            id not in result - not found, deleted = False - not allowed by conditions
+        """
+        # delete by ids & conditions
+        query = delete(cls).where(cls.id == any_(rec_ids))
+        for condition in conditions or []:
+            if isinstance(condition, elements.ColumnElement):
+                query = query.where(condition)
+        deleted = query.returning(cls.id).cte('deleted')
+
+        # main query sees rows before delete: all existing rows by ids
+        try:
+            return await DBManager().query_fetch(
+                select([cls.id, cls.id.in_(select([deleted.c.id])).label('deleted')]).where(cls.id == any_(rec_ids))
+            )
+        except Exception as e:
+            logger.error('common.entity.baseEntity.BaseEntity#delete_by_ids: {}'.format(e))
+            return None
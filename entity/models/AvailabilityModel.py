@@ -0,0 +1,74 @@
+from sqlalchemy.sql import any_
+from marshmallow import Schema
+
+from .BaseModel import BaseModel
+
+from entity.schDetail import SCHDetail
+
+
+# business-model: slots of active schedules with remaining places (for Customers)
+class AvailabilityModel(BaseModel):
+    #  ---- result data format ----
+    # schedule_id: list()
+    #  ----------------------------
+    group_by_field = 'schedule_id'
+
+    def __init__(self, select_fields: set=set()):
+        """
+        :param select_fields: set, list fields for result
+        """
+        super().__init__(
+            entity_cls=SCHDetail,
+            all_fields=(
+                'id',
+                'time',
+                'description',
+                'members',
+                'price',
+                'schedule_id',
+                'booked',
+                'remaining',
+            ),
+            select_fields=select_fields
+        )
+
+    # Schema for create
+    @classmethod
+    def _get_create_schema(cls) -> Schema:
+        return Schema()
+
+    # Schema for update
+    @classmethod
+    def _get_update_schema(cls) -> Schema:
+        return Schema()
+
+    # conditions for select slots by schedules & time range [time_from, time_to)
+    async def _get_select_conditions(self, ids: list, time_from: int=None, time_to: int=None, **kwargs) -> list:
+        conditions = await self._calc_conditions(kwargs.get('conditions'))
+
+        # condition by schedules
+        if ids:
+            conditions.append(self.entity_cls.schedule_id == any_(ids))
+
+        # condition by time range
+        if time_from is not None:
+            conditions.append(self.entity_cls.time >= time_from)
+        if time_to is not None:
+            conditions.append(self.entity_cls.time < time_to)
+
+        return conditions
+
+    # GET slots with remaining places by one aggregate query, only_free - slots with free places only
+    async def get_entities(self, ids: list, only_free: bool=False, **kwargs) -> tuple:
+        # result vars
+        result = []
+        errors = []
+
+        records = await self.entity_cls.select_availability(
+            conditions=await self._get_select_conditions(ids, **kwargs),
+            only_free=only_free
+        )
+
+        self.calc_grouped_result(records, result)
+
+        return result, errors
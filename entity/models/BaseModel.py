@@ -1,13 +1,21 @@
+import asyncio
+
 from core.exceptions import IncorrectParamsException
 from marshmallow import Schema, fields, UnmarshalResult
 from abc import ABCMeta, abstractmethod
 from sqlalchemy.sql import any_
 
-from core.utils import calc_errors_from_vd, get_error_item, get_result_item, validate_by_schema
+from core.serializer import RawJSON, get_projection
+from core.utils import calc_errors_from_vd, get_error_item, validate_by_schema, validate_many_by_schema
 
 
 # abstract class: business-model by entity
 class BaseModel(metaclass=ABCMeta):
+    # schemas by model class, built once: {(model class, 'create' or 'update'): Schema}
+    _schemas = {}
+    # field for grouping of GET-result: [{value: [items]}], None - result is list of items
+    group_by_field = None
+
     def __init__(self, entity_cls, all_fields: set or list=set(), select_fields: set or list=set(), **kwargs):
         # class entity
         self.entity_cls = entity_cls
@@ -30,6 +38,8 @@ class BaseModel(metaclass=ABCMeta):
 
         # base conditions for all requests to db
         self._base_conditions = kwargs.get('conditions', [])
+        # id of last record of page by get_entities with limit, None - no more pages
+        self.next_after_id = None
 
     @classmethod
     @abstractmethod
@@ -47,6 +57,22 @@ class BaseModel(metaclass=ABCMeta):
         :return: Schema
         """
 
+    # Schema for create, cached by model class
+    @classmethod
+    def get_create_schema(cls) -> Schema:
+        schema = BaseModel._schemas.get((cls, 'create'))
+        if schema is None:
+            schema = BaseModel._schemas[(cls, 'create')] = cls._get_create_schema()
+        return schema
+
+    # Schema for update, cached by model class
+    @classmethod
+    def get_update_schema(cls) -> Schema:
+        schema = BaseModel._schemas.get((cls, 'update'))
+        if schema is None:
+            schema = BaseModel._schemas[(cls, 'update')] = cls._get_update_schema()
+        return schema
+
     # validate fields from request and this
     def validate_select_fields(self, _fields) -> bool:
         for field_name in _fields:
@@ -62,9 +88,9 @@ class BaseModel(metaclass=ABCMeta):
     def calc_errors_from_vd(self, errors: dict, data_on_validate: dict={}) -> list:
         return calc_errors_from_vd(errors, data_on_validate)
 
-    # standard result item
+    # standard result item, by projection of fields (compiled once by fields & columns of record)
     def get_result_item(self, data, fields) -> dict:
-        return get_result_item(data, fields)
+        return get_projection(fields).item(data)
 
     # func for find 'allowed ids' and 'not found ids' in list items (Records)
     def get_allowed_ids_by_list(self, all_ids: list or set, items: list or set, field_value=None, field_name: str='tsp_id'):
@@ -79,10 +105,11 @@ class BaseModel(metaclass=ABCMeta):
         allowed_ids = []
         # list errors
         errors = []
+        # found ids for select errors 'not found'
+        found_ids = set()
         # check ids
         for item in items:
-            # remove from ids for select errors 'not found'
-            all_ids.remove(item['id'])
+            found_ids.add(item['id'])
             # check allowed if filter
             if field_name and field_value:
                 # allowed if tsp_id = self.tsp_id
@@ -96,7 +123,8 @@ class BaseModel(metaclass=ABCMeta):
                 allowed_ids.append(item['id'])
 
         # add errors 'not found'
-        [errors.append(self.get_error_item(selector='id', reason='Not found', value=val)) for val in all_ids]
+        errors.extend(self.get_error_item(selector='id', reason='Not found', value=val)
+                      for val in all_ids if val not in found_ids)
 
         return allowed_ids, errors
 
@@ -106,66 +134,185 @@ class BaseModel(metaclass=ABCMeta):
 
     # return conditions for query select/update/delete
     async def _calc_conditions(self, add_cond: list=None) -> list:
-        c = await self._get_base_condition()
+        c = list(await self._get_base_condition())
         if add_cond and isinstance(add_cond, list):
             c.extend(add_cond)
         return c
 
     # calc results/errors by records&ids
     def calc_result(self, records, ids, result: list, errors: list):
-        # calc result list
-        for record in records:
-            result.append(self.get_result_item(record, self.select_fields))
-            # if select by ids - remove item.if for check error-not-found
-            if ids:
-                ids.remove(record['id'])
+        # calc result list by projection of select fields
+        result.extend(get_projection(self.select_fields).items(records))
 
-        # calc errors
+        # calc errors: ids not found in records
         if ids:
-            for rec_id in ids:
-                errors.append(self.get_error_item(selector='id', value=rec_id))
+            found_ids = {record['id'] for record in records}
+            errors.extend(self.get_error_item(selector='id', value=rec_id) for rec_id in ids if rec_id not in found_ids)
 
         return result, errors
 
-    # GET Entities - default method (by ids), in kwargs may be conditions
-    async def get_entities(self, ids: list, **kwargs) -> tuple:
-        # result success
-        result = []
-        # result errors
-        errors = []
+    # calc results grouped by self.group_by_field: [{group_value: [items]}]
+    def calc_grouped_result(self, records, result: list):
+        format_result = dict()
+        group_by_field = self.group_by_field
+        for record, item in zip(records, get_projection(self.select_fields).items(records)):
+            format_result.setdefault(record[group_by_field], []).append(item)
+
+        if format_result:
+            result.append(format_result)
+
+        return result
 
+    # conditions for select entities by ids & filters (kwargs of get_entities), in kwargs may be conditions
+    async def _get_select_conditions(self, ids: list, **kwargs) -> list:
         # conditions for query
         conditions = await self._calc_conditions(kwargs.get('conditions'))
 
-        # select by conditions
-        sel_fields = self.select_fields
         # check select by ids
         if ids:
-            sel_fields.add('id')
             conditions.append(self.entity_cls.id == any_(ids))
 
+        return conditions
+
+    # fields for query: selected fields & fields for calc result (id, field of grouping)
+    def _get_query_fields(self, ids: list) -> set:
+        sel_fields = set(self.select_fields)
+        if ids:
+            sel_fields.add('id')
+        if self.group_by_field:
+            sel_fields.add(self.group_by_field)
+        return sel_fields
+
+    # GET Entities - default method (by ids), in kwargs may be filters & conditions
+    # page by keyset: records with id > after_id ordered by id, not more than limit, id for next page in next_after_id
+    async def get_entities(self, ids: list, after_id: int=None, limit: int=None, **kwargs) -> tuple:
+        # result success
+        result = []
+        # result errors
+        errors = []
+
+        # conditions for query
+        conditions = await self._get_select_conditions(ids, **kwargs)
+        if after_id is not None:
+            conditions.append(self.entity_cls.id > after_id)
+
         # query to db
         records = await self.entity_cls.select_where(
-            str_fields=sel_fields,
-            conditions=conditions
+            str_fields=self._get_query_fields(ids) | ({'id'} if limit else set()),
+            conditions=conditions,
+            order_by=('id', ) if limit else (),
+            limit=limit
         )
 
-        self.calc_result(records, ids, result, errors)
+        if limit:
+            self.next_after_id = records[-1]['id'] if len(records) == limit else None
+            # not found only ids in range of page
+            if ids:
+                ids = [rec_id for rec_id in ids if (after_id is None or rec_id > after_id) and
+                       (self.next_after_id is None or rec_id <= self.next_after_id)]
+
+        if self.group_by_field:
+            self.calc_grouped_result(records, result)
+        else:
+            self.calc_result(records, ids, result, errors)
 
         return result, errors
 
+    # GET Entities grouped by self.group_by_field as json built by db: (RawJSON of result, errors)
+    async def get_entities_json(self, ids: list, after_id: int=None, **kwargs) -> tuple:
+        # conditions for query
+        conditions = await self._get_select_conditions(ids, **kwargs)
+        if after_id is not None:
+            conditions.append(self.entity_cls.id > after_id)
+
+        groups = await self.entity_cls.select_grouped_json(
+            str_fields=self.select_fields,
+            group_by=self.group_by_field,
+            conditions=conditions
+        )
+
+        return RawJSON('[' + groups + ']' if groups else '[]'), []
+
+    # GET Entities by cursor: iterate (group value or None, result item), errors are added to list errors at end
+    async def iter_entities(self, ids: list, errors: list, after_id: int=None, **kwargs):
+        # conditions for query
+        conditions = await self._get_select_conditions(ids, **kwargs)
+        if after_id is not None:
+            conditions.append(self.entity_cls.id > after_id)
+            ids = [rec_id for rec_id in ids if rec_id > after_id]
+        # ids for check error-not-found
+        not_found = set(ids) if ids and not self.group_by_field else set()
+
+        # result items by projection of select fields
+        projection = get_projection(self.select_fields)
+
+        # records of group are sequential
+        records = self.entity_cls.select_where_cursor(
+            str_fields=self._get_query_fields(ids),
+            conditions=conditions,
+            order_by=(self.group_by_field, ) if self.group_by_field else ()
+        )
+        try:
+            async for record in records:
+                if not_found:
+                    not_found.discard(record['id'])
+                yield (record[self.group_by_field] if self.group_by_field else None, projection.item(record))
+        finally:
+            await records.aclose()
+
+        # calc errors
+        errors.extend(self.get_error_item(selector='id', value=rec_id) for rec_id in ids if rec_id in not_found)
+
     # validate dict by create-schema
     def validate_for_create(self, data):
-        return validate_by_schema(self._get_create_schema(), data)
+        return validate_by_schema(self.get_create_schema(), data)
 
     # validate dict by update-schema
     def validate_for_update(self, data):
-        return validate_by_schema(self._get_update_schema(), data)
-
-    # CREATE Entity - default method
-    async def create_entity(self, data: dict, validate: bool=True, **kwargs) -> {dict, list}:
-        # result success
-        result = {}
+        return validate_by_schema(self.get_update_schema(), data)
+
+    # validate list of dicts by create-schema, return [(v_data, errors), ...]
+    def validate_many_for_create(self, items: list) -> list:
+        return validate_many_by_schema(self.get_create_schema(), items)
+
+    # validate list of dicts by update-schema, return [(v_data, errors), ...]
+    def validate_many_for_update(self, items: list) -> list:
+        return validate_many_by_schema(self.get_update_schema(), items)
+
+    # validate prepared items by one call validate_many, return [(v_data, errors), ...]
+    @staticmethod
+    def _validate_prepared(prepared: list, validate_many) -> list:
+        # indexes of items without errors on prepare
+        indexes = [i for i, (v_data, errs) in enumerate(prepared) if not errs and v_data is not None]
+        if indexes:
+            for i, validated in zip(indexes, validate_many([prepared[i][0] for i in indexes])):
+                prepared[i] = validated
+        return prepared
+
+    # validate & prepare list of data for create: prepare by item, validate all items by one schema-load
+    async def _prepare_many_for_create(self, items: list, validate: bool=True, **kwargs) -> list:
+        prepared = [await self._prepare_for_create(data, False, **kwargs) for data in items]
+        return self._validate_prepared(prepared, self.validate_many_for_create) if validate else prepared
+
+    # validate & prepare list of data for update: prepare by item, validate all items by one schema-load
+    async def _prepare_many_for_update(self, items: list, validate: bool=True, **kwargs) -> list:
+        prepared = [await self._prepare_for_update(data, False, **kwargs) for data in items]
+        return self._validate_prepared(prepared, self.validate_many_for_update) if validate else prepared
+
+    # called after records created (records has field id)
+    async def _after_create(self, records: list):
+        pass
+
+    # called after records updated
+    async def _after_update(self, records: list):
+        pass
+
+    # called after records deleted
+    async def _after_delete(self, ids: list):
+        pass
+
+    # validate & prepare data for create, return (v_data, errors)
+    async def _prepare_for_create(self, data: dict, validate: bool=True, **kwargs) -> {dict, list}:
         # result errors
         errors = []
 
@@ -178,22 +325,102 @@ class BaseModel(metaclass=ABCMeta):
         else:
             v_data = data
 
+        return v_data, errors
+
+    # create record by validated data
+    async def _create_record(self, v_data: dict, data: dict) -> {dict, list}:
+        # result success
+        result = {}
+        # result errors
+        errors = []
+
+        # create and get result
+        new_entity_data, msg = await self.entity_cls.create(values=v_data, return_fields=self.select_fields | {'id'})
+        # add to result
+        if new_entity_data:
+            result = self.get_result_item(new_entity_data, self.select_fields)
+            await self._after_create([new_entity_data])
+        else:
+            errors.append(self.get_error_item(selector='data', value=data, reason=msg))
+
+        return result, errors
+
+    # CREATE Entity - default method
+    async def create_entity(self, data: dict, validate: bool=True, **kwargs) -> {dict, list}:
+        # result success
+        result = {}
+
+        # validate-data
+        v_data, errors = await self._prepare_for_create(data, validate, **kwargs)
+
         # create record
         if not errors and v_data:
-            # create and get result
-            new_entity_data, msg = await self.entity_cls.create(values=v_data, return_fields=self.select_fields)
+            result, errors = await self._create_record(v_data, data)
+
+        return result, errors
+
+    # CREATE Entities - default method, validate all items and create its by one query
+    async def create_entities(self, items: list, validate: bool=True, **kwargs) -> {list, list}:
+        # result success
+        result = []
+        # result errors
+        errors = []
+
+        # validated data & data from request
+        values, sources = await self._get_values_for_create(items, errors, validate, **kwargs)
+
+        if values:
+            # create records (by one in the same transaction if some item is failed)
+            created, msg = await self.entity_cls.create_many(values_list=values, return_fields=self.select_fields | {'id'})
+            if created is False:
+                errors.extend(self.get_error_item(selector='data', value=data, reason=msg) for data in sources)
+                return result, errors
+
+            records = []
+            for (record, reason), data in zip(created, sources):
+                if record:
+                    records.append(record)
+                else:
+                    errors.append(self.get_error_item(selector='data', value=data, reason=reason))
+
             # add to result
-            if new_entity_data:
-                result = self.get_result_item(new_entity_data, self.select_fields)
-            else:
-                errors.append(self.get_error_item(selector='data', value=data, reason=msg))
+            if records:
+                result.extend(get_projection(self.select_fields).items(records))
+                await self._after_create(records)
 
         return result, errors
 
-    # UPDATE Entity - default method, in kwargs may be conditions
-    async def update_entity(self, data: dict, validate=True, **kwargs) -> {dict, list}:
-        # results success
-        result = {}
+    # validated data of items without errors & its data from request, errors of items are added to errors
+    async def _get_values_for_create(self, items: list, errors: list, validate: bool=True, **kwargs) -> {list, list}:
+        values, sources = [], []
+        for data, (v_data, errs) in zip(items, await self._prepare_many_for_create(items, validate, **kwargs)):
+            if errs:
+                errors.extend(errs)
+            elif v_data:
+                values.append(v_data)
+                sources.append(data)
+        return values, sources
+
+    # CREATE Entities by one (for entities with custom create_entity)
+    async def _create_entities_by_one(self, items: list, **kwargs) -> {list, list}:
+        # result success
+        result = []
+        # result errors
+        errors = []
+
+        for item_result, item_errors in await asyncio.gather(*(
+                self.create_entity(data=data, **kwargs) for data in items)):
+            if item_result:
+                result.append(item_result)
+            if isinstance(item_errors, list):
+                errors.extend(item_errors)
+            elif item_errors:
+                errors.append(item_errors)
+
+        return result, errors
+
+    # validate & prepare data for update, return (v_data, errors)
+    async def _prepare_for_update(self, data: dict, validate: bool=True, **kwargs) -> {dict, list}:
         # result errors
         errors = []
 
@@ -206,6 +433,16 @@ class BaseModel(metaclass=ABCMeta):
         else:
             v_data = data
 
+        return v_data, errors
+
+    # UPDATE Entity - default method, in kwargs may be conditions
+    async def update_entity(self, data: dict, validate=True, **kwargs) -> {dict, list}:
+        # results success
+        result = {}
+
+        # validate-data
+        v_data, errors = await self._prepare_for_update(data, validate, **kwargs)
+
         # create record
         if not errors and v_data:
             # conditions for query
@@ -221,37 +458,96 @@ class BaseModel(metaclass=ABCMeta):
             # add to result
             if updated_data:
                 result = self.get_result_item(updated_data, self.select_fields)
+                await self._after_update([updated_data])
+            else:
+                errors.append(self.get_error_item(value=data, reason='Error on execute query'))
+
+        return result, errors
+
+    # UPDATE Entities - default method, validate all items and update its by one query, in kwargs may be conditions
+    async def update_entities(self, items: list, validate: bool=True, **kwargs) -> {list, list}:
+        # results success
+        result = []
+        # result errors
+        errors = []
+
+        # validated data & data from request, by id
+        values, sources = [], {}
+        for data, (v_data, errs) in zip(items, await self._prepare_many_for_update(items, validate, **kwargs)):
+            if errs:
+                errors.extend(errs)
+            elif v_data and v_data.get('id'):
+                values.append(v_data)
+                sources.setdefault(v_data['id'], []).append(data)
             else:
                 errors.append(self.get_error_item(value=data, reason='Error on execute query'))
 
+        # id twice in request - no item of id is updated (one row can not be updated by two items in one query)
+        duplicates = {rec_id for rec_id, rec_sources in sources.items() if len(rec_sources) > 1}
+        if duplicates:
+            values = [v_data for v_data in values if v_data['id'] not in duplicates]
+            for rec_id in duplicates:
+                errors.extend(self.get_error_item(selector='id', value=data, reason='Duplicate id')
+                              for data in sources.pop(rec_id))
+        sources = {rec_id: rec_sources[0] for rec_id, rec_sources in sources.items()}
+
+        if values:
+            # conditions for query
+            conditions = await self._calc_conditions(kwargs.get('conditions'))
+
+            # update and get result, id is needed for find not updated items
+            records, msg = await self.entity_cls.update_many(
+                values_list=values,
+                conditions=conditions,
+                return_fields=self.select_fields | {'id'}
+            )
+            # add to result
+            result.extend(get_projection(self.select_fields).items(records or []))
+            for record in records or ():
+                sources.pop(record['id'], None)
+            # not updated items
+            for data in sources.values():
+                errors.append(self.get_error_item(value=data, reason=msg or 'Error on execute query'))
+
+            if records:
+                await self._after_update(records)
+
         return result, errors
 
     # DELETE Entity - default method, in kwargs may be conditions
     async def delete_entity(self, obj_id: int, **kwargs) -> tuple:
+        # condition by selector id
+        if obj_id:
+            return await self.delete_entities([obj_id], **kwargs)
+
+        return [], self.get_error_item('id', 'No valid data')
+
+    # DELETE Entities - default method, delete all ids by one query, in kwargs may be conditions
+    async def delete_entities(self, ids: list, **kwargs) -> tuple:
         # results
         result, errors = [], []
 
-        # condition by selector id
-        if obj_id:
-            # conditions for query
-            conditions = await self._calc_conditions(kwargs.get('conditions'))
-            conditions.append(self.entity_cls.id == obj_id)
+        # conditions for query
+        conditions = await self._calc_conditions(kwargs.get('conditions'))
 
-            # TODO: Bad code! remove select-query
-            # find item in database
-            entity_item = await self.entity_cls.select_where(
-                cls_fields=[self.entity_cls.id],
-                conditions=conditions
-            )
-            # if item finded & has permissions delete it
-            if entity_item:
-                if await self.entity_cls.delete_by_id(obj_id):
-                    result.append(obj_id)
-                else:
-                    errors.append(self.get_error_item(selector='id', reason='Access denied', value=obj_id))
-            else:
+        # delete and get existing records: {id: deleted}
+        records = await self.entity_cls.delete_by_ids(ids, conditions)
+        if records is None:
+            errors.extend(self.get_error_item(selector='id', reason='Error on execute query', value=obj_id) for obj_id in ids)
+            return result, errors
+
+        records = {record['id']: record['deleted'] for record in records}
+        for obj_id in ids:
+            # not found
+            if obj_id not in records:
                 errors.append(self.get_error_item(selector='id', reason='Not found', value=obj_id))
-        else:
-            errors = self.get_error_item('id', 'No valid data')
+            # found, but not allowed by conditions
+            elif not records[obj_id]:
+                errors.append(self.get_error_item(selector='id', reason='Access denied', value=obj_id))
+            else:
+                result.append(obj_id)
+
+        if result:
+            await self._after_delete(result)
 
         return result, errors
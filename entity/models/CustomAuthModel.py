@@ -6,6 +6,12 @@ from .BaseModel import BaseModel
 from common.managers.sessionManager import SessionManager
 
 
+# schema for create entity
+class CustomerLoginSchema(Schema):
+    login = fields.String(required=True, validate=validate.Length(min=3, max=100))
+    password = fields.String(required=True, validate=validate.Length(min=3, max=100))
+
+
 # business-model by authentification Customer
 class CustomerAuthModel(BaseModel):
     def __init__(self):
@@ -30,11 +36,6 @@ class CustomerAuthModel(BaseModel):
     # Schema for create
     @classmethod
     def _get_create_schema(self) -> Schema:
-        # schema for create entity
-        class CustomerLoginSchema(Schema):
-            login = fields.String(required=True, validate=validate.Length(min=3, max=100))
-            password = fields.String(required=True, validate=validate.Length(min=3, max=100))
-
         return CustomerLoginSchema()
 
     # Schema for update
@@ -84,8 +85,8 @@ class CustomerAuthModel(BaseModel):
         return result, msg
 
     # logout
-    def logout(self, sid: str) -> bool:
+    async def logout(self, sid: str) -> bool:
         # delete
-        SessionManager().del_session(sid)
+        await SessionManager().del_session(sid)
 
         return True
\ No newline at end of file
@@ -5,9 +5,34 @@ from entity.customer import Customer
 from entity.order import Order
 
 
+# schema for create entity
+class CustomerCreateSchema(Schema):
+    login = fields.String(required=True, validate=validate.Length(min=3, max=100))
+    password = fields.String(required=True, validate=validate.Length(min=3, max=100))
+    email = fields.Email(required=True)
+    phone = fields.String(required=True)
+
+
+# schema for update entity
+class CustomerUpdateSchema(Schema):
+    id = fields.Integer(required=True)
+    name = fields.String(length=100)
+    description = fields.String(length=200)
+    login = fields.String(validate=validate.Length(min=3, max=100))
+    password = fields.String(validate=validate.Length(min=3, max=100))
+    email = fields.Email()
+    phone = fields.String(length=50)
+    country_id = fields.Integer()
+    city_id = fields.Integer()
+    address = fields.String(length=200)
+    mail_agreement = fields.Boolean(default=True)
+    data = fields.Dict()
+    flags = fields.Integer(default=1)
+
+
 # business-model by entity User
 class CustomerModel(BaseModel):
-    def __init__(self, select_fields: set=set()):
+    def __init__(self, select_fields: set=set(), allowed_schedule_ids: set=frozenset(), creater_id: int=-1):
         """
         :param select_fields: set, list fields for result
         """
@@ -30,81 +55,47 @@ class CustomerModel(BaseModel):
             ),
             select_fields=select_fields
         )
+        # get creter id for current session
+        self.creater_id = creater_id
+        # allowed schedules (filter of customers by orders of schedules)
+        self.allowed_schedule_ids = allowed_schedule_ids
 
+    # Schema for create
     @classmethod
     def _get_create_schema(cls) -> Schema:
-        # schema for create entity
-        class CustomerCreateSchema(Schema):
-            login = fields.String(required=True, validate=validate.Length(min=3, max=100))
-            password = fields.String(required=True, validate=validate.Length(min=3, max=100))
-            email = fields.Email(required=True)
-            phone = fields.String(required=True)
-
         return CustomerCreateSchema()
 
+    # Schema for update
     @classmethod
     def _get_update_schema(cls) -> Schema:
-        # schema for update entity
-        class CustomerUpdateSchema(Schema):
-            id = fields.Integer(required=True)
-            name = fields.String(length=100)
-            description = fields.String(length=200)
-            login = fields.String(validate=validate.Length(min=3, max=100))
-            password = fields.String(validate=validate.Length(min=3, max=100))
-            email = fields.Email()
-            phone = fields.String(length=50)
-            country_id = fields.Integer()
-            city_id = fields.Integer()
-            address = fields.String(length=200)
-            mail_agreement = fields.Boolean(default=True)
-            data = fields.Dict()
-            flags = fields.Integer(default=1)
-
         return CustomerUpdateSchema()
 
-    # GET Entity
-    async def get_entities(self, ids: list, schedule_ids: set = None, filter_name: str = None) -> tuple:
-        result = []
-        errors = []
+    # conditions for select by ids & filters, by schedule_ids - customers with orders of allowed schedules
+    async def _get_select_conditions(self, ids: list, schedule_ids: set = None, filter_name: str = None, **kwargs) -> list:
+        # conditions for query
+        conditions = await self._calc_conditions(kwargs.get('conditions'))
 
-        # default filter customers only by ids in request
-        allowed_customer_ids = ids
+        # condition by selector ids
+        if ids:
+            conditions.append(self.entity_cls.id == any_(ids))
 
         # if need specific schedule data
         if schedule_ids:
             # condition by allowed Schedules
             allowed_schedule_ids = self.allowed_schedule_ids.intersection(schedule_ids)
 
-            # get orders for some schedules
+            # get customer ids from orders of schedules
             order_items = await Order.select_where(
-                cls_fields=[Order.id, Order.schedule_id],
-                conditions=[Order.schedule_id == any_(allowed_schedule_ids)]
+                cls_fields=[Order.customer_id],
+                conditions=[Order.schedule_id == any_(list(allowed_schedule_ids))]
             )
-            # get customer ids form orders
-            allowed_customer_ids = [order_item['customer_id'] for order_item in order_items]
-            if ids:
-                allowed_customer_ids = allowed_customer_ids.intersection(ids)
-
-        # base conditions
-        conditions = await self._get_base_condition()
-
-        # condition by selector ids
-        if allowed_customer_ids:
-            conditions.append(self.entity_cls.id == any_(allowed_customer_ids))
+            conditions.append(self.entity_cls.id == any_(list({order_item['customer_id'] for order_item in order_items})))
 
         # condition by selector name
         if filter_name:
             conditions.append(self.entity_cls.name.contains(filter_name))
 
-        # select by conditions
-        records = await self.entity_cls.select_where(
-            str_fields=self.select_fields,
-            conditions=conditions
-        )
-
-        self.calc_result(records, ids, result, errors)
-
-        return result, errors
+        return conditions
 
     # CREATE Entity, register new User
     async def create_entity(self, data: dict, **kwargs) -> tuple:
@@ -157,12 +148,14 @@ class CustomerModel(BaseModel):
 
         return result, errors
 
-    # UPDATE Entity
-    async def update_entity(self, data: dict, **kwargs) -> tuple:
+    # CREATE Entities, check unique login/email/phone for every item
+    async def create_entities(self, items: list, **kwargs) -> tuple:
+        return await self._create_entities_by_one(items, **kwargs)
+
+    # validate & prepare data for update
+    async def _prepare_for_update(self, data: dict, validate: bool=True, **kwargs) -> tuple:
         # crypt code
         if data.get(self.entity_cls.password.name):
             data[self.entity_cls.password.name] = self.entity_cls.p_encrypt(data[self.entity_cls.password.name])
-        # update
-        result, errors = await super().update_entity(data, **kwargs)
 
-        return result, errors
+        return await super()._prepare_for_update(data, validate, **kwargs)
@@ -4,12 +4,40 @@ from marshmallow import Schema, fields, validate
 
 from .BaseModel import BaseModel
 
-from entity.schedule import Schedule
 from entity.order import Order
+from entity.schDetail import SCHDetail
+
+from core.serializer import get_projection
+
+
+# schema for create entity
+class OrderCreateSchema(Schema):
+    time = fields.Integer(required=True, default=datetime.now())
+    description = fields.String(length=200)
+    status = fields.Integer(default=1)
+    auto_confirm = fields.Boolean(default=True)
+    customer_id = fields.Integer()
+    schedule_id = fields.Integer()
+
+
+# schema for update entity
+class OrderUpdateSchema(Schema):
+    id = fields.Integer(required=True)
+    time = fields.Integer(required=True, default=datetime.now())
+    description = fields.String(length=200)
+    status = fields.Integer(default=1)
+    auto_confirm = fields.Boolean(default=True)
+    customer_id = fields.Integer()
+    schedule_id = fields.Integer()
 
 
 # business-model by entity User
 class OrderModel(BaseModel):
+    #  ---- result data format ----
+    # schedule_id: list()
+    #  ----------------------------
+    group_by_field = 'schedule_id'
+
     def __init__(self, allowed_schedule_ids: set, select_fields: set=set(), creater_id: int = -1):
         """
         :param select_fields: set, list fields for result
@@ -25,7 +53,9 @@ class OrderModel(BaseModel):
                 'customer_id',
                 'schedule_id',
             ),
-            select_fields=select_fields
+            select_fields=select_fields,
+            # update & delete only orders of allowed schedules (schedule of existing row)
+            conditions=[Order.schedule_id == any_(list(allowed_schedule_ids))]
         )
         # get creter id for current session
         self.creater_id = creater_id
@@ -35,44 +65,22 @@ class OrderModel(BaseModel):
     # Schema for create
     @classmethod
     def _get_create_schema(self) -> Schema:
-        class OrderCreateSchema(Schema):
-            time = fields.Integer(required=True, default=datetime.now())
-            description = fields.String(length=200)
-            status = fields.Integer(default=1)
-            auto_confirm = fields.Boolean(default=True)
-            customer_id = fields.Integer()
-            schedule_id = fields.Integer()
         return OrderCreateSchema()
 
     # Schema for update
     @classmethod
     def _get_update_schema(self) -> Schema:
-        class OrderUpdateSchema(Schema):
-            id = fields.Integer(required=True)
-            time = fields.Integer(required=True, default=datetime.now())
-            description = fields.String(length=200)
-            status = fields.Integer(default=1)
-            auto_confirm = fields.Boolean(default=True)
-            customer_id = fields.Integer()
-            schedule_id = fields.Integer()
         return OrderUpdateSchema()
 
-    # GET Entity
-    async def get_entities(self, ids: list, schedule_ids: set = None, customer_ids: set = None, filter_name: str = None, status: str = None) -> tuple:
-        # result vars
-        result = []
-        errors = []
-
-        # conditions by select users
-        conditions = await self._get_base_condition()
-
+    # conditions for select by ids & filters
+    async def _get_select_conditions(self, ids: list, schedule_ids: set = None, customer_ids: set = None, filter_name: str = None, status: str = None, **kwargs) -> list:
         allowed_schedule_ids = self.allowed_schedule_ids
         if schedule_ids:
             # condition by allowed Schedules
             allowed_schedule_ids = self.allowed_schedule_ids.intersection(schedule_ids)
 
         # conditions for select details, by allowed schedule
-        conditions = [self.entity_cls.schedule_id == any_(allowed_schedule_ids)]
+        conditions = [self.entity_cls.schedule_id == any_(list(allowed_schedule_ids))]
 
         # condition by selector ids
         if ids:
@@ -90,65 +98,61 @@ class OrderModel(BaseModel):
         if status:
             conditions.append(self.entity_cls.status.contains(status))
 
-        # select by conditions
-        records = await self.entity_cls.select_where(
-            str_fields=self.select_fields,
-            conditions=conditions
-        )
-
-        #  ---- result data format ----
-        # schedule_id: list()
-        #  ----------------------------
+        return conditions
 
-        format_result = dict()
-        # format details
-        for record in records:
-            format_result_data = format_result.setdefault(record['schedule_id'], list())
-            format_result_data.append(self.get_result_item(record, self.select_fields))
-
-        if format_result:
-            result.append(format_result)
+    # validate & prepare data for create
+    async def _prepare_for_create(self, data: dict, validate: bool=True, **kwargs) -> tuple:
+        # schedule id from request params
+        sch_ids = data.get('schedule_id')
+        customer_id = data.get('customer_id')
 
-        return result, errors
+        # if schedule accessable
+        if sch_ids and customer_id:
+            return await super()._prepare_for_create(data, validate, **kwargs)
 
-    # CREATE Entity
-    async def create_entity(self, data: dict, **kwargs) -> tuple:
-        # result vars
-        result = []
-        errors = []
+        return None, [self.get_error_item('id', 'You have not such schedule')]
 
+    # validate & prepare data for update, ownership of schedule checked by allowed schedules of session
+    async def _prepare_for_update(self, data: dict, validate: bool=True, **kwargs) -> tuple:
         # schedule id from request params
-        sch_ids = data['schedule_id']
-        customer_id = data['customer_id']
+        sch_id = data.get('schedule_id')
 
         # if schedule accessable
-        if sch_ids and customer_id:
-            result, errors = await super().create_entity(data, **kwargs)
-        else:
-            errors = self.get_error_item('id', 'You have not such schedule')
+        if sch_id in self.allowed_schedule_ids:
+            return await super()._prepare_for_update(data, validate, **kwargs)
 
-        # get entites
-        return result, errors
+        return None, [self.get_error_item('id', 'You have not such schedule')]
+
+    # CREATE Entity: order books place of slot
+    async def create_entity(self, data: dict, validate: bool=True, **kwargs) -> {dict, list}:
+        result, errors = await self.create_entities([data], validate, **kwargs)
+        return (result[0] if result else {}), errors
 
-    # UPDATE Entity
-    async def update_entity(self, data: dict, **kwargs) -> tuple:
-        # result vars
+    # CREATE Entities: orders book places of slots atomically, order is not created if slot has no free places
+    async def create_entities(self, items: list, validate: bool=True, **kwargs) -> {list, list}:
+        # result success
         result = []
+        # result errors
         errors = []
 
-        # schedule id from request params
-        sch_ids = data['schedule_id']
+        # validated data & data from request
+        values, sources = await self._get_values_for_create(items, errors, validate, **kwargs)
 
-        # allowed schedules
-        allow_schedule_items = await Schedule.select_where(
-            cls_fields=[Schedule.id],
-            conditions=[Schedule.creater_id == self.creater_id, Schedule.id == sch_ids]
-        )
-        # if schedule accessable
-        if allow_schedule_items:
-            result, errors = await super().update_entity(data, **kwargs)
-        else:
-            errors = self.get_error_item('id', 'You have not such schedule')
+        if values:
+            booked, msg = await SCHDetail.book_orders(values_list=values, return_fields=self.select_fields | {'id'})
+            if booked is False:
+                errors.extend(self.get_error_item(selector='data', value=data, reason=msg) for data in sources)
+                return result, errors
 
-        # get entites
-        return result, errors
\ No newline at end of file
+            records = []
+            for (record, reason), data in zip(booked, sources):
+                if record:
+                    records.append(record)
+                else:
+                    errors.append(self.get_error_item(selector='data', value=data, reason=reason))
+
+            if records:
+                result.extend(get_projection(self.select_fields).items(records))
+                await self._after_create(records)
+
+        return result, errors
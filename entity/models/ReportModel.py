@@ -0,0 +1,163 @@
+import numpy as np
+from sqlalchemy.sql import any_
+from marshmallow import Schema
+
+from .BaseModel import BaseModel
+
+from entity.order import Order, OrderStatusEnum
+from entity.schDetail import SCHDetail
+
+# statuses of orders in histogram (by value)
+STATUSES = sorted(OrderStatusEnum, key=lambda status: status.value)
+# key of slot: schedule_id * TIME_BASE + time
+TIME_BASE = 2 ** 32
+
+
+# business-model: reports by schedules (occupancy & revenue of slots, statuses of orders), calculated by columns
+class ScheduleReportModel(BaseModel):
+    #  ---- result data format ----
+    # schedule_id: report
+    #  ----------------------------
+
+    def __init__(self, allowed_schedule_ids: set, select_fields: set=set()):
+        """
+        :param select_fields: set, list fields for result
+        """
+        super().__init__(
+            entity_cls=Order,
+            all_fields=(
+                'slots',
+                'statuses',
+                'orders',
+                'customers',
+                'members',
+                'booked',
+                'occupancy',
+                'revenue',
+            ),
+            select_fields=select_fields
+        )
+        # allowed schedules
+        self.allowed_schedule_ids = allowed_schedule_ids
+
+    # Schema for create
+    @classmethod
+    def _get_create_schema(cls) -> Schema:
+        return Schema()
+
+    # Schema for update
+    @classmethod
+    def _get_update_schema(cls) -> Schema:
+        return Schema()
+
+    # conditions by schedules & time range [time_from, time_to) for entity
+    @staticmethod
+    def _get_report_conditions(entity_cls, schedule_ids: list, time_from: int=None, time_to: int=None) -> list:
+        conditions = [entity_cls.schedule_id == any_(schedule_ids)]
+        if time_from is not None:
+            conditions.append(entity_cls.time >= time_from)
+        if time_to is not None:
+            conditions.append(entity_cls.time < time_to)
+        return conditions
+
+    # GET reports of schedules (ids - ids of schedules, all allowed schedules if empty)
+    async def get_entities(self, ids: list, time_from: int=None, time_to: int=None, **kwargs) -> tuple:
+        # result success
+        result = []
+        # result errors
+        errors = [self.get_error_item(selector='id', reason='Access denied', value=schedule_id)
+                  for schedule_id in ids if schedule_id not in self.allowed_schedule_ids]
+
+        schedule_ids = sorted(set(ids) & set(self.allowed_schedule_ids) if ids else self.allowed_schedule_ids)
+        if not schedule_ids:
+            return result, errors
+
+        # columns of slots & orders by one query per entity
+        details = await SCHDetail.select_columns(
+            str_fields=('schedule_id', 'time', 'members', 'price'),
+            conditions=self._get_report_conditions(SCHDetail, schedule_ids, time_from, time_to)
+        )
+        orders = await Order.select_columns(
+            str_fields=('schedule_id', 'time', 'status', 'customer_id'),
+            conditions=self._get_report_conditions(Order, schedule_ids, time_from, time_to)
+        )
+
+        result.append(self.calc_reports(schedule_ids, details, orders))
+
+        return result, errors
+
+    # reports by columns of slots & orders: {schedule_id: report}
+    def calc_reports(self, schedule_ids: list, details: dict, orders: dict) -> dict:
+        schedules = np.array(schedule_ids, dtype=np.int64)
+
+        # slots sorted by (schedule_id, time)
+        d_keys = np.array(details['schedule_id'], dtype=np.int64) * TIME_BASE + np.array(details['time'], dtype=np.int64)
+        d_order = np.argsort(d_keys, kind='mergesort')
+        d_keys = d_keys[d_order]
+        d_schedule = np.array(details['schedule_id'], dtype=np.int64)[d_order]
+        d_time = np.array(details['time'], dtype=np.int64)[d_order]
+        d_members = np.array(details['members'], dtype=np.int64)[d_order]
+        d_price = np.array(details['price'], dtype=np.float64)[d_order]
+
+        # orders
+        o_schedule = np.array(orders['schedule_id'], dtype=np.int64)
+        o_time = np.array(orders['time'], dtype=np.int64)
+        o_status = np.array(orders['status'], dtype=np.int64)
+        o_customer = np.array([customer_id or 0 for customer_id in orders['customer_id']], dtype=np.int64)
+
+        # slot of order (by schedule_id & time), rejected orders do not book places
+        o_slot = np.searchsorted(d_keys, o_schedule * TIME_BASE + o_time)
+        in_slot = o_slot < len(d_keys)
+        in_slot[in_slot] = d_keys[o_slot[in_slot]] == (o_schedule * TIME_BASE + o_time)[in_slot]
+        booking = in_slot & (o_status != OrderStatusEnum.rejected.value)
+
+        # by slots
+        booked = np.bincount(o_slot[booking], minlength=len(d_keys))
+        revenue = booked * d_price
+        occupancy = np.divide(booked, d_members, out=np.zeros(len(d_keys)), where=d_members > 0)
+
+        # by schedules: index of schedule for slots & orders
+        d_index = np.searchsorted(schedules, d_schedule)
+        o_index = np.searchsorted(schedules, o_schedule)
+        count = len(schedules)
+        slot_bounds = np.searchsorted(d_schedule, schedules, side='left'), np.searchsorted(d_schedule, schedules, side='right')
+
+        # histogram by statuses: row - schedule, column - status
+        known = (o_status >= STATUSES[0].value) & (o_status <= STATUSES[-1].value)
+        statuses = np.bincount(o_index[known] * len(STATUSES) + o_status[known] - STATUSES[0].value,
+                               minlength=count * len(STATUSES)).reshape(count, len(STATUSES))
+
+        # unique customers by schedules
+        customers = np.unique(o_index[o_customer > 0] * TIME_BASE + o_customer[o_customer > 0])
+        customers = np.bincount(customers // TIME_BASE, minlength=count)
+
+        totals = dict(
+            orders=np.bincount(o_index, minlength=count),
+            members=np.bincount(d_index, weights=d_members, minlength=count),
+            booked=np.bincount(d_index, weights=booked, minlength=count),
+            revenue=np.bincount(d_index, weights=revenue, minlength=count),
+        )
+
+        reports = {}
+        for i, schedule_id in enumerate(schedule_ids):
+            start, end = slot_bounds[0][i], slot_bounds[1][i]
+            members = int(totals['members'][i])
+            report = dict(
+                slots=dict(
+                    time=d_time[start:end].tolist(),
+                    members=d_members[start:end].tolist(),
+                    booked=booked[start:end].tolist(),
+                    occupancy=occupancy[start:end].tolist(),
+                    revenue=revenue[start:end].tolist(),
+                ),
+                statuses={status.name: int(statuses[i][j]) for j, status in enumerate(STATUSES)},
+                orders=int(totals['orders'][i]),
+                customers=int(customers[i]),
+                members=members,
+                booked=int(totals['booked'][i]),
+                occupancy=float(totals['booked'][i] / members) if members else 0.0,
+                revenue=float(totals['revenue'][i]),
+            )
+            reports[schedule_id] = {field: value for field, value in report.items() if field in self.select_fields}
+
+        return reports
@@ -8,9 +8,36 @@ from entity.schedule import Schedule
 from entity.schDetail import SCHDetail
 from entity.order import Order
 
+from common.managers.slotIndexManager import SlotIndexManager
+from core.serializer import RawJSON, dumps
+
+
+# schema for create entity
+class ScheduleDetailCreateSchema(Schema):
+    time = fields.Integer(required=True, default=datetime.now())
+    description = fields.String(length=200)
+    members = fields.Integer(default=1)
+    schedule_id = fields.Integer(required=True)
+    price = fields.Float(default=1)
+
+
+# schema for update entity
+class ScheduleDetailUpdateSchema(Schema):
+    id = fields.Integer(required=True)
+    time = fields.Integer(required=True, default=datetime.now())
+    description = fields.String(length=200)
+    members = fields.Integer(default=1)
+    schedule_id = fields.Integer(required=True)
+    price = fields.Float(default=1)
+
 
 # business-model by entity User
 class ScheduleDetailModel(BaseModel):
+    #  ---- result data format ----
+    # schedule_id: list()
+    #  ----------------------------
+    group_by_field = 'schedule_id'
+
     def __init__(self, allowed_schedule_ids: set, select_fields: set=set(), creater_id: int = -1):
         """
         :param select_fields: set, list fields for result
@@ -26,7 +53,7 @@ class ScheduleDetailModel(BaseModel):
                 'schedule_id',
             ),
             select_fields=select_fields,
-            conditions=[SCHDetail.schedule_id == any_(allowed_schedule_ids)]
+            conditions=[SCHDetail.schedule_id == any_(list(allowed_schedule_ids))]
         )
         # get creter id for current session
         self.creater_id = creater_id
@@ -36,34 +63,18 @@ class ScheduleDetailModel(BaseModel):
     # Schema for create
     @classmethod
     def _get_create_schema(self) -> Schema:
-        class ScheduleDetailCreateSchema(Schema):
-            time = fields.Integer(required=True, default=datetime.now())
-            description = fields.String(length=200)
-            members = fields.Integer(default=1)
-            schedule_id = fields.Integer(required=True)
-            price = fields.Float(default=1)
         return ScheduleDetailCreateSchema()
 
     # Schema for update
     @classmethod
     def _get_update_schema(self) -> Schema:
-        class ScheduleDetailUpdateSchema(Schema):
-            id = fields.Integer(required=True)
-            time = fields.Integer(required=True, default=datetime.now())
-            description = fields.String(length=200)
-            members = fields.Integer(default=1)
-            schedule_id = fields.Integer(required=True)
-            price = fields.Float(default=1)
         return ScheduleDetailUpdateSchema()
 
-    # GET Entity
-    async def get_entities(self, ids: list, schedule_ids: set = None) -> tuple:
-        # result vars
-        result = []
-        errors = []
-
+    # conditions for select by ids & schedules & time range [time_from, time_to)
+    async def _get_select_conditions(self, ids: list, schedule_ids: set = None, time_from: int = None,
+                                     time_to: int = None, **kwargs) -> list:
         # conditions for select details, by allowed schedule
-        conditions = await self._get_base_condition()
+        conditions = await self._calc_conditions(kwargs.get('conditions'))
 
         # condition by selector ids
         if ids:
@@ -74,41 +85,65 @@ class ScheduleDetailModel(BaseModel):
         if schedule_ids:
             conditions.append(self.entity_cls.schedule_id == any_(schedule_ids))
 
-        # select by conditions
-        records = await self.entity_cls.select_where(
-            str_fields=self.select_fields,
-            conditions=conditions
-        )
+        # condition by time range
+        if time_from is not None:
+            conditions.append(self.entity_cls.time >= time_from)
+        if time_to is not None:
+            conditions.append(self.entity_cls.time < time_to)
+
+        return conditions
+
+    # details by time range are selected from index of slots: not by ids, not by pages, index is enabled
+    @staticmethod
+    def _is_slot_index_query(ids: list, after_id: int=None, limit: int=None, time_from: int = None,
+                             time_to: int = None, **kwargs) -> bool:
+        return (time_from is not None or time_to is not None) and not ids and after_id is None and not limit and \
+            not kwargs.get('conditions') and SlotIndexManager().enabled
+
+    # GET Entities: details of schedules by time range from index of slots (without query to db),
+    # by ids, by pages or if index is disabled - from db
+    async def get_entities(self, ids: list, after_id: int=None, limit: int=None, schedule_ids: set = None,
+                           time_from: int = None, time_to: int = None, **kwargs) -> tuple:
+        if not self._is_slot_index_query(ids, after_id, limit, time_from, time_to, **kwargs):
+            return await super().get_entities(ids, after_id=after_id, limit=limit, schedule_ids=schedule_ids,
+                                              time_from=time_from, time_to=time_to, **kwargs)
+
+        # allowed schedules
+        allowed_schedule_ids = set(self.allowed_schedule_ids)
+        if schedule_ids:
+            allowed_schedule_ids.intersection_update(schedule_ids)
 
-        #  ---- result data format ----
-        # schedule_id: list()
-        #  ----------------------------
+        result = []
+        self.calc_grouped_result(await SlotIndexManager().get_range(allowed_schedule_ids, time_from, time_to), result)
 
-        format_result = dict()
-        # format details
-        for detail_item in records:
-            format_result_data = format_result.setdefault(detail_item['schedule_id'], list())
-            format_result_data.append(self.get_result_item(detail_item, self.select_fields))
+        return result, []
 
-        if format_result:
-            result.append(format_result)
+    # GET Entities as json built by db, details by time range - from index of slots
+    async def get_entities_json(self, ids: list, after_id: int=None, **kwargs) -> tuple:
+        if self._is_slot_index_query(ids, after_id, **kwargs):
+            result, errors = await self.get_entities(ids, after_id=after_id, **kwargs)
+            return RawJSON(dumps(result)), errors
+        return await super().get_entities_json(ids, after_id=after_id, **kwargs)
 
-        return result, errors
+    # created details are added to index of slots
+    async def _after_create(self, records: list):
+        SlotIndexManager().update(records)
 
-    # CREATE Entity
-    async def create_entity(self, data: dict, **kwargs) -> tuple:
-        # result vars
-        result = []
+    # updated details are moved in index of slots
+    async def _after_update(self, records: list):
+        SlotIndexManager().update(records)
 
+    # deleted details are removed from index of slots
+    async def _after_delete(self, ids: list):
+        SlotIndexManager().remove(ids)
+
+    # validate & prepare data for create
+    async def _prepare_for_create(self, data: dict, validate: bool=True, **kwargs) -> tuple:
         # schedule id from request params
         sch_id = data.get('schedule_id', -1)
 
         # if schedule accessable
         if sch_id in self.allowed_schedule_ids:
-            result, errors = await super().create_entity(data, **kwargs)
-        else:
-            errors = self.get_error_item('id', 'Access denied...')
-
-        # get entites
-        return result, errors
+            return await super()._prepare_for_create(data, validate, **kwargs)
 
+        return None, [self.get_error_item('id', 'Access denied...')]
@@ -3,6 +3,40 @@ from marshmallow import Schema, fields
 
 from .BaseModel import BaseModel
 from entity.schedule import Schedule
+from common.managers.sessionManager import SessionManager
+from common.managers.cacheManager import CacheManager
+from common.managers.slotIndexManager import SlotIndexManager
+
+
+# schema for create entity
+class ScheduleCreateSchema(Schema):
+    name = fields.String(required=True, length=100)
+    description = fields.String(length=200)
+    email = fields.Email()
+    phone = fields.String(length=50)
+    country_id = fields.Integer()
+    city_id = fields.Integer()
+    creater_id = fields.Integer()
+    address = fields.String(length=200)
+    data = fields.Dict()
+    flags = fields.Integer(default=1)
+    activate = fields.Boolean(default=True)
+
+
+# schema for update entity
+class ScheduleUpdateSchema(Schema):
+    id = fields.Integer(required=True)
+    name = fields.String(length=100)
+    description = fields.String(length=200)
+    email = fields.Email()
+    phone = fields.String(length=50)
+    country_id = fields.Integer()
+    city_id = fields.Integer()
+    creater_id = fields.Integer()
+    address = fields.String(length=200)
+    data = fields.Dict()
+    flags = fields.Integer(default=1)
+    activate = fields.Boolean(default=True)
 
 
 # schedule for Users
@@ -36,46 +70,17 @@ class ScheduleModel(BaseModel):
     # Schema for create
     @classmethod
     def _get_create_schema(self) -> Schema:
-        class ScheduleCreateSchema(Schema):
-            name = fields.String(required=True, length=100)
-            description = fields.String(length=200)
-            email = fields.Email()
-            phone = fields.String(length=50)
-            country_id = fields.Integer()
-            city_id = fields.Integer()
-            creater_id = fields.Integer()
-            address = fields.String(length=200)
-            data = fields.Dict()
-            flags = fields.Integer(default=1)
-            activate = fields.Boolean(default=True)
         return ScheduleCreateSchema()
 
     # Schema for update
     @classmethod
     def _get_update_schema(self) -> Schema:
-        class ScheduleUpdateSchema(Schema):
-            id = fields.Integer(required=True)
-            name = fields.String(length=100)
-            description = fields.String(length=200)
-            email = fields.Email()
-            phone = fields.String(length=50)
-            country_id = fields.Integer()
-            city_id = fields.Integer()
-            creater_id = fields.Integer()
-            address = fields.String(length=200)
-            data = fields.Dict()
-            flags = fields.Integer(default=1)
-            activate = fields.Boolean(default=True)
         return ScheduleUpdateSchema()
 
-    # GET Entity
-    async def get_entities(self, ids: list, filter_name: str = None) -> tuple:
-        # result vars
-        result = []
-        errors = []
-
+    # conditions for select by ids & name
+    async def _get_select_conditions(self, ids: list, filter_name: str = None, **kwargs) -> list:
         # conditions by allowed creaters
-        conditions = await self._get_base_condition()
+        conditions = await self._calc_conditions(kwargs.get('conditions'))
 
         # condition by selector ids
         if ids:
@@ -85,36 +90,46 @@ class ScheduleModel(BaseModel):
         if filter_name:
             conditions.append(self.entity_cls.name.contains(filter_name))
 
-        # select by conditions
-        records = await self.entity_cls.select_where(
-            str_fields=self.select_fields,
-            conditions=conditions
-        )
-
-        self.calc_result(records, ids, result, errors)
+        return conditions
 
-        return result, errors
-
-    # CREATE Entity
-    async def create_entity(self, data: dict, **kwargs) -> tuple:
+    # validate & prepare data for create
+    async def _prepare_for_create(self, data: dict, validate: bool=True, **kwargs) -> tuple:
         # add creter id in request data
         data['creater_id'] = self.creater_id
 
         # run method in BaseModel
-        return await super().create_entity(data)
-
-    # UPDATE Entity
-    async def update_entity(self, data: dict, **kwargs) -> tuple:
-        # update
+        return await super()._prepare_for_create(data, validate)
+
+    # created schedules allowed for sessions of creater
+    async def _after_create(self, records: list):
+        await SessionManager().add_acl_schedules(self.creater_id, [record['id'] for record in records])
+        await CacheManager().invalidate(ScheduleOnlineModel.CACHE_NAMESPACE)
+
+    # updated schedules: cached responses of ScheduleOnline are not valid
+    async def _after_update(self, records: list):
+        await CacheManager().invalidate(ScheduleOnlineModel.CACHE_NAMESPACE)
+
+    # deleted schedules not allowed for sessions of creater
+    async def _after_delete(self, ids: list):
+        await SessionManager().remove_acl_schedules(self.creater_id, ids)
+        await CacheManager().invalidate(ScheduleOnlineModel.CACHE_NAMESPACE)
+        # details of schedules are deleted by cascade
+        SlotIndexManager().invalidate(ids)
+
+    # validate & prepare data for update
+    async def _prepare_for_update(self, data: dict, validate: bool=True, **kwargs) -> tuple:
         # add creter id in request data
         data['creater_id'] = self.creater_id
 
         # run method in BaseModel
-        return await super().update_entity(data)
+        return await super()._prepare_for_update(data, validate)
 
 
 # schedule for Customers
 class ScheduleOnlineModel(BaseModel):
+    # namespace of cached responses, invalidated by changes of schedules
+    CACHE_NAMESPACE = 'schedule_online'
+
     def __init__(self, select_fields: set=set()):
         """
         :param select_fields: set, list fields for result
@@ -146,14 +161,10 @@ class ScheduleOnlineModel(BaseModel):
     def _get_update_schema(self) -> Schema:
         return Schema()
 
-    # GET Entity
-    async def get_entities(self, ids: list, filter_name: str = None, creater_ids: set = None) -> tuple:
-        # result vars
-        result = []
-        errors = []
-
+    # conditions for select by ids, name & creaters
+    async def _get_select_conditions(self, ids: list, filter_name: str = None, creater_ids: set = None, **kwargs) -> list:
         # conditions by allowed creaters
-        conditions = await self._get_base_condition()
+        conditions = await self._calc_conditions(kwargs.get('conditions'))
 
         # condition by selector ids
         if ids:
@@ -167,12 +178,4 @@ class ScheduleOnlineModel(BaseModel):
         if creater_ids:
             conditions.append(self.entity_cls.id == any_(creater_ids))
 
-        # select by conditions
-        records = await self.entity_cls.select_where(
-            str_fields=self.select_fields,
-            conditions=conditions
-        )
-
-        self.calc_result(records, ids, result, errors)
-
-        return result, errors
\ No newline at end of file
+        return conditions
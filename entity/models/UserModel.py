@@ -4,6 +4,32 @@ from entity.user import User
 from core.utils import keygen
 
 
+# schema for create entity
+class UserCreateSchema(Schema):
+    login = fields.String(required=True, validate=validate.Length(min=3, max=100))
+    password = fields.String(required=True, validate=validate.Length(min=3, max=100))
+    email = fields.Email(required=True)
+    phone = fields.String(required=True)
+
+
+# schema for update entity
+class UserUpdateSchema(Schema):
+    id = fields.Integer(required=True)
+    name = fields.String(length=100)
+    organization = fields.String(length=200)
+    description = fields.String(length=200)
+    login = fields.String(validate=validate.Length(min=3, max=100))
+    password = fields.String(validate=validate.Length(min=3, max=100))
+    email = fields.Email()
+    phone = fields.String(length=50)
+    country_id = fields.Integer()
+    city_id = fields.Integer()
+    address = fields.String(length=200)
+    mail_agreement = fields.Boolean(default=True)
+    data = fields.Dict()
+    flags = fields.Integer(default=1)
+
+
 # business-model by entity User
 class UserModel(BaseModel):
     def __init__(self, select_fields: set=set()):
@@ -31,36 +57,14 @@ class UserModel(BaseModel):
             select_fields=select_fields
         )
 
+    # Schema for create
     @classmethod
     def _get_create_schema(cls) -> Schema:
-        # schema for create entity
-        class UserCreateSchema(Schema):
-            login = fields.String(required=True, validate=validate.Length(min=3, max=100))
-            password = fields.String(required=True, validate=validate.Length(min=3, max=100))
-            email = fields.Email(required=True)
-            phone = fields.String(required=True)
-
         return UserCreateSchema()
 
+    # Schema for update
     @classmethod
     def _get_update_schema(cls) -> Schema:
-        # schema for update entity
-        class UserUpdateSchema(Schema):
-            id = fields.Integer(required=True)
-            name = fields.String(length=100)
-            organization = fields.String(length=200)
-            description = fields.String(length=200)
-            login = fields.String(validate=validate.Length(min=3, max=100))
-            password = fields.String(validate=validate.Length(min=3, max=100))
-            email = fields.Email()
-            phone = fields.String(length=50)
-            country_id = fields.Integer()
-            city_id = fields.Integer()
-            address = fields.String(length=200)
-            mail_agreement = fields.Boolean(default=True)
-            data = fields.Dict()
-            flags = fields.Integer(default=1)
-
         return UserUpdateSchema()
 
     # CREATE Entity, register new User
@@ -116,13 +120,14 @@ class UserModel(BaseModel):
 
         return result, errors
 
-    # UPDATE Entity
-    async def update_entity(self, data: dict, **kwargs) -> tuple:
+    # CREATE Entities, check unique login/email/phone for every item
+    async def create_entities(self, items: list, **kwargs) -> tuple:
+        return await self._create_entities_by_one(items, **kwargs)
+
+    # validate & prepare data for update
+    async def _prepare_for_update(self, data: dict, validate: bool=True, **kwargs) -> tuple:
         # crypt code
         if data.get(self.entity_cls.password.name):
             data[self.entity_cls.password.name] = self.entity_cls.p_encrypt(data[self.entity_cls.password.name])
 
-        # update
-        result, errors = await super().update_entity(data, **kwargs)
-
-        return result, errors
\ No newline at end of file
+        return await super()._prepare_for_update(data, validate, **kwargs)
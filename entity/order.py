@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Column, Integer, String, types, Boolean, ForeignKey, DateTime, DATETIME, UniqueConstraint, Enum
+from sqlalchemy import Column, Integer, String, types, Boolean, ForeignKey, DateTime, DATETIME, UniqueConstraint, Enum, Index
 from sqlalchemy.sql import select, any_, join
 
 from .base import Base, BaseEntity
@@ -44,6 +44,15 @@ class Order(Base, BaseEntity):
     # time updated
     updated_at = Column(Integer, default=int(datetime.now().timestamp()), onupdate=int(datetime.now().timestamp()))
 
+    __table_args__ = (
+        # orders of schedules (by time)
+        Index('ix_Orders_schedule_id_time', 'schedule_id', 'time'),
+        # orders of schedules by status
+        Index('ix_Orders_schedule_id_status', 'schedule_id', 'status'),
+        # orders of customers
+        Index('ix_Orders_customer_id', 'customer_id'),
+    )
+
     # @classmethod
     # # select tags for units
     # async def select_by_schedule(cls, schedule_ids: list, customer_ids: list = None, order_ids: list or set = None,
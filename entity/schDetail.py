@@ -1,6 +1,13 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, DATETIME, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, DATETIME, UniqueConstraint, Index
+from sqlalchemy.sql import select, func, and_, cast, true, elements
+from sqlalchemy.dialects.postgresql import ARRAY
 from datetime import datetime
 from .base import Base, BaseEntity
+from .order import Order, OrderStatusEnum
+from .schedule import Schedule
+
+from settings import logger
+from common.managers.dbManager import DBManager
 
 
 # Entity Order
@@ -23,3 +30,132 @@ class SCHDetail(Base, BaseEntity):
     created_at = Column(Integer, default=int(datetime.now().timestamp()))
     # time updated
     updated_at = Column(Integer, default=int(datetime.now().timestamp()), onupdate=int(datetime.now().timestamp()))
+
+    __table_args__ = (
+        # details of schedules (by time)
+        Index('ix_SCHDetails_schedule_id_time', 'schedule_id', 'time'),
+    )
+
+    @classmethod
+    # slots of active schedules with count of booked places (not rejected orders at time of slot) & remaining places,
+    # by one query: orders are counted by slot (LATERAL) before join, details with the same time count orders once each
+    async def select_availability(cls, conditions: list, only_free: bool=False) -> list:
+        # only active schedules
+        active_condition = Schedule.activate == True
+        # orders of slot, rejected orders do not book places
+        orders_condition = Order.status != OrderStatusEnum.rejected.value
+        # only sql-conditions
+        conditions = [condition for condition in conditions if isinstance(condition, elements.ColumnElement)]
+
+        # create query, called only if query not in cache
+        def build_query():
+            orders = select([func.count(Order.id).label('booked')]).where(and_(
+                Order.schedule_id == cls.schedule_id, Order.time == cls.time, orders_condition
+            )).lateral('o')
+            query = select([
+                cls.id, cls.time, cls.description, cls.members, cls.price, cls.schedule_id,
+                orders.c.booked,
+                (cls.members - orders.c.booked).label('remaining'),
+            ]).select_from(
+                cls.__table__
+                .join(Schedule.__table__, and_(Schedule.id == cls.schedule_id, active_condition))
+                .join(orders, true())
+            )
+            for condition in conditions:
+                query = query.where(condition)
+            # slot has free places
+            if only_free:
+                query = query.where(cls.members > orders.c.booked)
+            return query.order_by(cls.schedule_id, cls.time)
+
+        # compiled query from cache: bind values of conditions (all binds of query are in conditions)
+        query = DBManager().statement_cache.compile(
+            key=(cls, 'availability', only_free),
+            conditions=[orders_condition, active_condition] + conditions,
+            build_query=build_query
+        )
+
+        return await DBManager().query_fetch_coalesced(query)
+
+    @classmethod
+    # create orders if slots (details at schedule_id & time of order) have free places, atomic for concurrent bookings:
+    # rows of slots are locked (FOR UPDATE, in order of id) until commit, booked places are counted after lock,
+    # orders at time without slot are created without limit of places
+    async def book_orders(cls, values_list: list, return_fields: list or set=None) -> {list or bool, str}:
+        """
+        :param values_list: list of validated orders (schedule_id & time are required)
+        :param return_fields: fields of created orders
+        :return: ([(record or None, reason of not booked order), ...] in order of values_list, msg) or (False, msg)
+        """
+        # message/error
+        msg = ''
+        # list returning-fields
+        returning = [getattr(Order, field) for field in (return_fields or ['id'])]
+
+        # slots of orders: (schedule_id, time)
+        keys = sorted({(values['schedule_id'], values['time']) for values in values_list})
+        schedule_ids = cast([key[0] for key in keys], ARRAY(Integer))
+        times = cast([key[1] for key in keys], ARRAY(Integer))
+
+        # table of slots: (SELECT unnest($1::INTEGER[]) AS schedule_id, unnest($2::INTEGER[]) AS time) AS s
+        def get_slots():
+            return select([func.unnest(schedule_ids).label('schedule_id'), func.unnest(times).label('time')]).alias('s')
+
+        # lock slots, rows are locked in order of id - concurrent bookings do not deadlock
+        def build_lock_query():
+            slots = get_slots()
+            return select([cls.schedule_id, cls.time, cls.members]).select_from(cls.__table__.join(
+                slots, and_(cls.schedule_id == slots.c.schedule_id, cls.time == slots.c.time)
+            )).order_by(cls.id).with_for_update(of=cls.__table__)
+
+        # booked places of slots (not rejected orders)
+        not_rejected = Order.status != OrderStatusEnum.rejected.value
+
+        def build_booked_query():
+            slots = get_slots()
+            return select([Order.schedule_id, Order.time, func.count(Order.id)]).select_from(Order.__table__.join(
+                slots, and_(Order.schedule_id == slots.c.schedule_id, Order.time == slots.c.time)
+            )).where(not_rejected).group_by(Order.schedule_id, Order.time)
+
+        statement_cache = DBManager().statement_cache
+        lock_query = statement_cache.compile(
+            key=(cls, 'book_lock'), conditions=[schedule_ids, times], build_query=build_lock_query)
+        booked_query = statement_cache.compile(
+            key=(cls, 'book_booked'), conditions=[schedule_ids, times, not_rejected], build_query=build_booked_query)
+
+        async def book(conn) -> list:
+            # places of slots (max by details with the same time)
+            places = {}
+            for record in await conn.execute_prepared('fetch', *lock_query):
+                key = (record['schedule_id'], record['time'])
+                places[key] = max(places.get(key, 0), record['members'])
+            # remaining places of slots: read after lock, bookings committed before are counted
+            for schedule_id, time, booked in await conn.execute_prepared('fetch', *booked_query):
+                if (schedule_id, time) in places:
+                    places[(schedule_id, time)] -= booked
+
+            # orders in limit of remaining places, in order of values_list
+            reasons = []
+            for values in values_list:
+                key = (values['schedule_id'], values['time'])
+                if key in places and places[key] <= 0:
+                    reasons.append('No free places')
+                else:
+                    if key in places and values.get('status') != OrderStatusEnum.rejected.value:
+                        places[key] -= 1
+                    reasons.append('')
+
+            booked_values = [values for values, reason in zip(values_list, reasons) if not reason]
+            records = await Order.insert_many(conn, booked_values, returning, 'Order is not created') \
+                if booked_values else []
+
+            records = iter(records)
+            return [(None, reason) if reason else next(records) for reason in reasons]
+
+        try:
+            rc = await DBManager().query_transaction(book)
+        except Exception as e:
+            logger.error('entity.schDetail.SCHDetail#book_orders: {}'.format(e))
+            rc, msg = False, 'Orders are not booked'
+
+        return rc, msg
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, types, Boolean, ForeignKey, DateTime, DATETIME, UniqueConstraint
+from sqlalchemy import Column, Integer, String, types, Boolean, ForeignKey, DateTime, DATETIME, UniqueConstraint, Index
 from datetime import datetime
 from .base import Base, BaseEntity
 
@@ -39,4 +39,8 @@ class Schedule(Base, BaseEntity):
 
     __table_args__ = (
         UniqueConstraint('name'),
+        # schedules of user (ACL of sessions, base condition of ScheduleModel)
+        Index('ix_Schedules_creater_id', 'creater_id'),
+        # filter by name.contains() - trigram index (extension pg_trgm)
+        Index('ix_Schedules_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
     )
@@ -12,8 +12,12 @@ from settings import *
 
 from common.managers.sessionManager import SessionManager
 from common.managers.dbManager import DBManager
+from common.managers.cacheManager import CacheManager
+from common.managers.slotIndexManager import SlotIndexManager
 
 from core.middleware import filter_errors_request
+from core.serializer import set_serializer
+from core.stats import StatsLogger
 from core.swagger.swagger_helper import generate_swagger_info
 
 
@@ -54,7 +58,24 @@ def main(prefix_name: str='schedule-online', is_debug=False):
         password=config.get('DB', 'password'),
         database=config.get('DB', 'database'),
         host=config.get('DB', 'host'),
-        port=config.get('DB', 'port')
+        port=config.get('DB', 'port'),
+        min_size=config.get('DB', 'pool_min_size', fallback=5),
+        max_size=config.get('DB', 'pool_max_size', fallback=10),
+        max_connections=config.get('DB', 'max_connections', fallback=40),
+        count_processes=config.get('SERVICE', 'count_processes', fallback=1),
+        acquire_timeout=config.get('DB', 'pool_acquire_timeout', fallback=0),
+        max_inactive_connection_lifetime=config.get('DB', 'pool_max_inactive_lifetime', fallback=300),
+        command_timeout=config.get('DB', 'command_timeout', fallback=0),
+        statement_cache_size=config.get('DB', 'statement_cache_size', fallback=1024),
+        prepared_statements_size=config.get('DB', 'prepared_statements_size', fallback=100),
+        cursor_prefetch=config.get('DB', 'cursor_prefetch', fallback=500),
+        coalesce_selects=config.get('DB', 'coalesce_selects', fallback=True),
+        query_stats=config.get('DB', 'query_stats', fallback=True),
+        query_stats_log_ms=config.get('DB', 'query_stats_log_ms', fallback=0),
+        replicas=config.get('DB', 'replicas', fallback=''),
+        replica_selection=config.get('DB', 'replica_selection', fallback='round_robin'),
+        replica_pin_seconds=config.get('DB', 'replica_pin_seconds', fallback=0),
+        replica_retry_seconds=config.get('DB', 'replica_retry_seconds', fallback=30)
     ))
     # initial connection-poll in DBManager
     loop.run_until_complete(loop.create_task(DBManager().init_pool()))
@@ -63,10 +84,51 @@ def main(prefix_name: str='schedule-online', is_debug=False):
     # add jinja2-templates
     aiohttp_jinja2.setup(app, loader=jinja2.FileSystemLoader('templates'))
 
+    # set settings for SessionManager
+    SessionManager().set_settings(dict(
+        backend=config.get('SESSION', 'backend', fallback=SessionManager.BACKEND_MEMORY),
+        store_address=config.get('SESSION', 'store_address', fallback=None),
+        store_timeout=config.get('SESSION', 'store_timeout', fallback=1),
+        local_ttl=config.get('SESSION', 'local_ttl', fallback=None),
+        local_size=config.get('SESSION', 'local_size', fallback=None),
+        ttl=config.get('SESSION', 'ttl', fallback=0),
+        idle_timeout=config.get('SESSION', 'idle_timeout', fallback=0),
+        max_sessions=config.get('SESSION', 'max_sessions', fallback=0),
+        sweep_interval=config.get('SESSION', 'sweep_interval', fallback=None),
+        count_processes=config.get('SERVICE', 'count_processes', fallback=1)
+    ))
+    # run/stop sweeper of expired sessions
+    app.on_startup.append(SessionManager().on_startup)
+    app.on_shutdown.append(SessionManager().on_shutdown)
+    # set settings for CacheManager
+    CacheManager().set_settings(dict(
+        backend=config.get('CACHE', 'backend', fallback=CacheManager.BACKEND_MEMORY),
+        ttl=config.get('CACHE', 'ttl', fallback=5),
+        max_size=config.get('CACHE', 'max_size', fallback=1000),
+        aiocache_class=config.get('CACHE', 'aiocache_class', fallback=None),
+        endpoint=config.get('CACHE', 'endpoint', fallback=None),
+        port=config.get('CACHE', 'port', fallback=None)
+    ))
+    # set settings for SlotIndexManager
+    SlotIndexManager().set_settings(dict(
+        enabled=config.get('SLOT_INDEX', 'enabled', fallback=True),
+        ttl=config.get('SLOT_INDEX', 'ttl', fallback=60),
+        max_schedules=config.get('SLOT_INDEX', 'max_schedules', fallback=10000)
+    ))
+
+    # statistic of managers to log every stats_log_interval seconds
+    stats_logger = StatsLogger(config.get('SERVICE', 'stats_log_interval', fallback=0))
+    app.on_startup.append(stats_logger.on_startup)
+    app.on_shutdown.append(stats_logger.on_shutdown)
+
     # add link to session in web.app
     app.session_storage = SessionManager()
     # auth header name
     app.auth_header_name = config.get('SERVICE', 'auth_header_name')
+    # serializer of json-responses
+    set_serializer(config.get('SERVICE', 'serializer', fallback=None))
+    # grouped results are built by db as json
+    app.db_json_aggregation = config.getboolean('DB', 'json_aggregation', fallback=False)
 
     # add routes
     setup_routes(app)
@@ -0,0 +1,44 @@
+"""indexes for filter columns
+
+Revision ID: 3b9c1e7d5a20
+Revises: f807fb7f4465
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b9c1e7d5a20'
+down_revision = 'f807fb7f4465'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # trigram operator class for name.contains() (LIKE '%...%')
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    # schedules of user: ACL of sessions, base condition of ScheduleModel
+    op.create_index('ix_Schedules_creater_id', 'Schedules', ['creater_id'], unique=False)
+    op.create_index('ix_Schedules_name_trgm', 'Schedules', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+    # orders of allowed schedules: by time, by status; orders of customers
+    op.create_index('ix_Orders_schedule_id_time', 'Orders', ['schedule_id', 'time'], unique=False)
+    op.create_index('ix_Orders_schedule_id_status', 'Orders', ['schedule_id', 'status'], unique=False)
+    op.create_index('ix_Orders_customer_id', 'Orders', ['customer_id'], unique=False)
+
+    # details of allowed schedules by time
+    op.create_index('ix_SCHDetails_schedule_id_time', 'SCHDetails', ['schedule_id', 'time'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_SCHDetails_schedule_id_time', table_name='SCHDetails')
+    op.drop_index('ix_Orders_customer_id', table_name='Orders')
+    op.drop_index('ix_Orders_schedule_id_status', table_name='Orders')
+    op.drop_index('ix_Orders_schedule_id_time', table_name='Orders')
+    op.drop_index('ix_Schedules_name_trgm', table_name='Schedules')
+    op.drop_index('ix_Schedules_creater_id', table_name='Schedules')
+    # extension pg_trgm is not removed: it may be used by other objects
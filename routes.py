@@ -11,6 +11,8 @@ routes = [
     (METH_GET,      '/user-confirm',          UserAuthCommon),
     # sid is access?
     (METH_POST,     '/is-auth',               IsAuth),
+    # statistic of process (for admins)
+    (METH_GET,      '/service-stats',         ServiceStats),
 
     (METH_POST,     '/customer-login',        CustomerAuthCommon),
     (METH_DELETE,   '/customer-logout',       CustomerAuthCommon),
@@ -43,6 +45,10 @@ routes = [
     (METH_DELETE,   '/customers/{ids}',      Customer),
 
     (METH_GET,      '/schedule-online/{ids}',      ScheduleOnline),
+    # slots of schedules with remaining places
+    (METH_GET,      '/schedule-availability/{ids}',      ScheduleAvailability),
+    # reports by schedules (occupancy, revenue, statuses of orders)
+    (METH_GET,      '/schedule-reports/{ids}',      ScheduleReport),
 ]
 
 
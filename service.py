@@ -6,6 +6,8 @@ from multiprocessing import Process
 import signal
 
 from main import main
+from common.managers.sessionManager import SessionManager
+from common.managers.sessionManager.store import start_session_store
 
 
 # handler by signal
@@ -29,6 +31,10 @@ if __name__ == "__main__":
     signal.signal(signal.SIGINT, lambda num, handler: signal_handler(processes))
     signal.signal(signal.SIGTERM, lambda num, handler: signal_handler(processes))
 
+    # shared store of sessions for all sub-processes
+    if config.get('SESSION', 'backend', fallback='memory') == SessionManager.BACKEND_SHARED:
+        session_store = start_session_store(config.get('SESSION', 'store_address'))
+
     # create web-api sub-processes
     count_processes = int(config.get("SERVICE", "count_processes"))
     processes = [Process(
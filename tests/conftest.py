@@ -0,0 +1,13 @@
+import pytest
+
+from common.managers.dbManager import DBManager
+from common.managers.dbManager.manager import Singleton
+
+
+# new instance of DBManager for test (singleton of process is restored after test)
+@pytest.fixture
+def db_manager(monkeypatch) -> DBManager:
+    monkeypatch.delitem(Singleton._instances, DBManager, raising=False)
+    manager = DBManager()
+    manager.set_settings({})
+    return manager
@@ -0,0 +1,76 @@
+"""
+    Fakes of asyncpg-connection for tests without database
+"""
+
+import re
+
+
+# transaction/savepoint of FakeConnection: rows inserted in it are removed on exception
+class FakeTransaction:
+    def __init__(self, conn):
+        self._conn = conn
+        self._count = 0
+
+    async def __aenter__(self):
+        self._count = len(self._conn.rows)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            del self._conn.rows[self._count:]
+
+
+# connection executing INSERT ... VALUES ... RETURNING & nextval of sequence by compiled sql-text,
+# rows of RETURNING are returned in reverse order (order is not guaranteed by postgresql)
+class FakeConnection:
+    def __init__(self, fail=None, select_rows=None):
+        # fail(row) -> True: insert of row is failed
+        self._fail = fail
+        # select_rows(query_string, params) -> rows of selects
+        self._select_rows = select_rows
+        # inserted rows
+        self.rows = []
+        # last value of sequence of id
+        self.last_id = 0
+        # count executed inserts
+        self.inserts = 0
+
+    def transaction(self, **kwargs):
+        return FakeTransaction(self)
+
+    async def fetch(self, query_string: str, *params) -> list:
+        if 'nextval' in query_string:
+            start, stop = self._get_value(query_string, params, r'generate_series\((\$\d+)'), \
+                          self._get_value(query_string, params, r'generate_series\(\$\d+, (\$\d+)')
+            return [(self._next_id(),) for _ in range(start, stop + 1)]
+        if query_string.startswith('INSERT'):
+            return self._insert(query_string, params)
+        return self._select_rows(query_string, params)
+
+    async def fetchrow(self, query_string: str, *params):
+        rows = await self.fetch(query_string, *params)
+        return rows[0] if rows else None
+
+    async def execute_prepared(self, method: str, query_string: str, params: list, **kwargs):
+        return await getattr(self, method)(query_string, *params)
+
+    def _next_id(self) -> int:
+        self.last_id += 1
+        return self.last_id
+
+    @staticmethod
+    def _get_value(query_string: str, params: tuple, pattern: str):
+        return params[int(re.search(pattern, query_string).group(1)[1:]) - 1]
+
+    def _insert(self, query_string: str, params: tuple) -> list:
+        self.inserts += 1
+        columns = [column.strip() for column in re.search(r'\(([^)]*)\) VALUES', query_string).group(1).split(',')]
+        rows = []
+        for values in re.findall(r'\((\$[^)]*)\)', query_string):
+            row = dict(zip(columns, (params[int(value.strip()[1:]) - 1] for value in values.split(','))))
+            if row.get('id') is None:
+                row['id'] = self._next_id()
+            if self._fail is not None and self._fail(row):
+                raise ValueError('Insert is failed: {}'.format(row))
+            rows.append(row)
+        self.rows.extend(rows)
+        return list(reversed(rows))
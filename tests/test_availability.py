@@ -0,0 +1,46 @@
+"""
+    Availability of slots: one cached query, orders counted by slot
+"""
+
+import asyncio
+
+from sqlalchemy.sql import any_
+
+from common.managers.dbManager import DBManager
+from entity.schDetail import SCHDetail
+
+
+# compiled queries of select_availability by list of conditions
+def select_queries(monkeypatch, conditions_list: list, only_free: bool=False) -> list:
+    queries = []
+
+    async def query_fetch_coalesced(self, query):
+        queries.append(query)
+        return []
+    monkeypatch.setattr(DBManager, 'query_fetch_coalesced', query_fetch_coalesced)
+
+    async def run():
+        for conditions in conditions_list:
+            await SCHDetail.select_availability(conditions, only_free)
+    asyncio.run(run())
+    return queries
+
+
+def test_query_is_cached(db_manager, monkeypatch):
+    queries = select_queries(monkeypatch, [
+        [SCHDetail.schedule_id == any_([1, 2]), SCHDetail.time >= 10],
+        [SCHDetail.schedule_id == any_([3]), SCHDetail.time >= 20],
+    ], only_free=True)
+
+    assert db_manager.statement_cache.stats()['hits'] == 1
+    assert queries[0].query_string == queries[1].query_string
+    assert queries[1].params[0] == [3] and queries[1].params[-1] == 20
+
+
+def test_orders_are_counted_by_slot(db_manager, monkeypatch):
+    query_string = select_queries(monkeypatch, [[]])[0].query_string
+
+    # active schedules by join, orders by lateral count per detail (not by join of orders & group by)
+    assert 'JOIN "Schedules"' in query_string and '"Schedules".activate = true' in query_string
+    assert 'JOIN LATERAL (SELECT count("Orders".id)' in query_string
+    assert 'GROUP BY' not in query_string
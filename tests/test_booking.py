@@ -0,0 +1,76 @@
+"""
+    Booking of orders: orders in limit of remaining places of slots (read after lock of slots)
+"""
+
+import asyncio
+
+from common.managers.dbManager import DBManager
+from entity.order import OrderStatusEnum
+from entity.schDetail import SCHDetail
+from .fakes import FakeConnection
+
+# details of slots: (schedule_id, time, members), two details at time 30
+DETAILS = [(1, 10, 2), (1, 20, 1), (1, 30, 1), (1, 30, 3)]
+# not rejected orders of slots before booking: (schedule_id, time): count
+BOOKED = {(1, 10): 1}
+
+
+# rows of selects of booking: locked details & booked places
+def select_rows(query_string: str, params: list) -> list:
+    if 'FOR UPDATE' in query_string:
+        return [dict(schedule_id=schedule_id, time=time, members=members) for schedule_id, time, members in DETAILS]
+    return [(schedule_id, time, count) for (schedule_id, time), count in BOOKED.items()]
+
+
+# book orders in transaction on fake connection, return (result of book_orders, connection)
+def book(monkeypatch, values_list: list, fail=None) -> tuple:
+    conn = FakeConnection(fail=fail, select_rows=select_rows)
+
+    async def query_transaction(self, func):
+        async with conn.transaction():
+            return await func(conn)
+    monkeypatch.setattr(DBManager, 'query_transaction', query_transaction)
+
+    return asyncio.run(SCHDetail.book_orders(values_list, ['time'])), conn
+
+
+def test_orders_over_remaining_places_are_not_booked(monkeypatch):
+    (result, msg), conn = book(monkeypatch, [
+        dict(schedule_id=1, time=10),
+        dict(schedule_id=1, time=10),
+        dict(schedule_id=1, time=20),
+        dict(schedule_id=1, time=20),
+    ])
+
+    assert msg == ''
+    assert [(record and record['time'], reason) for record, reason in result] == [
+        (10, ''), (None, 'No free places'), (20, ''), (None, 'No free places')
+    ]
+    assert len(conn.rows) == 2
+
+
+def test_places_of_slot_by_max_of_details(monkeypatch):
+    (result, _), _ = book(monkeypatch, [dict(schedule_id=1, time=30) for _ in range(4)])
+
+    assert [reason for _, reason in result] == ['', '', '', 'No free places']
+
+
+def test_rejected_orders_and_orders_without_slot(monkeypatch):
+    (result, _), _ = book(monkeypatch, [
+        dict(schedule_id=1, time=20, status=OrderStatusEnum.rejected.value),
+        dict(schedule_id=1, time=20),
+        # time without slot - without limit of places
+        dict(schedule_id=1, time=99),
+        dict(schedule_id=1, time=99),
+    ])
+
+    assert [reason for _, reason in result] == ['', '', '', '']
+
+
+def test_failed_order_is_reported_by_item(monkeypatch):
+    (result, _), conn = book(monkeypatch, [dict(schedule_id=1, time=20), dict(schedule_id=1, time=99)],
+                             fail=lambda row: row['time'] == 99)
+
+    assert [(record and record['time'], reason) for record, reason in result] == \
+        [(20, ''), (None, 'Order is not created')]
+    assert len(conn.rows) == 1
@@ -0,0 +1,62 @@
+"""
+    Bulk create: multi-row inserts matched to items by id, fallback by one in savepoints of the same transaction
+"""
+
+import asyncio
+
+from common.managers.dbManager import DBManager
+from entity.country import Country
+from entity.models.CountryModel import CountryModel
+from .fakes import FakeConnection
+
+
+# query_transaction on one fake connection
+def use_connection(monkeypatch, conn: FakeConnection):
+    async def query_transaction(self, func):
+        async with conn.transaction():
+            return await func(conn)
+    monkeypatch.setattr(DBManager, 'query_transaction', query_transaction)
+
+
+def test_records_are_matched_by_id():
+    conn = FakeConnection()
+    values_list = [dict(label='a'), dict(label='b', id=50), dict(label='c')]
+
+    result = asyncio.run(Country.insert_many(conn, values_list, [Country.label]))
+
+    assert [(record['label'], reason) for record, reason in result] == [('a', ''), ('b', ''), ('c', '')]
+    assert [record['id'] for record, _ in result] == [1, 50, 2]
+    assert conn.inserts == 1
+
+
+def test_failed_batch_is_inserted_by_one_in_savepoints():
+    conn = FakeConnection(fail=lambda row: row['label'] == 'bad')
+    values_list = [dict(label='a'), dict(label='bad'), dict(label='c')]
+
+    result = asyncio.run(Country.insert_many(conn, values_list, [Country.label], 'Country is not created'))
+
+    assert [(record and record['label'], reason) for record, reason in result] == \
+        [('a', ''), (None, 'Country is not created'), ('c', '')]
+    # rows of failed multi-row insert are rolled back
+    assert [row['label'] for row in conn.rows] == ['a', 'c']
+
+
+def test_create_entities_reports_errors_by_item(monkeypatch):
+    conn = FakeConnection(fail=lambda row: row['label'] == 'bad')
+    use_connection(monkeypatch, conn)
+
+    result, errors = asyncio.run(CountryModel(select_fields={'label'}).create_entities(
+        [dict(label='a'), dict(label='bad'), dict(label='c')]))
+
+    assert result == [dict(label='a'), dict(label='c')]
+    assert [(error['value'], error['reason']) for error in errors] == [(dict(label='bad'), 'Record is not created')]
+    # one transaction: connection of pool is not taken by item
+    assert len(conn.rows) == 2
+
+
+def test_create_many_error_of_transaction(monkeypatch):
+    async def query_transaction(self, func):
+        raise OSError('db is down')
+    monkeypatch.setattr(DBManager, 'query_transaction', query_transaction)
+
+    assert asyncio.run(Country.create_many([dict(label='a')])) == (False, 'Records are not created')
@@ -0,0 +1,42 @@
+"""
+    Bulk update: one query by items, items with the same id are reported per item
+"""
+
+import asyncio
+
+from common.managers.dbManager import DBManager
+from entity.country import Country
+from entity.models.CountryModel import CountryModel
+
+
+# query_fetch_batch returns rows of updated ids, compiled queries are saved to list
+def fetch_batch(monkeypatch, queries: list):
+    async def query_fetch_batch(self, batch):
+        queries.extend(DBManager._compile(query) for query in batch)
+        ids = queries[-1].params[0]
+        return [dict(id=rec_id, label='new') for rec_id in ids]
+    monkeypatch.setattr(DBManager, 'query_fetch_batch', query_fetch_batch)
+
+
+def test_duplicate_ids_are_not_updated(monkeypatch):
+    queries = []
+    fetch_batch(monkeypatch, queries)
+
+    result, errors = asyncio.run(CountryModel(select_fields={'id', 'label'}).update_entities([
+        dict(id=1, label='a'), dict(id=2, label='b'), dict(id=1, label='c')
+    ]))
+
+    assert result == [dict(id=2, label='new')]
+    assert [(error['value'], error['reason']) for error in errors] == [
+        (dict(id=1, label='a'), 'Duplicate id'), (dict(id=1, label='c'), 'Duplicate id')
+    ]
+    assert len(queries) == 1
+
+
+def test_update_many_refuses_duplicate_ids(monkeypatch):
+    queries = []
+    fetch_batch(monkeypatch, queries)
+
+    assert asyncio.run(Country.update_many([dict(id=1, label='a'), dict(id=1, label='b')])) == \
+        (False, 'Duplicate id in records')
+    assert queries == []
@@ -0,0 +1,191 @@
+"""
+    DBManager: coalescing of concurrent selects, failover of read replicas
+"""
+
+import asyncio
+
+from asyncpg.exceptions import ConnectionDoesNotExistError, InterfaceError
+
+from common.managers.dbManager import DBManager
+from common.managers.dbManager.statement_cache import CompiledQuery
+
+QUERY = CompiledQuery('SELECT 1', [])
+
+
+# _fetch counts executed queries
+def count_fetches(monkeypatch) -> list:
+    fetches = []
+
+    async def fetch(self, query, replica=False):
+        fetches.append(query)
+        await asyncio.sleep(0.01)
+        return [(1, )]
+    monkeypatch.setattr(DBManager, '_fetch', fetch)
+    return fetches
+
+
+# select of request (route of middleware), write=True - request wrote before select
+async def request_select(manager: DBManager, write: bool=False) -> list:
+    token = manager.start_route(True)
+    try:
+        if write:
+            manager._is_replica_query()
+        return await manager.query_fetch_coalesced(QUERY)
+    finally:
+        manager.stop_route(token)
+
+
+def test_identical_selects_are_coalesced(db_manager, monkeypatch):
+    fetches = count_fetches(monkeypatch)
+
+    async def run():
+        return await asyncio.gather(*(request_select(db_manager) for _ in range(5)))
+
+    assert asyncio.run(run()) == [[(1, )]] * 5
+    assert len(fetches) == 1
+
+
+def test_select_after_write_is_not_coalesced(db_manager, monkeypatch):
+    fetches = count_fetches(monkeypatch)
+
+    async def run():
+        return await asyncio.gather(request_select(db_manager), request_select(db_manager, write=True))
+
+    asyncio.run(run())
+    assert len(fetches) == 2
+
+
+# pool of db by name (host of dsn): rows of queries are (name of db, ), down - connections are lost
+class FakePool:
+    def __init__(self, name: str):
+        self.name = name
+        self.down = False
+        self.closed = False
+
+    async def acquire(self, timeout=None):
+        if self.closed:
+            raise InterfaceError('pool is closing')
+        return FakePoolConnection(self)
+
+    async def release(self, conn):
+        pass
+
+    async def close(self):
+        self.closed = True
+
+    def terminate(self):
+        self.closed = True
+
+
+class FakePoolConnection:
+    def __init__(self, pool: FakePool):
+        self._pool = pool
+
+    def _check(self):
+        if self._pool.down:
+            raise ConnectionDoesNotExistError('connection was closed in the middle of operation')
+
+    async def execute_prepared(self, method: str, query_string: str, params: list, **kwargs):
+        self._check()
+        return [(self._pool.name, )]
+
+    def transaction(self, **kwargs):
+        return FakeTransaction()
+
+    async def prepare_cached(self, query_string: str):
+        return self
+
+    # cursor of prepared statement
+    async def cursor(self, *params, prefetch: int=None):
+        self._check()
+        for i in range(3):
+            yield (self._pool.name, i)
+
+
+class FakeTransaction:
+    async def __aenter__(self):
+        pass
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+
+# DBManager with primary & replica, pools by name: {name: FakePool}, names of down dbs - connect is failed
+def connect(db_manager: DBManager, monkeypatch, down: set=None) -> dict:
+    pools = {}
+
+    async def create_pool(self, dsn: str):
+        name = dsn.rsplit('@', 1)[-1].split(':')[0]
+        if down and name in down:
+            raise OSError('Connect call failed')
+        pools[name] = FakePool(name)
+        return pools[name]
+    monkeypatch.setattr(DBManager, '_create_pool', create_pool)
+
+    db_manager.set_settings(dict(host='primary', port=5432, database='db', replicas='replica', replica_retry_seconds=60))
+    asyncio.run(db_manager.init_pool())
+    return pools
+
+
+# db of select routed to replicas
+def select_db(manager: DBManager) -> str:
+    async def run():
+        token = manager.start_route(True)
+        try:
+            return (await manager.query_fetch(QUERY))[0][0]
+        finally:
+            manager.stop_route(token)
+    return asyncio.run(run())
+
+
+def is_healthy(manager: DBManager) -> bool:
+    return manager.get_stats()['replicas']['replica:5432/db']['healthy']
+
+
+def test_replica_down_at_start(db_manager, monkeypatch):
+    connect(db_manager, monkeypatch, down={'replica'})
+
+    assert not is_healthy(db_manager)
+    assert select_db(db_manager) == 'primary'
+
+
+def test_replica_lost_after_start(db_manager, monkeypatch):
+    pools = connect(db_manager, monkeypatch)
+    assert select_db(db_manager) == 'replica'
+
+    pools['replica'].down = True
+    # read is repeated on primary, replica is unhealthy until retry
+    assert select_db(db_manager) == 'primary'
+    assert not is_healthy(db_manager)
+    assert select_db(db_manager) == 'primary'
+
+
+def test_unhealthy_replica_is_connected_after_retry(db_manager, monkeypatch):
+    down = {'replica'}
+    connect(db_manager, monkeypatch, down=down)
+    # replica is up, time of retry
+    down.clear()
+    db_manager._replicas[0].retry_at = 0
+
+    async def run():
+        db_manager._get_replica()
+        await asyncio.sleep(0)
+    asyncio.run(run())
+
+    assert is_healthy(db_manager)
+    assert select_db(db_manager) == 'replica'
+
+
+def test_cursor_of_lost_replica_is_opened_on_primary(db_manager, monkeypatch):
+    pools = connect(db_manager, monkeypatch)
+    pools['replica'].down = True
+
+    async def run():
+        token = db_manager.start_route(True)
+        try:
+            return [record async for record in db_manager.query_cursor(QUERY)]
+        finally:
+            db_manager.stop_route(token)
+
+    assert asyncio.run(run()) == [('primary', 0), ('primary', 1), ('primary', 2)]
+    assert not is_healthy(db_manager)
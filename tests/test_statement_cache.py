@@ -0,0 +1,95 @@
+"""
+    Statement cache: key of compiled query by shape of conditions, values bound to cached sql
+"""
+
+from asyncpgsa import compile_query
+from sqlalchemy.sql import select, func, any_, cast, text
+from sqlalchemy import Integer, String
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from common.managers.dbManager.statement_cache import StatementCache, CompiledQuery, get_conditions_shape
+from entity.schDetail import SCHDetail
+from entity.schedule import Schedule
+
+
+# query by conditions as built by BaseEntity._compile_select
+def build(conditions: list):
+    def build_query():
+        build_query.calls += 1
+        query = select([SCHDetail.id, SCHDetail.time])
+        for condition in conditions:
+            query = query.where(condition)
+        return query
+    build_query.calls = 0
+    return build_query
+
+
+# compiled query from cache & the same query compiled without cache
+def compile_both(cache: StatementCache, conditions: list) -> (CompiledQuery, CompiledQuery):
+    build_query = build(conditions)
+    cached = cache.compile(key=(SCHDetail, 'test'), conditions=conditions, build_query=build_query)
+    return cached, CompiledQuery(*compile_query(build(conditions)()))
+
+
+def test_equal_shapes_share_compiled_query():
+    cache = StatementCache()
+    first, _ = compile_both(cache, [SCHDetail.schedule_id == any_([1, 2]), SCHDetail.time >= 10])
+    second, expected = compile_both(cache, [SCHDetail.schedule_id == any_([3]), SCHDetail.time >= 20])
+
+    assert cache.stats()['misses'] == 1 and cache.stats()['hits'] == 1
+    assert first.query_string == second.query_string
+    assert second == expected
+    assert second.params == [[3], 20]
+
+
+def test_compiled_params_equal_uncached_compile():
+    conditions = [
+        SCHDetail.schedule_id == any_(cast([1, 2], ARRAY(Integer))),
+        SCHDetail.description.like('slot%'),
+        func.lower(SCHDetail.description) != 'x',
+        SCHDetail.time.between(5, 50),
+    ]
+    cached, expected = compile_both(StatementCache(), conditions)
+    assert cached == expected
+
+
+def test_different_shapes_are_different_keys():
+    cache = StatementCache()
+    compile_both(cache, [SCHDetail.time >= 10])
+    compile_both(cache, [SCHDetail.time > 10])
+    compile_both(cache, [SCHDetail.members >= 10])
+    compile_both(cache, [cast(SCHDetail.time, String) == '10'])
+    compile_both(cache, [func.abs(SCHDetail.time) == 10])
+    compile_both(cache, [func.sign(SCHDetail.time) == 10])
+    compile_both(cache, [text('"SCHDetails".time > 1')])
+    compile_both(cache, [text('"SCHDetails".time > 2')])
+
+    assert len(cache) == 8
+    assert cache.stats()['hits'] == 0
+
+
+def test_build_query_called_once_on_miss():
+    cache = StatementCache()
+    conditions = [SCHDetail.time >= 10]
+    build_query = build(conditions)
+    cache.compile(key=(SCHDetail, 'test'), conditions=conditions, build_query=build_query)
+    cache.compile(key=(SCHDetail, 'test'), conditions=conditions, build_query=build_query)
+    assert build_query.calls == 1
+
+
+def test_unknown_element_is_not_cached():
+    conditions = [SCHDetail.schedule_id.in_(select([Schedule.id]).where(Schedule.activate == True))]
+    shape, _ = get_conditions_shape(conditions)
+    assert shape is None
+
+    cache = StatementCache()
+    cached, expected = compile_both(cache, conditions)
+    assert cached == expected
+    assert len(cache) == 0
+
+
+def test_lru_limit():
+    cache = StatementCache(max_size=2)
+    for column in (SCHDetail.time, SCHDetail.members, SCHDetail.price):
+        compile_both(cache, [column >= 1])
+    assert len(cache) == 2